@@ -11,6 +11,7 @@ setup(name='intratime_slack_bot',
       license='GPLv3',
       package_dir={"": "src"},
       packages=find_namespace_packages(where="src"),
+      extras_require={'fast_json': ['orjson']},
       zip_safe=False)
 
 # Clean build files
@@ -10,6 +10,12 @@ MONGO_DB_USER = "<YOUR_MONGO_DB_USER>"
 MONGO_DB_PASSWORD = "<YOUR_MONGO_DB_PASSWORD>"
 MONGO_DB_PORT = '27017'
 MONGO_DB_HOST = 'mongo-service'
+MONGO_DB_MAX_POOL_SIZE = 50
+MONGO_DB_MIN_POOL_SIZE = 0
+MONGO_DB_WAIT_QUEUE_TIMEOUT_MS = 2000  # Max wait for a free pooled connection
+MONGO_DB_SERVER_SELECTION_TIMEOUT_MS = 5000
+CREATE_INDEXES_ON_STARTUP = True
+INDEX_BUILD_PROGRESS_INTERVAL = 5  # Seconds
 
 # SERVICE CONFIGURATION
 APP_PATH = '/app'
@@ -18,6 +24,26 @@ DEBUG_MODE = False
 SLACK_SERVICE_HOST = '0.0.0.0'
 SLACK_SERVICE_PORT = '10050'
 
+# HTTP CLIENT CONFIGURATION
+HTTP_CONNECT_TIMEOUT = 3.05  # Seconds
+HTTP_READ_TIMEOUT = 10  # Seconds
+HTTP_POOL_MAX_SIZE = 20  # Connections kept alive per host
+HTTP_POOL_BLOCK = False  # If all pooled connections are busy, open a new one (not kept alive) instead of waiting
+
+# HISTORY CONFIGURATION
+HISTORY_WRITER_MAX_QUEUE_SIZE = 10000
+HISTORY_WRITER_BATCH_SIZE = 100
+HISTORY_WRITER_FLUSH_INTERVAL = 2  # Seconds
+HISTORY_WRITER_OVERFLOW_POLICY = 'drop_newest'  # drop_newest || drop_oldest
+HISTORY_RETENTION_DAYS = 90  # Raw history registers older than this are deleted once compacted
+HISTORY_COMPACTION_INTERVAL = 3600  # Seconds. 0 to disable the compaction job in the service
+HISTORY_COMPACTION_LAG = 300  # Seconds. Registers newer than this may not be written yet
+
+# USER CACHE CONFIGURATION
+USER_CACHE_TTL = 60  # Seconds
+USER_CACHE_SIZE = 1000
+USER_CACHE_NEGATIVE_TTL = 5  # Seconds. Unregistered users, so a sign up made by another process is noticed soon
+
 # LOGS CONFIGURATION
 LOG_LEVEL = 'DEBUG'
 LOGS_PATH = os.path.join(APP_PATH, 'logs')
@@ -25,13 +51,49 @@ LOGS_LEVEL = logging.INFO
 
 # SECURITY CONFIGURATION
 CIPHER_KEY = "<YOUR_CIPHER_KEY>"  # It must be 16 || 32 characters long
+CIPHER_RETIRED_KEYS = []  # Old cipher keys, only used to decrypt the passwords not rotated yet
+CIPHER_ROTATION_BATCH_SIZE = 500
 
 # SLACK CONFIGURATION
 SLACK_APP_SIGNATURE = "<YOUR_SLACK_APP_SIGNATURE>"
 SLACK_API_USER_TOKEN = "<YOUR_SLACK_API_USER_TOKEN>"
 SLACK_API_BOT_TOKEN = "<YOUR_SLACK_API_BOT_TOKEN>"
+SLACK_API_RATE_LIMITS = {  # Slack API method: (requests per second, maximum burst of requests)
+    'chat.postMessage': (1, 10),
+    'chat.postEphemeral': (1, 10)
+}
+SLACK_API_RATE_LIMIT_RETRIES = 2  # Retries of the requests answered with 429 Too Many Requests
+SLACK_API_DEFAULT_RETRY_AFTER = 1  # Seconds. Used if the 429 response has no valid Retry-After header
+SLACK_MESSAGE_MAX_BLOCKS = 50  # Slack limit of blocks per message
+SLACK_MESSAGE_MAX_SIZE = 40000  # Bytes of the JSON encoded blocks of a message
+SLACK_OUTBOX_INTERVAL = 10  # Seconds between sends of the private messages that could not be posted. 0 to disable
+SLACK_OUTBOX_WORKERS = 4  # Channels whose queued messages are sent at the same time
+SLACK_OUTBOX_MAX_ATTEMPTS = 8  # Failed attempts after which a message is moved to the dead-letter store
+SLACK_OUTBOX_RETRY_BASE_DELAY = 10  # Seconds. Maximum delay after the first failed attempt, doubled on each attempt
+SLACK_OUTBOX_RETRY_MAX_DELAY = 600  # Seconds
 
 # INTRATIME CONFIGURATION
+INTRATIME_TOKEN_CACHE_TTL = 1800  # Seconds
+INTRATIME_TOKEN_CACHE_SIZE = 1000
+INTRATIME_CLOCK_DATA_CACHE_TTL = 10  # Seconds. Clock history results are reused by the repeated requests
+INTRATIME_CLOCK_DATA_CACHE_SIZE = 1000
+INTRATIME_ASYNC_MAX_CONNECTIONS = 100  # Simultaneous connections of the async client
+CLOCK_VERIFY_WORKERS = 4  # Threads that verify the clockings in background
+CLOCK_QUEUE_INTERVAL = 30  # Seconds between sends of the clockings queued while Intratime is down. 0 to disable
+CLOCK_QUEUE_WORKERS = 4  # Users whose queued clockings are sent at the same time
+CLOCK_QUEUE_MAX_AGE = 43200  # Seconds. Older queued clockings are discarded if Intratime is still down
+INTRATIME_BREAKER_FAILURE_RATE = 0.5  # Failure rate of the last requests from which Intratime is not requested
+INTRATIME_BREAKER_MINIMUM_CALLS = 10
+INTRATIME_BREAKER_WINDOW_SIZE = 20  # Last requests taken into account to calculate the failure rate
+INTRATIME_BREAKER_OPEN_TIMEOUT = 30  # Seconds before probing Intratime again
+INTRATIME_LIMITER_INITIAL_LIMIT = 20  # Simultaneous Intratime requests. It is adapted to the Intratime latency
+INTRATIME_LIMITER_MIN_LIMIT = 2
+INTRATIME_LIMITER_MAX_LIMIT = 100
+INTRATIME_LIMITER_LATENCY_THRESHOLD = 2  # Seconds. Slower requests decrease the limit
+INTRATIME_LIMITER_QUEUE_TIMEOUT = 5  # Seconds that a request waits for a free slot
+INTRATIME_GET_RETRIES = 2  # Retries of the GET requests. Other requests are not retried
+INTRATIME_RETRY_BASE_DELAY = 0.2  # Seconds
+INTRATIME_RETRY_MAX_DELAY = 2  # Seconds
 INTRATIME_TEST_USER_EMAIL = "<YOUR_INTRATIME_TEST_USER_EMAIL>"
 INTRATIME_TEST_USER_PASSWORD = "<YOUR_INTRATIME_TEST_USER_PASSWORD>"
 
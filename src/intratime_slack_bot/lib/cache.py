@@ -0,0 +1,301 @@
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+NOT_CACHED = object()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a time to live.
+
+    Parameters
+    ----------
+    max_size: int
+        Maximum number of entries. The least recently used entry is evicted when the cache is full
+    ttl: int
+        Entry time to live in seconds
+    timer: function
+        Function that returns the current time in seconds
+    """
+
+    def __init__(self, max_size, ttl, timer=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        # Version of the last deletion of the most recently deleted keys, up to max_size. Reads older than the
+        # evicted ones (min_version) are not cached, since their key could have been deleted after them
+        self._version = 0
+        self._deletions = OrderedDict()
+        self._min_version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Function to get an entry value
+
+        Parameters
+        ----------
+        key: object
+            Entry key
+        default: object
+            Value returned if the entry does not exist or it has expired
+
+        Returns
+        -------
+        object:
+            Entry value
+        """
+
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is None or item[0] <= self.timer():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+
+            return item[1]
+
+    def get_generation(self, key):
+        """
+        Function to get the current generation of a key. It is taken before reading a value that is going to be
+        cached (see set), and it is outdated once the key is deleted or the cache is cleared.
+
+        Parameters
+        ----------
+        key: object
+            Entry key
+
+        Returns
+        -------
+        int:
+            Key generation
+        """
+
+        with self._lock:
+            return self._version
+
+    def set(self, key, value, ttl=None, generation=None):
+        """
+        Function to add or replace an entry
+
+        Parameters
+        ----------
+        key: object
+            Entry key
+        value: object
+            Entry value
+        ttl: int
+            Entry time to live in seconds. The cache TTL if it is not specified
+        generation: int
+            Key generation when the value was read. If the key has been deleted since then, the value could be outdated
+            and it is not cached
+
+        Returns
+        -------
+        boolean:
+            True if the entry has been set, False otherwise
+        """
+
+        with self._lock:
+            if generation is not None and (generation < self._min_version or
+                                           self._deletions.get(key, self._min_version) > generation):
+                return False
+
+            self._data[key] = (self.timer() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+            return True
+
+    def delete(self, key):
+        """
+        Function to remove an entry if it exists
+
+        Parameters
+        ----------
+        key: object
+            Entry key
+        """
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._version += 1
+            self._deletions[key] = self._version
+            self._deletions.move_to_end(key)
+
+            while len(self._deletions) > self.max_size:
+                self._min_version = self._deletions.popitem(last=False)[1]
+
+    def clear(self):
+        """
+        Function to remove all entries and reset the counters
+        """
+
+        with self._lock:
+            self._data.clear()
+            self._version += 1
+            self._deletions.clear()
+            self._min_version = self._version
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """
+        Function to get the cache usage stats
+
+        Returns
+        -------
+        dict:
+            Cache size, max size, hits, misses and hit ratio
+        """
+
+        with self._lock:
+            requests = self.hits + self.misses
+
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 4) if requests > 0 else 0
+            }
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class SingleFlightCache:
+    """
+    Thread-safe cache of function results. Concurrent calls with the same key share a single in-flight call, and its
+    result is cached for a time to live.
+
+    Parameters
+    ----------
+    max_size: int
+        Maximum number of cached results
+    ttl: int
+        Result time to live in seconds
+    should_cache: function
+        Function that returns if a result can be cached. e.g errors are shared by the waiting calls but not cached
+    timer: function
+        Function that returns the current time in seconds
+    """
+
+    def __init__(self, max_size, ttl, should_cache=None, timer=time.monotonic):
+        self.should_cache = should_cache
+        self.shared_calls = 0
+        self._cache = TTLCache(max_size, ttl, timer)
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, function, *args, **kwargs):
+        """
+        Function to get the cached result of a key. If it is not cached, the function is called, unless there is an
+        in-flight call for the same key, in which case its result is waited for.
+
+        Parameters
+        ----------
+        key: object
+            Result key
+        function: function
+            Function that calculates the result
+        args: list
+            Function positional arguments
+        kwargs: dict
+            Function keyword arguments
+
+        Returns
+        -------
+        object:
+            Function result
+        """
+
+        result = self._cache.get(key, NOT_CACHED)
+
+        if result is not NOT_CACHED:
+            return result
+
+        with self._lock:
+            call = self._calls.get(key)
+            is_owner = call is None
+
+            if is_owner:
+                call = Future()
+                self._calls[key] = call
+            else:
+                self.shared_calls += 1
+
+        if not is_owner:
+            return call.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as exception:
+            self._finish_call(key, call)
+            call.set_exception(exception)
+            raise
+
+        self._finish_call(key, call, result)
+        call.set_result(result)
+
+        return result
+
+    def _finish_call(self, key, call, result=NOT_CACHED):
+        with self._lock:
+            # The call has been invalidated while it was running, so its result could be outdated
+            if self._calls.get(key) is not call:
+                return
+
+            del self._calls[key]
+
+            if result is not NOT_CACHED and (self.should_cache is None or self.should_cache(result)):
+                self._cache.set(key, result)
+
+    def invalidate(self, key):
+        """
+        Function to remove the cached result of a key. The result of its in-flight call, if any, is not cached, and the
+        next calls do not wait for it.
+
+        Parameters
+        ----------
+        key: object
+            Result key
+        """
+
+        with self._lock:
+            self._cache.delete(key)
+            self._calls.pop(key, None)
+
+    def get_stats(self):
+        """
+        Function to get the cache usage stats
+
+        Returns
+        -------
+        dict:
+            Cache size, max size, hits, misses, hit ratio, calls that have waited for an in-flight call and in-flight
+            calls
+        """
+
+        stats = self._cache.get_stats()
+
+        with self._lock:
+            stats.update({'shared_calls': self.shared_calls, 'in_flight': len(self._calls)})
+
+        return stats
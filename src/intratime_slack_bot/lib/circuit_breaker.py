@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+
+from collections import deque
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call is rejected because the circuit breaker is open
+    """
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker. It opens when the failure rate of the last calls reaches a threshold, rejects the
+    calls while it is open and, after the open timeout, lets a limited number of probe calls through (half-open). A
+    successful probe closes it and a failed one opens it again.
+
+    Parameters
+    ----------
+    failure_rate_threshold: float
+        Failure rate (0-1) of the last calls from which the breaker opens
+    minimum_calls: int
+        Minimum number of recorded calls to calculate the failure rate
+    window_size: int
+        Number of last calls taken into account to calculate the failure rate
+    open_timeout: int
+        Seconds that the breaker stays open before letting probe calls through
+    half_open_max_calls: int
+        Maximum number of simultaneous probe calls when the breaker is half-open
+    on_state_change: function
+        Function called with the old and the new state when the breaker state changes
+    timer: function
+        Function that returns the current time in seconds
+    """
+
+    def __init__(self, failure_rate_threshold=0.5, minimum_calls=10, window_size=20, open_timeout=30,
+                 half_open_max_calls=1, on_state_change=None, timer=time.monotonic):
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.open_timeout = open_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.on_state_change = on_state_change
+        self.timer = timer
+        self.state = CLOSED
+        self.opened_at = None
+        self.rejected_calls = 0
+        self.open_count = 0
+        self._half_open_calls = 0
+        self._window = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        old_state = self.state
+        self.state = state
+        self._half_open_calls = 0
+
+        if state == OPEN:
+            self.opened_at = self.timer()
+            self.open_count += 1
+        elif state == CLOSED:
+            self._window.clear()
+
+        if self.on_state_change is not None:
+            self.on_state_change(old_state, state)
+
+    def _get_failure_rate(self):
+        if len(self._window) == 0:
+            return 0.0
+
+        return self._window.count(False) / len(self._window)
+
+    def before_call(self):
+        """
+        Function to check if a call can be done. It must be called before each call and followed by record_success or
+        record_failure.
+
+        Raises
+        ------
+        CircuitOpenError:
+            If the breaker is open, or it is half-open and the maximum number of probe calls is running
+        """
+
+        with self._lock:
+            if self.state == OPEN and self.timer() - self.opened_at >= self.open_timeout:
+                self._set_state(HALF_OPEN)
+
+            if self.state == OPEN or (self.state == HALF_OPEN and self._half_open_calls >= self.half_open_max_calls):
+                self.rejected_calls += 1
+                raise CircuitOpenError()
+
+            if self.state == HALF_OPEN:
+                self._half_open_calls += 1
+
+    def record_success(self):
+        """
+        Function to record a successful call
+        """
+
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._set_state(CLOSED)
+            elif self.state == CLOSED:
+                self._window.append(True)
+
+    def record_failure(self):
+        """
+        Function to record a failed call
+        """
+
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._set_state(OPEN)
+            elif self.state == CLOSED:
+                self._window.append(False)
+
+                if len(self._window) >= self.minimum_calls and \
+                   self._get_failure_rate() >= self.failure_rate_threshold:
+                    self._set_state(OPEN)
+
+    def is_open(self):
+        """
+        Function to check if the calls are being rejected, without taking a probe call
+
+        Returns
+        -------
+        boolean:
+            True if the breaker is open and the open timeout has not expired, False otherwise
+        """
+
+        with self._lock:
+            return self.state == OPEN and self.timer() - self.opened_at < self.open_timeout
+
+    def get_stats(self):
+        """
+        Function to get the breaker state and stats
+
+        Returns
+        -------
+        dict:
+            State, failure rate of the last calls, number of recorded calls, rejected calls and times it has opened
+        """
+
+        with self._lock:
+            return {'state': self.state, 'failure_rate': round(self._get_failure_rate(), 2),
+                    'calls': len(self._window), 'rejected_calls': self.rejected_calls, 'open_count': self.open_count}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_retry_delay(attempt, base_delay, max_delay):
+    """
+    Function to get the delay before retrying a call, using exponential backoff with full jitter
+
+    Parameters
+    ----------
+    attempt: int
+        Number of the failed attempt, starting at 0
+    base_delay: float
+        Seconds. Maximum delay after the first attempt
+    max_delay: float
+        Seconds. Maximum delay
+
+    Returns
+    -------
+    float:
+        Seconds to wait
+    """
+
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
@@ -0,0 +1,165 @@
+import calendar
+import time
+
+from enum import IntEnum
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = '%Y-%m-%d'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class ClockAction(IntEnum):
+    """
+    Clock actions. The values are the Intratime action ids (INOUT_TYPE)
+    """
+
+    IN = 0
+    OUT = 1
+    PAUSE = 2
+    RETURN = 3
+
+    @property
+    def label(self):
+        """
+        Action name used in the slack commands and messages. e.g in
+        """
+
+        return self.name.lower()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def to_timestamp(date_time):
+    """
+    Function to convert a datetime string to seconds since epoch. The datetime is taken as is (no timezone
+    conversion), so the differences between timestamps match the differences between the datetimes.
+
+    Parameters
+    ----------
+    date_time: str
+        Datetime in format %Y-%m-%d %H:%M:%S
+
+    Returns
+    -------
+    int:
+        Seconds since epoch
+    """
+
+    return calendar.timegm((int(date_time[0:4]), int(date_time[5:7]), int(date_time[8:10]), int(date_time[11:13]),
+                            int(date_time[14:16]), int(date_time[17:19])))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def from_timestamp(timestamp, date_format=DATETIME_FORMAT):
+    """
+    Function to format a timestamp created with to_timestamp
+
+    Parameters
+    ----------
+    timestamp: int
+        Seconds since epoch
+    date_format: str
+        Output format
+
+    Returns
+    -------
+    str:
+        Formatted datetime
+    """
+
+    return time.strftime(date_format, time.gmtime(timestamp))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class ClockEvent:
+    """
+    User clock. The datetime is parsed once and kept as a timestamp. It is only formatted when it is rendered.
+
+    Parameters
+    ----------
+    timestamp: int
+        Clock datetime as seconds since epoch (see to_timestamp)
+    action: ClockAction
+        Clock action
+    """
+
+    __slots__ = ('timestamp', 'action')
+
+    def __init__(self, timestamp, action):
+        self.timestamp = timestamp
+        self.action = action
+
+    @classmethod
+    def from_intratime(cls, item):
+        """
+        Function to create a clock event from an Intratime API clock item
+
+        Parameters
+        ----------
+        item: dict
+            Clock item with INOUT_DATE and INOUT_TYPE keys
+
+        Returns
+        -------
+        ClockEvent:
+            Clock event
+        """
+
+        return cls(to_timestamp(item['INOUT_DATE']), ClockAction(item['INOUT_TYPE']))
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Function to create a clock event from its dict representation. See to_dict.
+
+        Parameters
+        ----------
+        data: dict
+            Clock data with action and datetime keys. e.g {'action': 'in', 'datetime': '2020-11-02 08:00:00'}
+
+        Returns
+        -------
+        ClockEvent:
+            Clock event
+        """
+
+        return cls(to_timestamp(data['datetime']), ClockAction[data['action'].upper()])
+
+    @property
+    def action_name(self):
+        return self.action.label
+
+    @property
+    def datetime(self):
+        return from_timestamp(self.timestamp)
+
+    @property
+    def date(self):
+        return from_timestamp(self.timestamp, DATE_FORMAT)
+
+    @property
+    def day(self):
+        return time.gmtime(self.timestamp).tm_mday
+
+    def to_dict(self):
+        """
+        Function to get the clock event dict representation
+
+        Returns
+        -------
+        dict:
+            Clock data. e.g {'action': 'in', 'datetime': '2020-11-02 08:00:00'}
+        """
+
+        return {'action': self.action_name, 'datetime': self.datetime}
+
+    def __eq__(self, other):
+        return isinstance(other, ClockEvent) and self.timestamp == other.timestamp and self.action == other.action
+
+    def __repr__(self):
+        return f"ClockEvent({self.datetime!r}, {self.action_name!r})"
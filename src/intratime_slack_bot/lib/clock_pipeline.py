@@ -0,0 +1,417 @@
+import time
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pymongo.errors import PyMongoError
+
+from intratime_slack_bot.config import settings
+from intratime_slack_bot.lib import intratime, crypt, codes, time_utils, metrics, messages, worker
+from intratime_slack_bot.lib.db import user, clock as clock_store, clock_queue
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+LOAD_USER_STAGE = 'load_user'
+AUTH_STAGE = 'auth'
+VALIDATE_STAGE = 'validate'
+CLOCK_STAGE = 'clock'
+NOTIFY_STAGE = 'notify'
+VERIFY_STAGE = 'verify'
+
+STAGE_STATS = {stage: metrics.LatencyStats() for stage in [LOAD_USER_STAGE, AUTH_STAGE, VALIDATE_STAGE, CLOCK_STAGE,
+                                                           NOTIFY_STAGE, VERIFY_STAGE]}
+
+VERIFICATION_STATS = {'verified': 0, 'failed': 0}
+VERIFICATION_STATS_LOCK = threading.Lock()
+
+# The clockings are verified in background, out of the user response path
+VERIFY_EXECUTOR = ThreadPoolExecutor(max_workers=settings.CLOCK_VERIFY_WORKERS, thread_name_prefix='clock_verify')
+
+# Seconds before the clocking request from which the clock is searched
+VERIFY_WINDOW = 10
+
+# Intratime errors after which the clocking is queued, to be sent when Intratime recovers
+QUEUEABLE_ERRORS = [codes.INTRATIME_API_CONNECTION_ERROR, codes.INTRATIME_UNAVAILABLE]
+
+QUEUE_STATS = {'queued': 0, 'delivered': 0, 'failed': 0}
+QUEUE_STATS_LOCK = threading.Lock()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+@contextmanager
+def timed_stage(stage):
+    """
+    Context manager to record the duration of a clock pipeline stage
+
+    Parameters
+    ----------
+    stage: str
+        Stage name
+    """
+
+    start_time = time.monotonic()
+
+    try:
+        yield
+    finally:
+        STAGE_STATS[stage].record(time.monotonic() - start_time)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def verify_clocking(credentials, action, datetime_from, on_failure):
+    """
+    Function to check that a clocking has been registered in the user Intratime history
+
+    Parameters
+    ----------
+    credentials: tuple(str, str, str)
+        Slack user_id, intratime email and password
+    action: str
+        Clocked action: [in, pause, return, out]
+    datetime_from: str
+        Datetime in format %Y-%m-%d %H:%M:%S from which the clock is searched
+    on_failure: function
+        Function called with the error code if the clocking could not be verified
+
+    Returns
+    -------
+    int:
+        codes.SUCCESS if the clocking has been found, an error code otherwise
+    """
+
+    with timed_stage(VERIFY_STAGE):
+        clocking_check = intratime.run_with_user_token(*credentials, intratime.get_user_clocks,
+                                                       datetime_from=datetime_from,
+                                                       datetime_to=time_utils.get_current_date_time(),
+                                                       action=action, user_id=credentials[0])
+
+    status = codes.SUCCESS
+
+    if isinstance(clocking_check, int) or len(clocking_check) == 0:
+        status = clocking_check if isinstance(clocking_check, int) else codes.NO_VALID_RESPONSE
+
+    with VERIFICATION_STATS_LOCK:
+        VERIFICATION_STATS['verified' if status == codes.SUCCESS else 'failed'] += 1
+
+    if status != codes.SUCCESS:
+        on_failure(status)
+
+    return status
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def increase_queue_stat(stat):
+    """
+    Function to increase a clock queue counter
+
+    Parameters
+    ----------
+    stat: str
+        Counter name: [queued, delivered, failed]
+    """
+
+    with QUEUE_STATS_LOCK:
+        QUEUE_STATS[stat] += 1
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def queue_clocking(user_id, user_data, action, date_time, error):
+    """
+    Function to queue a clocking that could not be sent because Intratime is not reachable
+
+    Parameters
+    ----------
+    user_id: str
+        Slack user identifier
+    user_data: dict
+        User data
+    action: str
+        Action to clock: [in, pause, return, out]
+    date_time: str
+        Datetime in format %Y-%m-%d %H:%M:%S when the user clocked the action
+    error: int
+        Intratime error code
+
+    Returns
+    -------
+    dict:
+        Clock info (intratime_mail, datetime, action and queued) if the clocking has been queued
+    int:
+        The Intratime error code if the clocking could not be queued
+    """
+
+    try:
+        clock_queue.add_clocking(user_id, action, date_time)
+    except PyMongoError as exception:
+        intratime.LOGGER.error(messages.get(3039, exception))
+        return error
+
+    increase_queue_stat('queued')
+    intratime.LOGGER.info(messages.get(2012, f"- user: {user_data['intratime_mail']}, action: {action}, "
+                                             f"error: {error}"))
+
+    return {'intratime_mail': user_data['intratime_mail'], 'datetime': date_time, 'action': action, 'queued': True}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def clock(user_id, action, on_verify_failure):
+    """
+    Function to clock a user action. The user is loaded once, the session token is taken from the cache, the action is
+    validated against the last clock (one incremental clockings fetch) and the clocking is verified in background.
+
+    If Intratime is not reachable, or the user has clockings waiting in the clock queue, the clocking is queued with
+    the current datetime, to be sent by the clock queue worker.
+
+    Parameters
+    ----------
+    user_id: str
+        Slack user identifier
+    action: str
+        Action to clock: [in, pause, return, out]
+    on_verify_failure: function
+        Function called from the verify thread with the error code if the clocking could not be verified
+
+    Returns
+    -------
+    dict:
+        Clock info (intratime_mail, datetime and action) if the action has been clocked. It also contains queued key
+        if the clocking has been queued
+    tuple(boolean, str):
+        (False, reason) if the action is not compatible with the last user clock
+    int:
+        codes.USER_NOT_FOUND if the user is not registered, or the error code of the Intratime requests
+    """
+
+    clock_datetime = time_utils.get_current_date_time()
+    verify_datetime_from = time_utils.get_past_datetime_from_current_datetime(VERIFY_WINDOW)
+
+    with timed_stage(LOAD_USER_STAGE):
+        user_data = user.get_user_data(user_id)
+
+        if user_data == codes.USER_NOT_FOUND:
+            return user_data
+
+        credentials = (user_id, user_data['intratime_mail'], crypt.decrypt(user_data['password']))
+
+    # The queued clockings of a user are sent in order, so the new ones can not be sent before them
+    if clock_queue.has_pending_clockings(user_id):
+        return queue_clocking(user_id, user_data, action, clock_datetime, codes.INTRATIME_UNAVAILABLE)
+
+    with timed_stage(AUTH_STAGE):
+        token = intratime.get_user_token(*credentials)
+
+    if token in QUEUEABLE_ERRORS:
+        return queue_clocking(user_id, user_data, action, clock_datetime, token)
+
+    if token in intratime.INTRATIME_AUTH_ERRORS:
+        return token
+
+    with timed_stage(VALIDATE_STAGE):
+        user_can_clock_this_action = intratime.run_with_user_token(*credentials, intratime.user_can_clock_this_action,
+                                                                   action=action, user_id=user_id)
+
+    if user_can_clock_this_action in QUEUEABLE_ERRORS:
+        return queue_clocking(user_id, user_data, action, clock_datetime, user_can_clock_this_action)
+
+    if isinstance(user_can_clock_this_action, int) or not user_can_clock_this_action[0]:
+        return user_can_clock_this_action
+
+    # The clocking is sent with the same datetime that it would be queued with, so the queue worker can find it in
+    # the user clocks if a connection error happens after Intratime has received it
+    with timed_stage(CLOCK_STAGE):
+        request_status = intratime.run_with_user_token(*credentials, intratime.clocking, action,
+                                                       email=user_data['intratime_mail'], date_time=clock_datetime)
+
+    if request_status in QUEUEABLE_ERRORS:
+        return queue_clocking(user_id, user_data, action, clock_datetime, request_status)
+
+    if request_status != codes.SUCCESS:
+        return request_status
+
+    VERIFY_EXECUTOR.submit(verify_clocking, credentials, action, verify_datetime_from, on_verify_failure)
+
+    return {'intratime_mail': user_data['intratime_mail'], 'datetime': clock_datetime, 'action': action}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def deliver_queued_clocking(credentials, queued_clocking):
+    """
+    Function to send a queued clocking to Intratime, with the datetime when the user clocked it. The action is
+    validated against the last clock, which could have been sent by the previous queued clocking.
+
+    Parameters
+    ----------
+    credentials: tuple(str, str, str)
+        Slack user_id, intratime email and password
+    queued_clocking: dict
+        Queued clocking
+
+    Returns
+    -------
+    int:
+        codes.SUCCESS if the clocking has been registered, or it was already registered, an error code otherwise
+    tuple(boolean, str):
+        (False, reason) if the action is not compatible with the last user clock
+    """
+
+    user_id, email, _ = credentials
+    action = queued_clocking['action']
+
+    user_can_clock_this_action = intratime.run_with_user_token(*credentials, intratime.user_can_clock_this_action,
+                                                               action=action, user_id=user_id)
+
+    if isinstance(user_can_clock_this_action, int):
+        return user_can_clock_this_action
+
+    if not user_can_clock_this_action[0]:
+        # Intratime received the clocking, but the connection failed before getting its response
+        if clock_store.get_clocks(user_id, queued_clocking['datetime'], queued_clocking['datetime'],
+                                  intratime.get_action_id(action)):
+            return codes.SUCCESS
+
+        return user_can_clock_this_action
+
+    return intratime.run_with_user_token(*credentials, intratime.clocking, action, email=email,
+                                         date_time=queued_clocking['datetime'])
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def deliver_user_queued_clockings(user_id, on_delivery, max_age=settings.CLOCK_QUEUE_MAX_AGE):
+    """
+    Function to send the queued clockings of a user, in the order that they were clocked. It stops at the first one
+    that can not be sent because Intratime is not reachable, so they are retried in the same order.
+
+    Parameters
+    ----------
+    user_id: str
+        Slack user identifier
+    on_delivery: function
+        Function called with the queued clocking and the delivery result (see deliver_queued_clocking) when a queued
+        clocking has been sent or discarded
+    max_age: int
+        Seconds. Queued clockings older than this are discarded if Intratime is still not reachable
+
+    Returns
+    -------
+    int:
+        Number of sent or discarded clockings
+    """
+
+    user_data = user.get_user_data(user_id)
+
+    if user_data == codes.USER_NOT_FOUND:
+        clock_queue.delete_user_clockings(user_id)
+        return 0
+
+    credentials = (user_id, user_data['intratime_mail'], crypt.decrypt(user_data['password']))
+    processed = 0
+
+    for queued_clocking in clock_queue.get_user_pending_clockings(user_id):
+        result = deliver_queued_clocking(credentials, queued_clocking)
+
+        if result in QUEUEABLE_ERRORS:
+            clocking_age = time_utils.get_time_difference(queued_clocking['datetime'],
+                                                          time_utils.get_current_date_time(), time_utils.SECONDS)
+            if clocking_age < max_age:
+                return processed
+
+        if result == codes.SUCCESS:
+            clock_queue.set_clocking_status(queued_clocking['_id'], clock_queue.DELIVERED_STATUS)
+            increase_queue_stat('delivered')
+            intratime.LOGGER.info(messages.get(2013, f"- user: {user_data['intratime_mail']}, "
+                                                     f"action: {queued_clocking['action']}, "
+                                                     f"datetime: {queued_clocking['datetime']}"))
+        else:
+            reason = result if isinstance(result, int) else result[1]
+            clock_queue.set_clocking_status(queued_clocking['_id'], clock_queue.FAILED_STATUS, reason)
+            increase_queue_stat('failed')
+            intratime.LOGGER.error(messages.get(3040, f"- user: {user_data['intratime_mail']}, "
+                                                      f"action: {queued_clocking['action']}, "
+                                                      f"datetime: {queued_clocking['datetime']}, reason: {reason}"))
+
+        on_delivery(queued_clocking, result)
+        processed += 1
+
+    return processed
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def drain_clock_queue(on_delivery, workers=settings.CLOCK_QUEUE_WORKERS):
+    """
+    Function to send the queued clockings of all users. The clockings of each user are sent in order by a single
+    thread. Nothing is sent while the Intratime circuit breaker is open.
+
+    Parameters
+    ----------
+    on_delivery: function
+        Function called with the queued clocking and the delivery result when a queued clocking has been sent or
+        discarded
+    workers: int
+        Number of users whose clockings are sent at the same time
+
+    Returns
+    -------
+    int:
+        Number of sent or discarded clockings
+    """
+
+    if intratime.is_intratime_unavailable():
+        return 0
+
+    return worker.process_by_key(clock_queue.get_pending_user_ids(),
+                                 lambda user_id: deliver_user_queued_clockings(user_id, on_delivery), workers,
+                                 'clock_queue', intratime.LOGGER, 3045)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def start_clock_queue_worker(on_delivery, interval=settings.CLOCK_QUEUE_INTERVAL):
+    """
+    Function to send the queued clockings periodically in a background thread
+
+    Parameters
+    ----------
+    on_delivery: function
+        Function called with the queued clocking and the delivery result when a queued clocking has been sent or
+        discarded
+    interval: int
+        Seconds between runs
+
+    Returns
+    -------
+    threading.Event:
+        Event to stop the worker
+    """
+
+    return worker.start_periodic_worker(lambda: drain_clock_queue(on_delivery), interval, intratime.LOGGER, 3041)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_stats():
+    """
+    Function to get the clock pipeline stats
+
+    Returns
+    -------
+    dict:
+        Latency stats (ms) of each stage, number of verified and failed clock verifications and number of queued,
+        delivered and failed queued clockings
+    """
+
+    with VERIFICATION_STATS_LOCK:
+        verification_stats = dict(VERIFICATION_STATS)
+
+    with QUEUE_STATS_LOCK:
+        queue_stats = dict(QUEUE_STATS)
+
+    return {'stages': {stage: stats.get_stats() for stage, stats in STAGE_STATS.items()},
+            'verification': verification_stats, 'queue': queue_stats}
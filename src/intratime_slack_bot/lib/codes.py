@@ -21,3 +21,8 @@ INVALID_CLOCK_ACTION = 19
 INVALID_HISTORY_ACTION = 20
 MESSAGE_TOO_LONG = 21
 ADD_HISTORY_ERROR = 22
+SLACK_API_CONNECTION_ERROR = 23
+NO_CLOCKS = 24
+INTRATIME_UNAVAILABLE = 25
+MESSAGE_QUEUED = 26
+SLACK_API_RATE_LIMITED = 27
@@ -0,0 +1,138 @@
+import threading
+import time
+
+from intratime_slack_bot.lib import metrics
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class LimitExceededError(Exception):
+    """
+    Raised when a call has waited for a free slot longer than its deadline
+    """
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class AdaptiveLimiter:
+    """
+    Thread-safe concurrency limiter whose limit is adapted with AIMD (additive increase, multiplicative decrease). Each
+    successful call increases the limit by 1 / limit (about one slot per limit calls), and a failed or slow call
+    multiplies it by the decrease factor (at most once per latency threshold, so a burst of slow calls only decreases
+    it once). Calls over the limit wait for a free slot until their deadline.
+
+    Parameters
+    ----------
+    initial_limit: int
+        Initial number of simultaneous calls
+    min_limit: int
+        Minimum number of simultaneous calls
+    max_limit: int
+        Maximum number of simultaneous calls
+    latency_threshold: float
+        Seconds. Calls slower than this decrease the limit
+    decrease_factor: float
+        Factor (0-1) applied to the limit when it is decreased
+    timer: function
+        Function that returns the current time in seconds
+    """
+
+    def __init__(self, initial_limit=20, min_limit=1, max_limit=100, latency_threshold=2, decrease_factor=0.5,
+                 timer=time.monotonic):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.decrease_factor = decrease_factor
+        self.timer = timer
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected_calls = 0
+        self.wait_time = metrics.LatencyStats()
+        self._last_decrease = None
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """
+        Function to take a slot, waiting for a free one if the limit has been reached. It must be followed by release.
+
+        Parameters
+        ----------
+        timeout: float
+            Maximum seconds to wait for a free slot. None to wait without limit
+
+        Raises
+        ------
+        LimitExceededError:
+            If there is no free slot before the timeout
+        """
+
+        start_time = self.timer()
+
+        with self._condition:
+            self.waiting += 1
+
+            try:
+                while self.in_flight >= int(self.limit):
+                    remaining_time = None if timeout is None else timeout - (self.timer() - start_time)
+
+                    if remaining_time is not None and remaining_time <= 0:
+                        self.rejected_calls += 1
+                        raise LimitExceededError(f"no free slot after {timeout}s (limit = {int(self.limit)})")
+
+                    self._condition.wait(remaining_time)
+            finally:
+                self.waiting -= 1
+
+            self.in_flight += 1
+
+        self.wait_time.record(self.timer() - start_time)
+
+    def release(self, latency, failed=False):
+        """
+        Function to free a slot and adapt the limit with the result of the call
+
+        Parameters
+        ----------
+        latency: float
+            Seconds that the call has taken. None if the call has not been done, so the limit is not adapted
+        failed: boolean
+            True if the call has failed because of the called service (e.g connection error or timeout)
+        """
+
+        with self._condition:
+            self.in_flight -= 1
+
+            if latency is not None:
+                self._adapt_limit(latency, failed)
+
+            self._condition.notify_all()
+
+    def _adapt_limit(self, latency, failed):
+        if not failed and latency <= self.latency_threshold:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            return
+
+        now = self.timer()
+
+        if self._last_decrease is None or now - self._last_decrease >= self.latency_threshold:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            self._last_decrease = now
+
+    def get_stats(self):
+        """
+        Function to get the limiter state and stats
+
+        Returns
+        -------
+        dict:
+            Current limit, calls in progress, waiting calls, rejected calls and wait time stats (ms)
+        """
+
+        with self._condition:
+            stats = {'limit': int(self.limit), 'in_flight': self.in_flight, 'waiting': self.waiting,
+                     'rejected_calls': self.rejected_calls}
+
+        stats['wait'] = self.wait_time.get_stats()
+
+        return stats
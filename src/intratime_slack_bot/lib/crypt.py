@@ -1,15 +1,23 @@
 import base64
-import os
+import hashlib
+import threading
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 
 from intratime_slack_bot.config import settings
 
 # ----------------------------------------------------------------------------------------------------------------------
 
+# Process-wide cipher registry. The key derivation is expensive (PBKDF2 with 100000 iterations), so each key is
+# derived only once and the ready Fernet object is stored here indexed by its key ID.
+CIPHERS = {}
+CIPHERS_LOCK = threading.Lock()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
 
 def generate_cipher_key(password=settings.CIPHER_KEY):
     """
@@ -43,6 +51,103 @@ def generate_cipher_key(password=settings.CIPHER_KEY):
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+def get_key_id(password=settings.CIPHER_KEY):
+    """
+    Function to get the identifier of a cipher key, without exposing the key itself
+
+    Parameters
+    ----------
+    password: str
+        Password. It must be 16 || 32 characters long
+
+    Returns
+    -------
+    str:
+        Key identifier
+    """
+
+    return hashlib.sha256(password.encode()).hexdigest()[:16]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_cipher(password=settings.CIPHER_KEY):
+    """
+    Function to get the Fernet cipher associated with a password. The cipher key is derived only the first time,
+    next calls get the cipher from the process-wide registry.
+
+    Parameters
+    ----------
+    password: str
+        Password. It must be 16 || 32 characters long
+
+    Returns
+    -------
+    Fernet:
+        Cipher object
+    """
+
+    key_id = get_key_id(password)
+    cipher = CIPHERS.get(key_id)
+
+    if cipher is None:
+        with CIPHERS_LOCK:
+            cipher = CIPHERS.get(key_id)
+
+            if cipher is None:
+                cipher = Fernet(generate_cipher_key(password))
+                CIPHERS[key_id] = cipher
+
+    return cipher
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_key_ring(password=settings.CIPHER_KEY, retired_passwords=settings.CIPHER_RETIRED_KEYS):
+    """
+    Function to get the key ring cipher. It encrypts with the current key and it can decrypt with the current key or
+    any of the retired keys.
+
+    Parameters
+    ----------
+    password: str
+        Current password. It must be 16 || 32 characters long
+    retired_passwords: list
+        Retired passwords
+
+    Returns
+    -------
+    MultiFernet:
+        Key ring cipher object
+    """
+
+    return MultiFernet([get_cipher(password)] + [get_cipher(item) for item in retired_passwords if item != password])
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_key_ring_ids(password=settings.CIPHER_KEY, retired_passwords=settings.CIPHER_RETIRED_KEYS):
+    """
+    Function to get the key IDs of the key ring, the current key first
+
+    Parameters
+    ----------
+    password: str
+        Current password. It must be 16 || 32 characters long
+    retired_passwords: list
+        Retired passwords
+
+    Returns
+    -------
+    list:
+        Key IDs
+    """
+
+    return [get_key_id(password)] + [get_key_id(item) for item in retired_passwords if item != password]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 def encrypt(text, password=settings.CIPHER_KEY):
     """
     Function to encrypt a text, like a password
@@ -59,7 +164,7 @@ def encrypt(text, password=settings.CIPHER_KEY):
     ciphered_text: str
         Ciphered text
     """
-    cipher = Fernet(generate_cipher_key(password))
+    cipher = get_cipher(password)
     ciphered_text = cipher.encrypt(text.encode()).decode()
 
     return ciphered_text
@@ -67,9 +172,9 @@ def encrypt(text, password=settings.CIPHER_KEY):
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-def decrypt(encrypted_text, password=settings.CIPHER_KEY):
+def decrypt(encrypted_text, password=settings.CIPHER_KEY, retired_passwords=settings.CIPHER_RETIRED_KEYS):
     """
-    Function to decrypt a ciphered text
+    Function to decrypt a ciphered text. The text can be ciphered with the current password or a retired one.
 
     Parameters
     ----------
@@ -77,13 +182,71 @@ def decrypt(encrypted_text, password=settings.CIPHER_KEY):
         Text to decipher
     password: str
         Password. It must be 16 || 32 characters long
+    retired_passwords: list
+        Retired passwords
 
     Returns
     -------
     deciphered_text: str
         Deciphered text
     """
-    cipher = Fernet(generate_cipher_key(password))
+    cipher = get_key_ring(password, retired_passwords)
     deciphered_text = cipher.decrypt(encrypted_text.encode()).decode()
 
     return deciphered_text
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def is_encrypted_with_current_key(encrypted_text, password=settings.CIPHER_KEY):
+    """
+    Function to check if a ciphered text has been encrypted with the current password
+
+    Parameters
+    ----------
+    encrypted_text: str
+        Ciphered text
+    password: str
+        Current password. It must be 16 || 32 characters long
+
+    Returns
+    -------
+    boolean:
+        True if the text can be deciphered with the current password, False otherwise
+    """
+
+    try:
+        get_cipher(password).decrypt(encrypted_text.encode())
+    except InvalidToken:
+        return False
+
+    return True
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def rotate(encrypted_text, password=settings.CIPHER_KEY, retired_passwords=settings.CIPHER_RETIRED_KEYS):
+    """
+    Function to re-encrypt a ciphered text with the current password
+
+    Parameters
+    ----------
+    encrypted_text: str
+        Text ciphered with the current password or a retired one
+    password: str
+        Current password. It must be 16 || 32 characters long
+    retired_passwords: list
+        Retired passwords
+
+    Returns
+    -------
+    str:
+        Text ciphered with the current password
+
+    Raises
+    ------
+    cryptography.fernet.InvalidToken:
+        If the text can not be deciphered with any password of the key ring
+    """
+
+    return get_key_ring(password, retired_passwords).rotate(encrypted_text.encode()).decode()
@@ -0,0 +1,170 @@
+import pymongo
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from intratime_slack_bot.lib.db.database import validate_data, CLOCK_COLLECTION, CLOCK_MODEL, LOGGER
+from intratime_slack_bot.lib import codes, messages
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+DUPLICATE_KEY_ERROR = 11000
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_last_clock(user_id, datetime_from=None, datetime_to=None):
+    """
+    Function to get the most recent clock stored for a user, optionally limited to a time range
+
+    Parameters
+    ----------
+    user_id: str
+        User identifier
+    datetime_from: str
+        Lower datetime limit in format %Y-%m-%d %H:%M:%S. None for no limit
+    datetime_to: str
+        Upper datetime limit in format %Y-%m-%d %H:%M:%S. None for no limit
+
+    Returns
+    -------
+    dict:
+        Clock with INOUT_DATE and INOUT_TYPE keys
+    None:
+        If there are no stored clocks for the user in the time range
+    """
+
+    query = {'user_id': user_id}
+    date_range = {}
+
+    if datetime_from is not None:
+        date_range['$gte'] = datetime_from
+
+    if datetime_to is not None:
+        date_range['$lte'] = datetime_to
+
+    if len(date_range) > 0:
+        query['INOUT_DATE'] = date_range
+
+    return CLOCK_COLLECTION.find_one(query, {'_id': 0, 'INOUT_DATE': 1, 'INOUT_TYPE': 1},
+                                     sort=[('INOUT_DATE', pymongo.DESCENDING)])
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_last_clock_datetime(user_id):
+    """
+    Function to get the datetime of the most recent clock stored for a user
+
+    Parameters
+    ----------
+    user_id: str
+        User identifier
+
+    Returns
+    -------
+    str:
+        Datetime in format %Y-%m-%d %H:%M:%S
+    None:
+        If there are no stored clocks for the user
+    """
+
+    last_clock = get_last_clock(user_id)
+
+    return None if last_clock is None else last_clock['INOUT_DATE']
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def add_clocks(user_id, clocks):
+    """
+    Function to store the user clocks returned by the Intratime API. Clocks that are already stored are skipped.
+
+    Parameters
+    ----------
+    user_id: str
+        User identifier
+    clocks: list
+        Intratime API clock items
+
+    Returns
+    -------
+    int:
+        codes.BAD_REQUEST_DATA if some clock item has not the expected fields
+        codes.SUCCESS if the clocks have been stored successfully
+    """
+
+    operations = []
+
+    for item in clocks:
+        if not validate_data(item, CLOCK_MODEL):
+            LOGGER.error(messages.get(3032, item))
+            return codes.BAD_REQUEST_DATA
+
+        clock_key = {'user_id': user_id, 'INOUT_DATE': item['INOUT_DATE'], 'INOUT_TYPE': item['INOUT_TYPE']}
+        operations.append(UpdateOne(clock_key, {'$setOnInsert': {**item, **clock_key}}, upsert=True))
+
+    if len(operations) == 0:
+        return codes.SUCCESS
+
+    try:
+        CLOCK_COLLECTION.bulk_write(operations, ordered=False)
+    except BulkWriteError as exception:
+        # Clocks inserted in the meantime by a concurrent synchronization
+        if any(error['code'] != DUPLICATE_KEY_ERROR for error in exception.details['writeErrors']):
+            raise
+
+    return codes.SUCCESS
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_clocks(user_id, datetime_from, datetime_to, action_id=None):
+    """
+    Function to get the stored user clocks in a time range, the most recent first
+
+    Parameters
+    ----------
+    user_id: str
+        User identifier
+    datetime_from: str
+        Lower datetime limit in format %Y-%m-%d %H:%M:%S
+    datetime_to: str
+        Upper datetime limit in format %Y-%m-%d %H:%M:%S
+    action_id: int
+        Intratime action ID. None to get all actions
+
+    Returns
+    -------
+    list:
+        Intratime API clock items
+    """
+
+    query = {'user_id': user_id, 'INOUT_DATE': {'$gte': datetime_from, '$lte': datetime_to}}
+
+    if action_id is not None:
+        query['INOUT_TYPE'] = action_id
+
+    return list(CLOCK_COLLECTION.find(query, {'_id': 0, 'user_id': 0}, sort=[('INOUT_DATE', pymongo.DESCENDING)]))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def delete_user_clocks(user_id):
+    """
+    Function to delete all the stored clocks of a user
+
+    Parameters
+    ----------
+    user_id: str
+        User identifier
+
+    Returns
+    -------
+    int:
+        codes.SUCCESS
+    """
+
+    CLOCK_COLLECTION.delete_many({'user_id': user_id})
+
+    return codes.SUCCESS
@@ -0,0 +1,144 @@
+from intratime_slack_bot.lib.db.database import CLOCK_QUEUE_COLLECTION
+from intratime_slack_bot.lib.db import ordered_queue
+from intratime_slack_bot.lib import time_utils
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+KEY_FIELD = 'user_id'
+ORDER_FIELD = 'datetime'
+
+PENDING_STATUS = ordered_queue.PENDING_STATUS
+DELIVERED_STATUS = 'delivered'
+FAILED_STATUS = 'failed'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def add_clocking(user_id, action, date_time):
+    """
+    Function to queue a clocking that could not be sent to Intratime
+
+    Parameters
+    ----------
+    user_id: str
+        Slack user identifier
+    action: str
+        Action enum: ['in', 'out', 'pause', 'return']
+    date_time: str
+        Datetime in format %Y-%m-%d %H:%M:%S when the user clocked the action
+
+    Returns
+    -------
+    dict:
+        Queued clocking
+    """
+
+    clocking = {'user_id': user_id, 'action': action, 'datetime': date_time, 'attempts': 0, 'reason': None,
+                'queued_at': time_utils.get_current_date_time()}
+
+    return ordered_queue.add_item(CLOCK_QUEUE_COLLECTION, clocking)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_pending_user_ids():
+    """
+    Function to get the users that have pending clockings
+
+    Returns
+    -------
+    list:
+        Slack user identifiers
+    """
+
+    return ordered_queue.get_pending_keys(CLOCK_QUEUE_COLLECTION, KEY_FIELD)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def has_pending_clockings(user_id):
+    """
+    Function to check if a user has pending clockings
+
+    Parameters
+    ----------
+    user_id: str
+        Slack user identifier
+
+    Returns
+    -------
+    boolean:
+        True if the user has pending clockings, False otherwise
+    """
+
+    return ordered_queue.has_pending_items(CLOCK_QUEUE_COLLECTION, KEY_FIELD, user_id)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_user_pending_clockings(user_id):
+    """
+    Function to get the pending clockings of a user, in the order that they were clocked
+
+    Parameters
+    ----------
+    user_id: str
+        Slack user identifier
+
+    Returns
+    -------
+    list:
+        Queued clockings
+    """
+
+    return ordered_queue.get_pending_items(CLOCK_QUEUE_COLLECTION, KEY_FIELD, user_id, ORDER_FIELD)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def set_clocking_status(clocking_id, status, reason=None):
+    """
+    Function to update the status of a queued clocking after a delivery attempt
+
+    Parameters
+    ----------
+    clocking_id: ObjectId
+        Queued clocking identifier
+    status: str
+        New status: [pending, delivered, failed]
+    reason: object
+        Error code or description of the last failed attempt
+    """
+
+    ordered_queue.update_item(CLOCK_QUEUE_COLLECTION, clocking_id, {'status': status, 'reason': reason,
+                                                                    'updated_at': time_utils.get_current_date_time()})
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def count_pending_clockings():
+    """
+    Function to get the number of pending clockings
+
+    Returns
+    -------
+    int:
+        Number of pending clockings
+    """
+
+    return ordered_queue.count_items(CLOCK_QUEUE_COLLECTION, PENDING_STATUS)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def delete_user_clockings(user_id):
+    """
+    Function to delete all the queued clockings of a user
+
+    Parameters
+    ----------
+    user_id: str
+        Slack user identifier
+    """
+
+    ordered_queue.delete_key_items(CLOCK_QUEUE_COLLECTION, KEY_FIELD, user_id)
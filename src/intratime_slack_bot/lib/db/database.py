@@ -1,24 +1,205 @@
+import os
+import threading
+import time
 import pymongo
 
+from pymongo import monitoring
+
 from intratime_slack_bot.config import settings
-from intratime_slack_bot.lib import warehouse, logger
+from intratime_slack_bot.lib import warehouse, logger, metrics
 
 # ----------------------------------------------------------------------------------------------------------------------
 
-MONGO_CLIENT = pymongo.MongoClient(warehouse.MONGO_DB_SERVER)
-DB = MONGO_CLIENT['intratime_slack_bot']
-USER_COLLECTION = DB['user']
-REGISTRATION_COLLECTION = DB['registration']
-HISTORY_COLLECTION = DB['history']
+# The client is created on first use, once per process. It must not be shared across fork().
+MONGO_CLIENT = None
+MONGO_CLIENT_LOCK = threading.Lock()
+
+DB_NAME = 'intratime_slack_bot'
 
 USER_MODEL = ['user_id', 'user_name', 'password', 'intratime_mail', 'registration_date', 'last_registration_date']
 HISTORY_MODEL = ['date_time', 'user_name', 'user_id', 'command', 'parameters']
+CLOCK_MODEL = ['INOUT_DATE', 'INOUT_TYPE']
 
 LOGGER = logger.get_logger('database', settings.LOGS_LEVEL)
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+class PoolListener(monitoring.ConnectionPoolListener):
+    """
+    Connection pool listener that records how long the operations wait to check out a connection
+    """
+
+    def __init__(self):
+        self.checkout_wait = metrics.LatencyStats()
+        self.checkout_failures = 0
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        # Check out started and finished events are published by the thread that runs the operation
+        self._local.start_time = time.monotonic()
+
+    def connection_checked_out(self, event):
+        self.checkout_wait.record(time.monotonic() - getattr(self._local, 'start_time', time.monotonic()))
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+POOL_LISTENER = PoolListener()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_client():
+    """
+    Function to get the process Mongo client. It is created the first time.
+
+    Returns
+    -------
+    pymongo.MongoClient:
+        Mongo client
+    """
+
+    global MONGO_CLIENT
+
+    if MONGO_CLIENT is None:
+        with MONGO_CLIENT_LOCK:
+            if MONGO_CLIENT is None:
+                MONGO_CLIENT = pymongo.MongoClient(
+                    warehouse.MONGO_DB_SERVER, connect=False, maxPoolSize=settings.MONGO_DB_MAX_POOL_SIZE,
+                    minPoolSize=settings.MONGO_DB_MIN_POOL_SIZE,
+                    waitQueueTimeoutMS=settings.MONGO_DB_WAIT_QUEUE_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=settings.MONGO_DB_SERVER_SELECTION_TIMEOUT_MS,
+                    event_listeners=[POOL_LISTENER])
+
+    return MONGO_CLIENT
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_collection(name):
+    """
+    Function to get a collection of the app database
+
+    Parameters
+    ----------
+    name: str
+        Collection name
+
+    Returns
+    -------
+    pymongo.collection.Collection:
+        Mongo collection
+    """
+
+    return get_client()[DB_NAME][name]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class LazyCollection:
+    """
+    Collection proxy that resolves the collection of the process client on each use, so importing a module does not
+    open a client.
+
+    Parameters
+    ----------
+    name: str
+        Collection name
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(get_collection(self.name), attribute)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+USER_COLLECTION = LazyCollection('user')
+REGISTRATION_COLLECTION = LazyCollection('registration')
+HISTORY_COLLECTION = LazyCollection('history')
+CLOCK_COLLECTION = LazyCollection('clock')
+HISTORY_ROLLUP_COLLECTION = LazyCollection('history_rollup')
+JOB_COLLECTION = LazyCollection('job')
+CLOCK_QUEUE_COLLECTION = LazyCollection('clock_queue')
+SLACK_OUTBOX_COLLECTION = LazyCollection('slack_outbox')
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_pool_stats():
+    """
+    Function to get the connection pool stats
+
+    Returns
+    -------
+    dict:
+        Pool settings, connection check out wait times (ms) and check out failures
+    """
+
+    return {
+        'max_pool_size': settings.MONGO_DB_MAX_POOL_SIZE,
+        'min_pool_size': settings.MONGO_DB_MIN_POOL_SIZE,
+        'checkout_wait': POOL_LISTENER.checkout_wait.get_stats(),
+        'checkout_failures': POOL_LISTENER.checkout_failures
+    }
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def close_client():
+    """
+    Function to close the process Mongo client and its pooled connections
+    """
+
+    global MONGO_CLIENT
+
+    with MONGO_CLIENT_LOCK:
+        if MONGO_CLIENT is not None:
+            MONGO_CLIENT.close()
+            MONGO_CLIENT = None
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def reset_after_fork():
+    """
+    Function to discard the client inherited from the parent process, without closing its connections. A new one is
+    created on first use.
+    """
+
+    global MONGO_CLIENT, MONGO_CLIENT_LOCK
+
+    MONGO_CLIENT_LOCK = threading.Lock()
+    MONGO_CLIENT = None
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 def validate_data(data, model):
     """
     Function verify the data structure according to a model
@@ -45,3 +226,8 @@ def validate_data(data, model):
             return False
 
     return True
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
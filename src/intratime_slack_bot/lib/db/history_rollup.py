@@ -0,0 +1,264 @@
+from pymongo import UpdateOne
+
+from intratime_slack_bot.config import settings
+from intratime_slack_bot.lib.db.database import HISTORY_COLLECTION, HISTORY_ROLLUP_COLLECTION, JOB_COLLECTION, LOGGER
+from intratime_slack_bot.lib import messages, time_utils, worker
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+COMPACTION_JOB_ID = 'history_compaction'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_compaction_start_date(job_state):
+    """
+    Function to get the first day that has to be counted again: the watermark (last compacted day, which could be
+    incomplete) or, in the first run, the day of the oldest raw register. The raw registers of these days have not been
+    deleted, so their counters can be recalculated from them.
+
+    Parameters
+    ----------
+    job_state: dict
+        Compaction job document, or None in the first run
+
+    Returns
+    -------
+    str:
+        Date in format %Y-%m-%d, or None if there is no history to compact
+    """
+
+    if job_state is not None:
+        return job_state['watermark']
+
+    oldest_register = HISTORY_COLLECTION.find_one({}, {'_id': 0, 'date_time': 1}, sort=[('date_time', 1)])
+
+    return oldest_register['date_time'][:10] if oldest_register is not None else None
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def write_rollups(counters, operator):
+    """
+    Function to write per-user, per-command daily counters in the rollup collection
+
+    Parameters
+    ----------
+    counters: iterable
+        Aggregation results with user_id, command and date as _id and count
+    operator: str
+        '$set' to replace the stored counters or '$inc' to add to them
+
+    Returns
+    -------
+    int:
+        Number of updated rollup documents
+    """
+
+    operations = [UpdateOne({'user_id': counter['_id']['user_id'], 'date': counter['_id']['date'],
+                             'command': counter['_id']['command']}, {operator: {'count': counter['count']}},
+                            upsert=True) for counter in counters]
+
+    if len(operations) == 0:
+        return 0
+
+    result = HISTORY_ROLLUP_COLLECTION.bulk_write(operations, ordered=False)
+
+    return result.upserted_count + result.modified_count
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def compact_day(date, datetime_to, max_id):
+    """
+    Function to calculate the per-user, per-command counters of a day. The counters are replaced, not incremented,
+    so a day can be compacted again while all its raw registers are kept.
+
+    Parameters
+    ----------
+    date: str
+        Date in format %Y-%m-%d
+    datetime_to: str
+        Registers at or after this datetime (in format %Y-%m-%d %H:%M:%S) are not counted
+    max_id: ObjectId
+        Registers written after this one are left for the next run
+
+    Returns
+    -------
+    int:
+        Number of updated rollup documents
+    """
+
+    datetime_to = min(f"{time_utils.get_next_day(date)} 00:00:00", datetime_to)
+    counters = HISTORY_COLLECTION.aggregate([
+        {'$match': {'date_time': {'$gte': f"{date} 00:00:00", '$lt': datetime_to}, '_id': {'$lte': max_id}}},
+        {'$group': {'_id': {'user_id': '$user_id', 'command': '$command', 'date': date}, 'count': {'$sum': 1}}}
+    ])
+
+    return write_rollups(counters, '$set')
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def compact_late_registers(watermark, last_id, max_id):
+    """
+    Function to add to the counters the raw registers of days before the watermark that have been written after the
+    previous run (e.g written late or imported). Those days have already been compacted and their raw registers could
+    have been deleted, so the counters are incremented instead of calculated again.
+
+    Parameters
+    ----------
+    watermark: str
+        Date in format %Y-%m-%d. Previous days have already been compacted
+    last_id: ObjectId
+        Last register counted by the previous run
+    max_id: ObjectId
+        Registers written after this one are left for the next run
+
+    Returns
+    -------
+    int:
+        Number of updated rollup documents
+    """
+
+    counters = HISTORY_COLLECTION.aggregate([
+        {'$match': {'date_time': {'$lt': f"{watermark} 00:00:00"}, '_id': {'$gt': last_id, '$lte': max_id}}},
+        {'$group': {'_id': {'user_id': '$user_id', 'command': '$command', 'date': {'$substr': ['$date_time', 0, 10]}},
+                    'count': {'$sum': 1}}}
+    ])
+
+    return write_rollups(counters, '$inc')
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def compact_history(retention_days=settings.HISTORY_RETENTION_DAYS, lag=settings.HISTORY_COMPACTION_LAG):
+    """
+    Function to compact the raw history registers into daily per-user, per-command counters and delete the compacted
+    registers older than the retention period.
+
+    The days from the watermark (last compacted day, which could be incomplete) to the current one are counted again
+    from their raw registers. The registers of older days written after the previous run are added to the counters
+    of their day. Only whole days before the watermark and the retention period are deleted, so the counters are never
+    calculated from an incomplete day.
+
+    Parameters
+    ----------
+    retention_days: int
+        Days that the raw history registers are kept
+    lag: int
+        Seconds. Registers newer than this are left for the next run, since they could still be pending to be written
+
+    Returns
+    -------
+    dict:
+        Compacted days, updated rollup documents and deleted raw registers
+    """
+
+    summary = {'days': 0, 'rollups': 0, 'deleted': 0}
+    job_state = JOB_COLLECTION.find_one({'_id': COMPACTION_JOB_ID})
+    date = get_compaction_start_date(job_state)
+    last_register = HISTORY_COLLECTION.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+
+    if date is None or last_register is None:
+        return summary
+
+    # The registers written during the run are left for the next one
+    max_id = last_register['_id']
+    datetime_to = time_utils.get_past_datetime_from_current_datetime(lag)
+    watermark = datetime_to[:10]
+
+    # Jobs saved before the last register was tracked have already counted all the registers of the previous days
+    if job_state is not None and job_state.get('last_id') is not None:
+        summary['rollups'] += compact_late_registers(date, job_state['last_id'], max_id)
+
+    while date <= watermark:
+        summary['rollups'] += compact_day(date, datetime_to, max_id)
+        summary['days'] += 1
+        date = time_utils.get_next_day(date)
+
+    JOB_COLLECTION.update_one({'_id': COMPACTION_JOB_ID}, {'$set': {'watermark': watermark, 'last_id': max_id}},
+                              upsert=True)
+
+    retention_date = time_utils.subtract_days_to_datetime(time_utils.get_current_date_time(), retention_days)[:10]
+    delete_datetime_to = f"{min(retention_date, watermark)} 00:00:00"
+    summary['deleted'] = HISTORY_COLLECTION.delete_many({'date_time': {'$lt': delete_datetime_to},
+                                                         '_id': {'$lte': max_id}}).deleted_count
+
+    LOGGER.info(messages.get(2010, f"watermark = {watermark}, {summary}"))
+
+    return summary
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def start_history_compaction(interval=settings.HISTORY_COMPACTION_INTERVAL):
+    """
+    Function to compact the history periodically in a background thread
+
+    Parameters
+    ----------
+    interval: int
+        Seconds between runs
+
+    Returns
+    -------
+    threading.Event:
+        Event to stop the job
+    """
+
+    return worker.start_periodic_worker(compact_history, interval, LOGGER, 3037)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_user_command_counts(user_id, date_from, date_to):
+    """
+    Function to get the number of commands run by a user in a date range, using the daily rollups. The registers not
+    compacted yet are not counted.
+
+    Parameters
+    ----------
+    user_id: str
+        User identifier
+    date_from: str
+        First date (included) in format %Y-%m-%d
+    date_to: str
+        Last date (excluded) in format %Y-%m-%d
+
+    Returns
+    -------
+    dict:
+        Command as key and number of runs as value. e.g {'/clock': 40, '/time': 12}
+    """
+
+    command_counts = {}
+    rollups = HISTORY_ROLLUP_COLLECTION.find({'user_id': user_id, 'date': {'$gte': date_from, '$lt': date_to}},
+                                             {'_id': 0, 'command': 1, 'count': 1})
+
+    for rollup in rollups:
+        command_counts[rollup['command']] = command_counts.get(rollup['command'], 0) + rollup['count']
+
+    return command_counts
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_user_month_command_counts(user_id):
+    """
+    Function to get the number of commands run by a user in the current month. See get_user_command_counts.
+
+    Parameters
+    ----------
+    user_id: str
+        User identifier
+
+    Returns
+    -------
+    dict:
+        Command as key and number of runs as value
+    """
+
+    date_from = time_utils.get_first_month_day()[:10]
+
+    return get_user_command_counts(user_id, date_from, time_utils.get_next_day(time_utils.get_current_date()))
@@ -0,0 +1,190 @@
+import threading
+import time
+import pymongo
+
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure, PyMongoError
+
+from intratime_slack_bot.config import settings
+from intratime_slack_bot.lib.db.database import get_client, USER_COLLECTION, HISTORY_COLLECTION, CLOCK_COLLECTION, \
+    HISTORY_ROLLUP_COLLECTION, CLOCK_QUEUE_COLLECTION, SLACK_OUTBOX_COLLECTION, LOGGER
+from intratime_slack_bot.lib import messages
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+INDEXES = [
+    (USER_COLLECTION, IndexModel([('user_id', pymongo.ASCENDING)], name='user_id_unique', unique=True)),
+    (USER_COLLECTION, IndexModel([('intratime_mail', pymongo.ASCENDING)], name='intratime_mail_unique', unique=True)),
+    (HISTORY_COLLECTION, IndexModel([('user_id', pymongo.ASCENDING), ('date_time', pymongo.ASCENDING)],
+                                    name='user_id_date_time')),
+    (HISTORY_COLLECTION, IndexModel([('date_time', pymongo.ASCENDING)], name='date_time')),
+    (HISTORY_ROLLUP_COLLECTION, IndexModel([('user_id', pymongo.ASCENDING), ('date', pymongo.ASCENDING),
+                                           ('command', pymongo.ASCENDING)], name='user_id_date_command_unique',
+                                          unique=True)),
+    (CLOCK_COLLECTION, IndexModel([('user_id', pymongo.ASCENDING), ('INOUT_DATE', pymongo.DESCENDING),
+                                   ('INOUT_TYPE', pymongo.ASCENDING)], name='user_id_inout_date_unique', unique=True)),
+    (CLOCK_QUEUE_COLLECTION, IndexModel([('status', pymongo.ASCENDING), ('user_id', pymongo.ASCENDING),
+                                         ('datetime', pymongo.ASCENDING)], name='status_user_id_datetime')),
+    (SLACK_OUTBOX_COLLECTION, IndexModel([('status', pymongo.ASCENDING), ('channel', pymongo.ASCENDING),
+                                          ('created_at', pymongo.ASCENDING)], name='status_channel_created_at'))
+]
+
+# Queries run on every request or by the periodic jobs. They must be resolved using an index
+HOT_QUERIES = [
+    ('user_by_user_id', USER_COLLECTION, {'user_id': ''}),
+    ('user_by_intratime_mail', USER_COLLECTION, {'intratime_mail': ''}),
+    ('history_by_user_and_date', HISTORY_COLLECTION, {'user_id': '', 'date_time': {'$gte': '', '$lte': ''}}),
+    ('history_by_date', HISTORY_COLLECTION, {'date_time': {'$gte': '', '$lt': ''}}),
+    ('history_rollup_by_user_and_date', HISTORY_ROLLUP_COLLECTION, {'user_id': '', 'date': {'$gte': '', '$lt': ''}}),
+    ('clocks_by_user_and_date', CLOCK_COLLECTION, {'user_id': '', 'INOUT_DATE': {'$gte': '', '$lte': ''}}),
+    ('clock_queue_by_status_and_user', CLOCK_QUEUE_COLLECTION, {'status': '', 'user_id': ''}),
+    ('slack_outbox_by_status_and_channel', SLACK_OUTBOX_COLLECTION, {'status': '', 'channel': ''})
+]
+
+INDEX_STAGES = ['IXSCAN', 'IDHACK', 'COUNT_SCAN', 'DISTINCT_SCAN']
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_index_build_progress():
+    """
+    Function to get the progress of the index builds running in the database server
+
+    Returns
+    -------
+    list:
+        List of dicts with the index build namespace, message and progress (done and total items)
+    """
+
+    try:
+        operations = get_client().admin.aggregate([{'$currentOp': {}},
+                                                   {'$match': {'command.createIndexes': {'$exists': True}}}])
+    except PyMongoError as exception:
+        LOGGER.error(messages.get(3036, exception))
+        return []
+
+    return [{'namespace': operation.get('ns'), 'message': operation.get('msg'),
+             'progress': operation.get('progress')} for operation in operations]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def log_index_build_progress(stop_event, interval):
+    """
+    Function to log periodically the index build progress until the stop event is set
+
+    Parameters
+    ----------
+    stop_event: threading.Event
+        Event set when the index creation has finished
+    interval: int
+        Seconds between progress logs
+    """
+
+    while not stop_event.wait(interval):
+        for index_build in get_index_build_progress():
+            LOGGER.info(messages.get(2008, index_build))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def create_indexes(progress_interval=settings.INDEX_BUILD_PROGRESS_INTERVAL):
+    """
+    Function to create the indexes of the app collections. Existing indexes are not rebuilt, so it can be run on
+    every startup. Errors are logged and not raised, so an unreachable database does not stop the service startup.
+
+    Parameters
+    ----------
+    progress_interval: int
+        Seconds between index build progress logs
+
+    Returns
+    -------
+    dict:
+        Index name as key and True if the index exists or it has been created, False otherwise
+    """
+
+    index_names = [f"{collection.name}.{index.document['name']}" for collection, index in INDEXES]
+    result = dict.fromkeys(index_names, False)
+    stop_event = threading.Event()
+    progress_thread = threading.Thread(target=log_index_build_progress, args=(stop_event, progress_interval),
+                                       daemon=True)
+    progress_thread.start()
+
+    try:
+        for (collection, index), index_name in zip(INDEXES, index_names):
+            start_time = time.time()
+            LOGGER.info(messages.get(2006, index_name))
+
+            try:
+                collection.create_indexes([index])
+            except OperationFailure as exception:
+                LOGGER.error(messages.get(3034, f"{index_name}: {exception}"))
+                continue
+            except PyMongoError as exception:
+                # THE DATABASE IS NOT REACHABLE, SO THE REMAINING INDEXES ARE NOT TRIED
+                LOGGER.error(messages.get(3034, f"{index_name}: {exception!r}"))
+                break
+
+            LOGGER.info(messages.get(2007, f"{index_name} ({time.time() - start_time:.2f}s)"))
+            result[index_name] = True
+    finally:
+        stop_event.set()
+
+    return result
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_plan_stages(plan):
+    """
+    Function to get all stages of a query plan
+
+    Parameters
+    ----------
+    plan: dict
+        Query plan returned by explain
+
+    Returns
+    -------
+    list:
+        Stage names. e.g ['FETCH', 'IXSCAN']
+    """
+
+    stages = [plan['stage']] if 'stage' in plan else []
+
+    if 'inputStage' in plan:
+        stages.extend(get_plan_stages(plan['inputStage']))
+
+    for input_stage in plan.get('inputStages', []):
+        stages.extend(get_plan_stages(input_stage))
+
+    return stages
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def check_query_plans():
+    """
+    Function to check, using explain, that the hot queries are resolved using an index
+
+    Returns
+    -------
+    dict:
+        Query name as key and True if the winning plan uses an index, False otherwise
+    """
+
+    result = {}
+
+    for query_name, collection, query in HOT_QUERIES:
+        winning_plan = collection.find(query).explain()['queryPlanner']['winningPlan']
+        stages = get_plan_stages(winning_plan)
+        result[query_name] = any(stage in INDEX_STAGES for stage in stages)
+
+        if result[query_name]:
+            LOGGER.info(messages.get(2009, f"{query_name}: {stages}"))
+        else:
+            LOGGER.warning(messages.get(3035, f"{query_name}: {stages}"))
+
+    return result
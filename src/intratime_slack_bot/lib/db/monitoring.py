@@ -1,6 +1,12 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
 from intratime_slack_bot.config import settings
 from intratime_slack_bot.lib.db.database import validate_data, HISTORY_COLLECTION, HISTORY_MODEL, LOGGER
-from intratime_slack_bot.lib import time_utils, codes, logger
+from intratime_slack_bot.lib import time_utils, codes, logger, messages
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -9,6 +15,220 @@ from intratime_slack_bot.lib import time_utils, codes, logger
 MONITORING_LOGGER = logger.get_logger('monitoring', settings.LOGS_LEVEL)
 CLOCKING_LOGGER = logger.get_logger('clocking', settings.LOGS_LEVEL)
 
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class HistoryWriter:
+    """
+    Background writer that inserts the history registers in batches, out of the request thread.
+
+    The registers are kept in a bounded queue and written with insert_many when batch_size registers are pending or
+    flush_interval seconds have passed since the first pending one. If the queue is full, the newest register
+    (drop_newest) or the oldest queued one (drop_oldest) is discarded.
+
+    Parameters
+    ----------
+    collection: pymongo.collection.Collection
+        Collection where the registers are written
+    max_queue_size: int
+        Maximum number of pending registers
+    batch_size: int
+        Maximum number of registers per insert_many
+    flush_interval: float
+        Maximum seconds that a register waits in the queue
+    overflow_policy: str
+        drop_newest or drop_oldest
+    """
+
+    STOP = object()
+
+    def __init__(self, collection, max_queue_size, batch_size, flush_interval, overflow_policy=DROP_NEWEST):
+        self.collection = collection
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.queue = None
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'errors': 0, 'flushes': 0, 'last_flush_seconds': 0}
+
+    def start(self):
+        """
+        Function to start the writer thread. It is started again in forked processes.
+        """
+
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+                return
+
+            # THE QUEUE IS KEPT IF THE THREAD HAS DIED IN THIS PROCESS, SO THAT THE PENDING REGISTERS ARE NOT LOST
+            if self.queue is None or self.pid != os.getpid():
+                self.queue = queue.Queue(self.max_queue_size)
+
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='history-writer', daemon=True)
+            self.thread.start()
+
+    def put(self, data):
+        """
+        Function to queue a register to be written
+
+        Parameters
+        ----------
+        data: dict
+            History register
+
+        Returns
+        -------
+        boolean:
+            True if the register has been queued, False if it has been dropped
+        """
+
+        self.start()
+
+        while True:
+            try:
+                self.queue.put_nowait(data)
+                self.increase_stat('enqueued')
+                return True
+            except queue.Full:
+                self.increase_stat('dropped')
+
+                if self.overflow_policy != DROP_OLDEST:
+                    return False
+
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        """
+        Function run by the writer thread. It groups the queued registers in batches and writes them.
+        """
+
+        batch = []
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is self.STOP:
+                self.flush(batch)
+                return
+
+            if item is not None:
+                batch.append(item)
+                deadline = deadline or time.monotonic() + self.flush_interval
+
+            if len(batch) >= self.batch_size or (deadline is not None and time.monotonic() >= deadline):
+                self.flush(batch)
+                batch = []
+                deadline = None
+
+    def increase_stat(self, name, value=1):
+        """
+        Function to increase a writer counter. The counters are updated from the request threads and the writer thread.
+
+        Parameters
+        ----------
+        name: str
+            Counter name
+        value: int
+            Value to add
+        """
+
+        with self.stats_lock:
+            self.stats[name] += value
+
+    def flush(self, batch):
+        """
+        Function to write a batch of registers. Any error is logged, so that the writer thread never dies.
+
+        Parameters
+        ----------
+        batch: list
+            History registers
+        """
+
+        if len(batch) == 0:
+            return
+
+        start_time = time.monotonic()
+
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            self.increase_stat('written', len(batch))
+        except Exception as exception:
+            LOGGER.error(messages.get(3029, f"{len(batch)} registers lost, error = {exception!r}"))
+            self.increase_stat('errors', len(batch))
+
+        with self.stats_lock:
+            self.stats['flushes'] += 1
+            self.stats['last_flush_seconds'] = round(time.monotonic() - start_time, 4)
+
+    def stop(self, timeout=settings.HISTORY_WRITER_FLUSH_INTERVAL * 2):
+        """
+        Function to write the pending registers and stop the writer thread
+
+        Parameters
+        ----------
+        timeout: float
+            Maximum seconds to wait for the pending registers to be written
+        """
+
+        with self.lock:
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                return
+
+            deadline = time.monotonic() + timeout
+
+            # IT IS CALLED AT EXIT, SO IT MUST NOT BLOCK IF THE WRITER THREAD IS STUCK WITH A FULL QUEUE
+            try:
+                self.queue.put(self.STOP, timeout=timeout)
+            except queue.Full:
+                LOGGER.error(messages.get(3047, f"{self.queue.qsize()} pending registers"))
+                return
+
+            self.thread.join(max(deadline - time.monotonic(), 0))
+            self.thread = None
+
+    def get_stats(self):
+        """
+        Function to get the writer stats
+
+        Returns
+        -------
+        dict:
+            Counters, pending registers and overflow policy
+        """
+
+        with self.stats_lock:
+            stats = dict(self.stats)
+
+        return {**stats, 'pending': 0 if self.queue is None else self.queue.qsize(),
+                'max_queue_size': self.max_queue_size, 'overflow_policy': self.overflow_policy}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+HISTORY_WRITER = HistoryWriter(HISTORY_COLLECTION, settings.HISTORY_WRITER_MAX_QUEUE_SIZE,
+                               settings.HISTORY_WRITER_BATCH_SIZE, settings.HISTORY_WRITER_FLUSH_INTERVAL,
+                               settings.HISTORY_WRITER_OVERFLOW_POLICY)
+
+atexit.register(HISTORY_WRITER.stop)
+
 # ----------------------------------------------------------------------------------------------------------------------
 
 
@@ -50,6 +270,56 @@ def add_history_register(data):
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+def enqueue_history_register(data):
+    """
+    Function to register a user command action without waiting for the database. The register is written in
+    background by the history writer.
+
+    Parameters
+    ----------
+    data: dict
+        User data
+
+    Returns
+    -------
+    int:
+        codes.BAD_USER_DATA if the data structure is no correct (Missing fields...)
+        codes.ADD_HISTORY_ERROR if the register has been dropped because the writer queue is full
+        codes.SUCCESS if the user command action has been queued successfully
+    """
+
+    data['date_time'] = time_utils.get_current_date_time()
+
+    if not validate_data(data, HISTORY_MODEL):
+        LOGGER.error(messages.get(3028))
+        return codes.BAD_USER_DATA
+
+    if not HISTORY_WRITER.put(data):
+        LOGGER.error(messages.get(3029, 'history writer queue is full'))
+        return codes.ADD_HISTORY_ERROR
+
+    MONITORING_LOGGER.info(data)
+
+    return codes.SUCCESS
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_history_writer_stats():
+    """
+    Function to get the history writer stats
+
+    Returns
+    -------
+    dict:
+        Counters, pending registers and overflow policy
+    """
+
+    return HISTORY_WRITER.get_stats()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 def clock_user_action(user_id, user_name, action):
     """
     Function to register a user clock action
@@ -0,0 +1,183 @@
+import pymongo
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Queue of items that are processed in order for each key (e.g the clockings of a user or the messages of a channel).
+# The items are documents of a collection with a key field, an order field and a status.
+
+PENDING_STATUS = 'pending'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def add_item(collection, item):
+    """
+    Function to add an item to the queue, as pending
+
+    Parameters
+    ----------
+    collection: pymongo.collection.Collection
+        Queue collection
+    item: dict
+        Item fields
+
+    Returns
+    -------
+    dict:
+        Queued item
+    """
+
+    queued_item = dict(item, status=PENDING_STATUS)
+    collection.insert_one(queued_item)
+
+    return queued_item
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_pending_keys(collection, key_field):
+    """
+    Function to get the keys that have pending items
+
+    Parameters
+    ----------
+    collection: pymongo.collection.Collection
+        Queue collection
+    key_field: str
+        Field of the item key
+
+    Returns
+    -------
+    list:
+        Keys
+    """
+
+    return collection.distinct(key_field, {'status': PENDING_STATUS})
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def has_pending_items(collection, key_field, key):
+    """
+    Function to check if a key has pending items
+
+    Parameters
+    ----------
+    collection: pymongo.collection.Collection
+        Queue collection
+    key_field: str
+        Field of the item key
+    key: str
+        Item key
+
+    Returns
+    -------
+    boolean:
+        True if the key has pending items, False otherwise
+    """
+
+    return collection.find_one({'status': PENDING_STATUS, key_field: key}, {'_id': 1}) is not None
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_pending_items(collection, key_field, key, order_field):
+    """
+    Function to get the pending items of a key, in order
+
+    Parameters
+    ----------
+    collection: pymongo.collection.Collection
+        Queue collection
+    key_field: str
+        Field of the item key
+    key: str
+        Item key
+    order_field: str
+        Field by which the items are sorted. Items with the same value are returned in the order they were queued
+
+    Returns
+    -------
+    list:
+        Queued items
+    """
+
+    return list(collection.find({'status': PENDING_STATUS, key_field: key},
+                                sort=[(order_field, pymongo.ASCENDING), ('_id', pymongo.ASCENDING)]))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def update_item(collection, item_id, values):
+    """
+    Function to update a queued item after a processing attempt
+
+    Parameters
+    ----------
+    collection: pymongo.collection.Collection
+        Queue collection
+    item_id: ObjectId
+        Queued item identifier
+    values: dict
+        Fields to update (e.g status, reason...)
+    """
+
+    collection.update_one({'_id': item_id}, {'$set': values, '$inc': {'attempts': 1}})
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def delete_item(collection, item_id):
+    """
+    Function to delete a queued item
+
+    Parameters
+    ----------
+    collection: pymongo.collection.Collection
+        Queue collection
+    item_id: ObjectId
+        Queued item identifier
+    """
+
+    collection.delete_one({'_id': item_id})
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def count_items(collection, status=PENDING_STATUS):
+    """
+    Function to get the number of queued items with a status
+
+    Parameters
+    ----------
+    collection: pymongo.collection.Collection
+        Queue collection
+    status: str
+        Item status
+
+    Returns
+    -------
+    int:
+        Number of items
+    """
+
+    return collection.count_documents({'status': status})
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def delete_key_items(collection, key_field, key):
+    """
+    Function to delete all the items of a key, whatever their status
+
+    Parameters
+    ----------
+    collection: pymongo.collection.Collection
+        Queue collection
+    key_field: str
+        Field of the item key
+    key: str
+        Item key
+    """
+
+    collection.delete_many({key_field: key})
@@ -0,0 +1,217 @@
+import time
+
+from intratime_slack_bot.lib.db.database import SLACK_OUTBOX_COLLECTION
+from intratime_slack_bot.lib.db import ordered_queue
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+KEY_FIELD = 'channel'
+ORDER_FIELD = 'created_at'
+
+PENDING_STATUS = ordered_queue.PENDING_STATUS
+DEAD_STATUS = 'dead'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def add_message(channel, message, mgs_type, attempts, reason, created_at=None):
+    """
+    Function to queue a Slack message that could not be posted
+
+    Parameters
+    ----------
+    channel: str
+        Channel ID
+    message: str || list
+        Message to post
+    mgs_type: str
+        enum: 'text', 'attachments' or 'blocks' depending on message type
+    attempts: int
+        Number of failed posts
+    reason: int
+        Error code of the failed post, or codes.MESSAGE_QUEUED if it has not been posted
+    created_at: float
+        Seconds since epoch when the message was sent the first time. Current time if it is not specified
+
+    Returns
+    -------
+    dict:
+        Queued message
+    """
+
+    created_at = time.time() if created_at is None else created_at
+
+    queued_message = {'channel': channel, 'message': message, 'mgs_type': mgs_type, 'attempts': attempts,
+                      'reason': reason, 'created_at': created_at, 'next_attempt_at': time.time()}
+
+    return ordered_queue.add_item(SLACK_OUTBOX_COLLECTION, queued_message)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_pending_channels():
+    """
+    Function to get the channels that have pending messages
+
+    Returns
+    -------
+    list:
+        Channel IDs
+    """
+
+    return ordered_queue.get_pending_keys(SLACK_OUTBOX_COLLECTION, KEY_FIELD)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def has_pending_messages(channel):
+    """
+    Function to check if a channel has pending messages
+
+    Parameters
+    ----------
+    channel: str
+        Channel ID
+
+    Returns
+    -------
+    boolean:
+        True if the channel has pending messages, False otherwise
+    """
+
+    return ordered_queue.has_pending_items(SLACK_OUTBOX_COLLECTION, KEY_FIELD, channel)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_channel_pending_messages(channel):
+    """
+    Function to get the pending messages of a channel, in the order that they were sent
+
+    Parameters
+    ----------
+    channel: str
+        Channel ID
+
+    Returns
+    -------
+    list:
+        Queued messages
+    """
+
+    return ordered_queue.get_pending_items(SLACK_OUTBOX_COLLECTION, KEY_FIELD, channel, ORDER_FIELD)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def delete_message(message_id):
+    """
+    Function to delete a queued message once it has been posted
+
+    Parameters
+    ----------
+    message_id: ObjectId
+        Queued message identifier
+    """
+
+    ordered_queue.delete_item(SLACK_OUTBOX_COLLECTION, message_id)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def set_retry(message_id, next_attempt_at, reason):
+    """
+    Function to schedule the next attempt of a queued message after a failed one
+
+    Parameters
+    ----------
+    message_id: ObjectId
+        Queued message identifier
+    next_attempt_at: float
+        Seconds since epoch from which the message can be posted again
+    reason: int
+        Error code of the failed attempt
+    """
+
+    ordered_queue.update_item(SLACK_OUTBOX_COLLECTION, message_id,
+                              {'next_attempt_at': next_attempt_at, 'reason': reason})
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def set_dead(message_id, reason):
+    """
+    Function to move a queued message to the dead-letter store, so it is not retried until it is replayed
+
+    Parameters
+    ----------
+    message_id: ObjectId
+        Queued message identifier
+    reason: int
+        Error code of the last failed attempt
+    """
+
+    ordered_queue.update_item(SLACK_OUTBOX_COLLECTION, message_id, {'status': DEAD_STATUS, 'reason': reason})
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def replay_dead_messages(channel=None):
+    """
+    Function to move the dead-letter messages back to the queue. They keep their position in the channel order.
+
+    Parameters
+    ----------
+    channel: str
+        Channel ID. If it is not specified, the dead-letter messages of all channels are replayed
+
+    Returns
+    -------
+    int:
+        Number of replayed messages
+    """
+
+    query = {'status': DEAD_STATUS}
+
+    if channel is not None:
+        query['channel'] = channel
+
+    result = SLACK_OUTBOX_COLLECTION.update_many(query, {'$set': {'status': PENDING_STATUS, 'attempts': 0,
+                                                                  'next_attempt_at': time.time()}})
+
+    return result.modified_count
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def count_messages(status):
+    """
+    Function to get the number of queued messages with a status
+
+    Parameters
+    ----------
+    status: str
+        Message status: [pending, dead]
+
+    Returns
+    -------
+    int:
+        Number of messages
+    """
+
+    return ordered_queue.count_items(SLACK_OUTBOX_COLLECTION, status)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def delete_channel_messages(channel):
+    """
+    Function to delete all the queued and dead-letter messages of a channel
+
+    Parameters
+    ----------
+    channel: str
+        Channel ID
+    """
+
+    ordered_queue.delete_key_items(SLACK_OUTBOX_COLLECTION, KEY_FIELD, channel)
@@ -1,6 +1,80 @@
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from cryptography.fernet import InvalidToken
+
 from intratime_slack_bot.config import settings
 from intratime_slack_bot.lib.db.database import validate_data, USER_COLLECTION, USER_MODEL, LOGGER
-from intratime_slack_bot.lib import warehouse, codes, messages, time_utils, logger
+from intratime_slack_bot.lib import warehouse, codes, messages, time_utils, logger, crypt, cache
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Read-through cache of user documents indexed by user_id. Unregistered users are cached as None (negative caching)
+# with a shorter TTL, so a sign up made by another process is noticed soon. Each process has its own cache, so the TTL
+# bounds how long a change made by another process can be unnoticed.
+USER_CACHE = cache.TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+NOT_CACHED = object()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_user_document(user_id):
+    """
+    Function to get the user document, reading it from the database only if it is not cached
+
+    Parameters
+    ----------
+    user_id: str
+        User identifier
+
+    Returns
+    -------
+    dict:
+        User document copy, or None if the user is not registered
+    """
+
+    user_data = USER_CACHE.get(user_id, NOT_CACHED)
+
+    if user_data is NOT_CACHED:
+        # If the user is updated (and invalidated) while it is read, the read document is not cached
+        generation = USER_CACHE.get_generation(user_id)
+        user_data = USER_COLLECTION.find_one({'user_id': user_id})
+        USER_CACHE.set(user_id, user_data, ttl=None if user_data is not None else settings.USER_CACHE_NEGATIVE_TTL,
+                       generation=generation)
+
+    # Callers can modify the returned document, so the cached one is never shared
+    return dict(user_data) if user_data is not None else None
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def invalidate_user_cache(*user_ids):
+    """
+    Function to remove the cached documents of some users. It must be called after every user write.
+
+    Parameters
+    ----------
+    user_ids: str
+        User identifiers
+    """
+
+    for user_id in user_ids:
+        USER_CACHE.delete(user_id)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_user_cache_stats():
+    """
+    Function to get the user cache usage stats
+
+    Returns
+    -------
+    dict:
+        Cache size, max size, hits, misses and hit ratio
+    """
+
+    return USER_CACHE.get_stats()
 
 # ----------------------------------------------------------------------------------------------------------------------
 
@@ -20,10 +94,7 @@ def user_exist(user_id):
         True if the user exists, False otherwise
     """
 
-    if USER_COLLECTION.count_documents({'user_id': user_id}) <= 0:
-        return False
-
-    return True
+    return get_user_document(user_id) is not None
 
 # ----------------------------------------------------------------------------------------------------------------------
 
@@ -50,13 +121,20 @@ def add_user(data):
         LOGGER.error(messages.get(3028))
         return codes.BAD_USER_DATA
 
-    if user_exist(data['user_id']):
+    # The user is only inserted if there is no other one with the same user_id
+    try:
+        insert_request = USER_COLLECTION.update_one({'user_id': data['user_id']}, {'$setOnInsert': data}, upsert=True)
+    except DuplicateKeyError:
         LOGGER.error(messages.get(3010))
         return codes.USER_ALREADY_EXIST
+    finally:
+        invalidate_user_cache(data['user_id'])
 
-    insert_request = USER_COLLECTION.insert_one(data)
+    if insert_request.upserted_id is None:
+        if insert_request.matched_count > 0:
+            LOGGER.error(messages.get(3010))
+            return codes.USER_ALREADY_EXIST
 
-    if insert_request.inserted_id is None:
         LOGGER.error(messages.get(3006))
         return codes.USER_CREATION_ERROR
 
@@ -84,16 +162,17 @@ def delete_user(user_id):
         codes.SUCCESS if the user has been deleted successfully
     """
 
-    if not user_exist(user_id):
-        LOGGER.error(messages.get(3008, "user not exists"))
-        return codes.USER_NOT_FOUND
-
     delete_request = USER_COLLECTION.delete_one({'user_id': user_id})
+    invalidate_user_cache(user_id)
 
-    if delete_request.deleted_count <= 0:
+    if not delete_request.acknowledged:
         LOGGER.error(messages.get(3008))
         return codes.USER_DELETE_ERROR
 
+    if delete_request.deleted_count <= 0:
+        LOGGER.error(messages.get(3008, "user not exists"))
+        return codes.USER_NOT_FOUND
+
     LOGGER.info(messages.get(2002, user_id))
 
     return codes.SUCCESS
@@ -121,15 +200,23 @@ def update_user(user_id, new_data):
         codes.SUCCESS if the user has been updated successfully
     """
 
-    if not user_exist(user_id):
-        LOGGER.error(messages.get(3009, "user not exists"))
-        return codes.USER_NOT_FOUND
-
     if not validate_data(new_data, USER_MODEL):
         LOGGER.error(messages.get(3028))
         return codes.BAD_USER_DATA
 
-    update_request = USER_COLLECTION.update_one({'user_id': user_id}, {'$set': new_data})
+    new_data = {key: value for key, value in new_data.items() if key != '_id'}
+
+    try:
+        update_request = USER_COLLECTION.update_one({'user_id': user_id}, {'$set': new_data})
+    except DuplicateKeyError as exception:
+        LOGGER.error(messages.get(3009, exception))
+        return codes.USER_UPDATE_ERROR
+    finally:
+        invalidate_user_cache(user_id, new_data['user_id'])
+
+    if update_request.matched_count <= 0:
+        LOGGER.error(messages.get(3009, "user not exists"))
+        return codes.USER_NOT_FOUND
 
     if update_request.modified_count <= 0:
         LOGGER.error(messages.get(3009))
@@ -159,12 +246,12 @@ def get_user_data(user_id):
         codes.USER_NOT_FOUND if the user_id does not correspond with a registered user
     """
 
-    if not user_exist(user_id):
+    user_data = get_user_document(user_id)
+
+    if user_data is None:
         LOGGER.error(messages.get(3009, "user not exists"))
         return codes.USER_NOT_FOUND
 
-    user_data = USER_COLLECTION.find_one({'user_id': user_id})
-
     return user_data
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -202,24 +289,53 @@ def update_last_registration_datetime(user_id):
         codes.SUCCESS if the data has been updated successfully
     """
 
-    if not user_exist(user_id):
+    update_request = USER_COLLECTION.update_one(
+        {'user_id': user_id}, {'$set': {'last_registration_date': time_utils.get_current_date_time()}})
+    invalidate_user_cache(user_id)
+
+    if not update_request.acknowledged:
+        LOGGER.error(messages.get(3009))
+        return codes.USER_UPDATE_ERROR
+
+    if update_request.matched_count <= 0:
         LOGGER.error(messages.get(3009, "user not exists"))
         return codes.USER_NOT_FOUND
 
-    user_data = get_user_data(user_id)
+    return codes.SUCCESS
 
-    try:
-        user_data['last_registration_date'] = time_utils.get_current_date_time()
-    except KeyError:
-        LOGGER.error(messages.get(3012))
+# ----------------------------------------------------------------------------------------------------------------------
 
-    update_request = USER_COLLECTION.update_one({'user_id': user_id}, {'$set': user_data})
 
-    if update_request.modified_count <= 0:
-        LOGGER.error(messages.get(3009))
-        return codes.USER_UPDATE_ERROR
+def update_last_registration_datetime_by_email(email):
+    """
+    Function to update the last registration user info given the user intratime email
 
-    return codes.SUCCESS
+    Parameters
+    ----------
+    email: str
+        User email
+
+    Returns
+    -------
+    str:
+        user_id of the updated user
+    int:
+        codes.BAD_USER_EMAIL if the email does not correspond with a registered user
+    """
+
+    user_data = USER_COLLECTION.find_one_and_update({'intratime_mail': email},
+                                                    {'$set': {'last_registration_date':
+                                                              time_utils.get_current_date_time()}},
+                                                    projection={'_id': 0, 'user_id': 1},
+                                                    return_document=ReturnDocument.AFTER)
+
+    if user_data is None:
+        LOGGER.error(messages.get(3011, f"email = {email}"))
+        return codes.BAD_USER_EMAIL
+
+    invalidate_user_cache(user_data['user_id'])
+
+    return user_data['user_id']
 
 # ----------------------------------------------------------------------------------------------------------------------
 
@@ -241,9 +357,63 @@ def get_user_id(email):
         codes.BAD_USER_EMAIL if the email does not correspond with a registered user
     """
 
-    user_data = USER_COLLECTION.find_one({"intratime_mail": email})
+    user_data = USER_COLLECTION.find_one({"intratime_mail": email}, {'_id': 0, 'user_id': 1})
 
     if user_data is None:
         return codes.BAD_USER_EMAIL
 
     return user_data['user_id']
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def rotate_passwords_encryption(batch_size=settings.CIPHER_ROTATION_BATCH_SIZE):
+    """
+    Function to re-encrypt the stored user passwords with the current cipher key.
+
+    The users are streamed from the database in batches and updated with bulk writes. Each update is only applied if
+    the password has not been changed in the meantime, so it can be run while the service is running.
+
+    Parameters
+    ----------
+    batch_size: int
+        Number of users read and updated per batch
+
+    Returns
+    -------
+    dict:
+        Number of rotated, skipped (already encrypted with the current key) and failed passwords
+    """
+
+    summary = {'rotated': 0, 'skipped': 0, 'errors': 0}
+    operations = []
+
+    def flush_operations():
+        if len(operations) > 0:
+            summary['rotated'] += USER_COLLECTION.bulk_write(operations, ordered=False).modified_count
+            operations.clear()
+
+    for user_data in USER_COLLECTION.find({}, {'user_id': 1, 'password': 1}, batch_size=batch_size):
+        if crypt.is_encrypted_with_current_key(user_data['password']):
+            summary['skipped'] += 1
+            continue
+
+        try:
+            new_password = crypt.rotate(user_data['password'])
+        except InvalidToken:
+            LOGGER.error(messages.get(3031, f"user_id = {user_data['user_id']}"))
+            summary['errors'] += 1
+            continue
+
+        operations.append(UpdateOne({'_id': user_data['_id'], 'password': user_data['password']},
+                                    {'$set': {'password': new_password}}))
+
+        if len(operations) >= batch_size:
+            flush_operations()
+
+    flush_operations()
+    USER_CACHE.clear()
+
+    LOGGER.info(messages.get(2005, f"key_ids = {crypt.get_key_ring_ids()}, {summary}"))
+
+    return summary
@@ -0,0 +1,184 @@
+import atexit
+import os
+import threading
+import requests
+
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+from intratime_slack_bot.config import settings
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Keep-alive sessions indexed by host (scheme://netloc). Each one has its own connection pool.
+SESSIONS = {}
+SESSIONS_LOCK = threading.Lock()
+
+DEFAULT_TIMEOUT = (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_host(url):
+    """
+    Function to get the host of an URL
+
+    Parameters
+    ----------
+    url: str
+        Request URL
+
+    Returns
+    -------
+    str:
+        Host in scheme://netloc format. e.g https://slack.com
+    """
+
+    split_url = urlsplit(url)
+
+    return f"{split_url.scheme}://{split_url.netloc}"
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def create_session(host):
+    """
+    Function to create a keep-alive session with a connection pool for a host
+
+    Parameters
+    ----------
+    host: str
+        Host in scheme://netloc format
+
+    Returns
+    -------
+    requests.Session:
+        HTTP session
+    """
+
+    session = requests.Session()
+
+    # The session is shared by all users, so cookies must not be kept between requests
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.HTTP_POOL_MAX_SIZE,
+                          pool_block=settings.HTTP_POOL_BLOCK)
+    session.mount(host, adapter)
+
+    return session
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_session(url):
+    """
+    Function to get the shared session for the URL host. It is created the first time.
+
+    Parameters
+    ----------
+    url: str
+        Request URL
+
+    Returns
+    -------
+    requests.Session:
+        HTTP session
+    """
+
+    host = get_host(url)
+    session = SESSIONS.get(host)
+
+    if session is None:
+        with SESSIONS_LOCK:
+            session = SESSIONS.get(host)
+
+            if session is None:
+                session = create_session(host)
+                SESSIONS[host] = session
+
+    return session
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def request(method, url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """
+    Function to send an HTTP request using the pooled session of the URL host
+
+    Parameters
+    ----------
+    method: str
+        HTTP method
+    url: str
+        Request URL
+    timeout: tuple
+        (connect timeout, read timeout) in seconds
+    kwargs: dict
+        requests.request parameters
+
+    Returns
+    -------
+    requests.Response:
+        Request response
+
+    Raises
+    ------
+    requests.exceptions.RequestException:
+        If there is a connection error or timeout
+    """
+
+    return get_session(url).request(method, url, timeout=timeout, **kwargs)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get(url, **kwargs):
+    """
+    Function to send a GET request. See request function.
+    """
+
+    return request('GET', url, **kwargs)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def post(url, **kwargs):
+    """
+    Function to send a POST request. See request function.
+    """
+
+    return request('POST', url, **kwargs)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def close():
+    """
+    Function to close all sessions and their pooled connections
+    """
+
+    with SESSIONS_LOCK:
+        for session in SESSIONS.values():
+            session.close()
+
+        SESSIONS.clear()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def reset_after_fork():
+    """
+    Function to discard the sessions inherited from the parent process, without closing its connections
+    """
+
+    global SESSIONS_LOCK
+
+    SESSIONS_LOCK = threading.Lock()
+    SESSIONS.clear()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+atexit.register(close)
+os.register_at_fork(after_in_child=reset_after_fork)
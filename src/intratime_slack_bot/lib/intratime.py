@@ -2,14 +2,19 @@ import requests
 import json
 import re
 import logging
+import time
 
+from dataclasses import dataclass, field
 from datetime import datetime, date
+from types import MappingProxyType
 from http import HTTPStatus
 
 from http import HTTPStatus
-from intratime_slack_bot.lib import codes, messages, time_utils, logger
+from intratime_slack_bot.lib import codes, messages, time_utils, logger, cache, http_client, circuit_breaker, \
+    concurrency_limiter
+from intratime_slack_bot.lib.clock_event import ClockEvent, ClockAction, to_timestamp
 from intratime_slack_bot.config import settings
-from intratime_slack_bot.lib.db import user
+from intratime_slack_bot.lib.db import user, clock
 
 # ----------------------------------------------------------------------------------------------------------------------
 
@@ -21,20 +26,274 @@ OUT_ACTION = 'out'
 
 INTRATIME_API_URL = 'http://newapi.intratime.es'
 INTRATIME_API_LOGIN_PATH = '/api/user/login'
-INTRATIME_API_CLOCKING_PATH = f'{INTRATIME_API_URL}/api/user/clocking'
-INTRATIME_API_USER_CLOCKINGS_PATH = f'{INTRATIME_API_URL}/api/user/clockings'
+INTRATIME_API_CLOCKING_PATH = '/api/user/clocking'
+INTRATIME_API_USER_CLOCKINGS_PATH = '/api/user/clockings'
 INTRATIME_API_APPLICATION_HEADER = 'Accept: application/vnd.apiintratime.v1+json'
-INTRATIME_API_HEADER = {
+
+# Read-only: the user token is added to a copy of these headers on each request
+INTRATIME_API_HEADER = MappingProxyType({
                             'Accept': 'application/vnd.apiintratime.v1+json',
                             'Content-Type': 'application/x-www-form-urlencoded',
                             'charset': 'utf8'
-                        }
+                        })
+
+# Raised when a request is not sent to protect the Intratime API
+REJECTED_REQUEST_ERRORS = (circuit_breaker.CircuitOpenError, concurrency_limiter.LimitExceededError)
+
+INTRATIME_AUTH_ERRORS = [codes.INTRATIME_API_CONNECTION_ERROR, codes.INTRATIME_AUTH_ERROR, codes.INTRATIME_UNAVAILABLE]
+
+# Seconds. Older clocks are not taken into account to get the last user clock
+LAST_CLOCK_MAX_AGE = 2592000  # 1 month
+
+# User session tokens indexed by (slack user_id, intratime email)
+TOKEN_CACHE = cache.TTLCache(settings.INTRATIME_TOKEN_CACHE_SIZE, settings.INTRATIME_TOKEN_CACHE_TTL)
+
+TIME_RANGES = ['today', 'week', 'month']
+
+# Parsed clock data indexed by (token, time range). The identical concurrent requests share a single fetch
+CLOCK_DATA_CACHE = cache.SingleFlightCache(settings.INTRATIME_CLOCK_DATA_CACHE_SIZE,
+                                           settings.INTRATIME_CLOCK_DATA_CACHE_TTL,
+                                           should_cache=lambda data: not isinstance(data, int))
 
 LOGGER = logger.get_logger('intratime', settings.LOGS_LEVEL)
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+def log_breaker_state_change(old_state, new_state):
+    """
+    Function to log the Intratime circuit breaker state changes
+
+    Parameters
+    ----------
+    old_state: str
+        Previous breaker state
+    new_state: str
+        Current breaker state
+    """
+
+    LOGGER.warning(messages.get(2011, f"{old_state} -> {new_state}"))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def create_breaker():
+    """
+    Function to create the Intratime circuit breaker with the settings configuration
+
+    Returns
+    -------
+    circuit_breaker.CircuitBreaker:
+        Circuit breaker
+    """
+
+    return circuit_breaker.CircuitBreaker(failure_rate_threshold=settings.INTRATIME_BREAKER_FAILURE_RATE,
+                                          minimum_calls=settings.INTRATIME_BREAKER_MINIMUM_CALLS,
+                                          window_size=settings.INTRATIME_BREAKER_WINDOW_SIZE,
+                                          open_timeout=settings.INTRATIME_BREAKER_OPEN_TIMEOUT,
+                                          on_state_change=log_breaker_state_change)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def create_limiter():
+    """
+    Function to create the Intratime concurrency limiter with the settings configuration
+
+    Returns
+    -------
+    concurrency_limiter.AdaptiveLimiter:
+        Concurrency limiter
+    """
+
+    return concurrency_limiter.AdaptiveLimiter(initial_limit=settings.INTRATIME_LIMITER_INITIAL_LIMIT,
+                                               min_limit=settings.INTRATIME_LIMITER_MIN_LIMIT,
+                                               max_limit=settings.INTRATIME_LIMITER_MAX_LIMIT,
+                                               latency_threshold=settings.INTRATIME_LIMITER_LATENCY_THRESHOLD)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def is_server_error(status_code):
+    """
+    Function to check if a response status code is an Intratime failure
+
+    Parameters
+    ----------
+    status_code: int
+        Response HTTP status code
+
+    Returns
+    -------
+    boolean:
+        True if it is a 5xx status code, False otherwise
+    """
+
+    return status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class IntratimeClient:
+    """
+    Intratime API client. It is immutable and the request headers are built for each request, so it can be shared by
+    all the request threads.
+
+    Parameters
+    ----------
+    base_url: str
+        Intratime API URL
+    headers: MappingProxyType
+        Headers sent in all requests
+    breaker: circuit_breaker.CircuitBreaker
+        Circuit breaker in front of the Intratime API. Connection errors, timeouts and 5xx responses are failures
+    limiter: concurrency_limiter.AdaptiveLimiter
+        Limiter of the simultaneous requests, adapted to the Intratime API latency and errors
+    get_retries: int
+        Number of retries of the GET requests. The other requests are not idempotent, so they are not retried
+    """
+
+    base_url: str = INTRATIME_API_URL
+    headers: MappingProxyType = field(default_factory=lambda: INTRATIME_API_HEADER)
+    breaker: circuit_breaker.CircuitBreaker = field(default_factory=create_breaker, compare=False)
+    limiter: concurrency_limiter.AdaptiveLimiter = field(default_factory=create_limiter, compare=False)
+    get_retries: int = settings.INTRATIME_GET_RETRIES
+
+    def get_headers(self, token=None):
+        """
+        Function to build the headers of a request
+
+        Parameters
+        ----------
+        token: str
+            User session token. None if the request is not authenticated
+
+        Returns
+        -------
+        dict:
+            New dict with the request headers
+        """
+
+        headers = dict(self.headers)
+
+        if token is not None:
+            headers['token'] = token
+
+        return headers
+
+    def send(self, method, path, token=None, **kwargs):
+        """
+        Function to send a request to the Intratime API through the concurrency limiter and the circuit breaker
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        path: str
+            API path. e.g /api/user/clocking
+        token: str
+            User session token. None if the request is not authenticated
+        kwargs: dict
+            http_client.request parameters
+
+        Returns
+        -------
+        requests.Response:
+            Request response
+
+        Raises
+        ------
+        requests.exceptions.RequestException:
+            If there is a connection error or timeout
+        circuit_breaker.CircuitOpenError:
+            If the circuit breaker is open
+        concurrency_limiter.LimitExceededError:
+            If the request has waited too long for a free request slot
+        """
+
+        self.limiter.acquire(settings.INTRATIME_LIMITER_QUEUE_TIMEOUT)
+
+        try:
+            self.breaker.before_call()
+        except circuit_breaker.CircuitOpenError:
+            self.limiter.release(None)
+            raise
+
+        start_time = time.monotonic()
+
+        try:
+            response = http_client.request(method, f"{self.base_url}{path}", headers=self.get_headers(token),
+                                           **kwargs)
+        except Exception:
+            # Any error, not only the connection ones, must free the request slot and the half-open probe call
+            self.limiter.release(time.monotonic() - start_time, failed=True)
+            self.breaker.record_failure()
+            raise
+
+        failed = is_server_error(response.status_code)
+        self.limiter.release(time.monotonic() - start_time, failed=failed)
+
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+        return response
+
+    def request(self, method, path, token=None, **kwargs):
+        """
+        Function to send a request to the Intratime API. The GET requests are retried if they fail.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        path: str
+            API path. e.g /api/user/clocking
+        token: str
+            User session token. None if the request is not authenticated
+        kwargs: dict
+            http_client.request parameters
+
+        Returns
+        -------
+        requests.Response:
+            Request response
+
+        Raises
+        ------
+        requests.exceptions.RequestException:
+            If there is a connection error or timeout
+        circuit_breaker.CircuitOpenError:
+            If the circuit breaker is open
+        concurrency_limiter.LimitExceededError:
+            If the request has waited too long for a free request slot
+        """
+
+        retries = self.get_retries if method == 'GET' else 0
+        attempt = 0
+
+        while True:
+            try:
+                response = self.send(method, path, token, **kwargs)
+            except requests.exceptions.RequestException:
+                if attempt >= retries:
+                    raise
+            else:
+                if not is_server_error(response.status_code) or attempt >= retries:
+                    return response
+
+            time.sleep(circuit_breaker.get_retry_delay(attempt, settings.INTRATIME_RETRY_BASE_DELAY,
+                                                       settings.INTRATIME_RETRY_MAX_DELAY))
+            attempt += 1
+
+
+INTRATIME_CLIENT = IntratimeClient()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 def get_action_id(action):
     """
     Function to get the intratime action ID
@@ -65,6 +324,54 @@ def get_action_id(action):
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+def get_login_payload(email, password):
+    """
+    Function to build the Intratime login request body
+
+    Parameters
+    ----------
+    email: str
+        User authentication email
+    password: str
+        User authentication password
+
+    Returns
+    -------
+    str:
+        Form encoded request body
+    """
+
+    return f"user={email}&pin={password}"
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def parse_auth_token(response_text):
+    """
+    Function to get the user session token from the Intratime login response
+
+    Parameters
+    ----------
+    response_text: str
+        Login response body
+
+    Returns
+    -------
+    str:
+        User session token
+    int:
+       codes.INTRATIME_AUTH_ERROR if user authentication has failed
+    """
+
+    try:
+        return json.loads(response_text)['USER_TOKEN']
+    except (KeyError, ValueError, TypeError) as exception:
+        LOGGER.error(messages.get(3003, exception))
+        return codes.INTRATIME_AUTH_ERROR
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 def get_auth_token(email, password):
     """
     Function to get the Intratime auth token
@@ -82,29 +389,203 @@ def get_auth_token(email, password):
         User session token
     int:
        codes.INTRATIME_AUTH_ERROR if user authentication has failed
-       codes.INTRATIME_API_CONNECTION_ERROR if there is a Intratime API connection error
+       codes.INTRATIME_API_CONNECTION_ERROR if there is a Intratime API connection error or server error (5xx)
+       codes.INTRATIME_UNAVAILABLE if the request has been rejected to protect the Intratime API
     """
 
-    payload = f"user={email}&pin={password}"
-
     try:
-        request = requests.post(url=f"{INTRATIME_API_URL}{INTRATIME_API_LOGIN_PATH}", data=payload,
-                                headers=INTRATIME_API_HEADER)
-    except ConnectionError as exception:
-        LOGGER.error(messages.get(30002, exception))
+        request = INTRATIME_CLIENT.request('POST', INTRATIME_API_LOGIN_PATH, data=get_login_payload(email, password))
+    except REJECTED_REQUEST_ERRORS as exception:
+        LOGGER.warning(messages.get(3038, exception))
+        return codes.INTRATIME_UNAVAILABLE
+    except requests.exceptions.RequestException as exception:
+        LOGGER.error(messages.get(3002, exception))
         return codes.INTRATIME_API_CONNECTION_ERROR
 
-    try:
-        token = json.loads(request.text)['USER_TOKEN']
-    except KeyError as exception:
-        LOGGER.error(messages.get(3003, exception))
-        return codes.INTRATIME_AUTH_ERROR
+    # A failing Intratime API is not an authentication error
+    if is_server_error(request.status_code):
+        LOGGER.error(messages.get(3002, f"Status code = {request.status_code}"))
+        return codes.INTRATIME_API_CONNECTION_ERROR
+
+    return parse_auth_token(request.text)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_user_token(user_id, email, password):
+    """
+    Function to get the Intratime auth token of a user. The token is only requested to the Intratime API if it is not
+    in the token cache.
+
+    Parameters
+    ----------
+    user_id: str
+        Slack user identifier
+    email: str
+        User authentication email
+    password: str
+        User authentication password
+
+    Returns
+    -------
+    str:
+        User session token
+    int:
+       codes.INTRATIME_AUTH_ERROR if user authentication has failed
+       codes.INTRATIME_API_CONNECTION_ERROR if there is a Intratime API connection error
+       codes.INTRATIME_UNAVAILABLE if the request has been rejected to protect the Intratime API
+    """
+
+    token = TOKEN_CACHE.get((user_id, email))
+
+    if token is not None:
+        return token
+
+    token = get_auth_token(email, password)
+
+    if token not in INTRATIME_AUTH_ERRORS:
+        TOKEN_CACHE.set((user_id, email), token)
 
     return token
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+def invalidate_user_token(user_id, email):
+    """
+    Function to remove the user token from the token cache, and the clock data cached with it
+
+    Parameters
+    ----------
+    user_id: str
+        Slack user identifier
+    email: str
+        User authentication email
+    """
+
+    token = TOKEN_CACHE.get((user_id, email))
+    TOKEN_CACHE.delete((user_id, email))
+
+    if token is not None:
+        invalidate_clock_data(token)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def run_with_user_token(user_id, email, password, function, /, *args, **kwargs):
+    """
+    Function to run an Intratime function that needs the user token (passed as token keyword argument). If the
+    function returns codes.UNAUTHORIZED, the cached token is discarded and the function is run once again with a new
+    token.
+
+    The credentials and the function are positional-only, so the function keyword arguments can also be named user_id.
+
+    Parameters
+    ----------
+    user_id: str
+        Slack user identifier
+    email: str
+        User authentication email
+    password: str
+        User authentication password
+    function: function
+        Function to run
+    args: list
+        Function positional arguments
+    kwargs: dict
+        Function keyword arguments
+
+    Returns
+    -------
+    object:
+        Function result
+    int:
+       codes.INTRATIME_AUTH_ERROR if user authentication has failed
+       codes.INTRATIME_API_CONNECTION_ERROR if there is a Intratime API connection error
+       codes.INTRATIME_UNAVAILABLE if the request has been rejected to protect the Intratime API
+    """
+
+    token = get_user_token(user_id, email, password)
+
+    if token in INTRATIME_AUTH_ERRORS:
+        return token
+
+    result = function(*args, token=token, **kwargs)
+
+    if isinstance(result, int) and result == codes.UNAUTHORIZED:
+        invalidate_user_token(user_id, email)
+        token = get_user_token(user_id, email, password)
+
+        if token in INTRATIME_AUTH_ERRORS:
+            return token
+
+        result = function(*args, token=token, **kwargs)
+
+    return result
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_token_cache_stats():
+    """
+    Function to get the token cache usage stats
+
+    Returns
+    -------
+    dict:
+        Cache size, max size, hits, misses and hit ratio
+    """
+
+    return TOKEN_CACHE.get_stats()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def is_intratime_unavailable():
+    """
+    Function to check if the Intratime requests are being rejected by the circuit breaker
+
+    Returns
+    -------
+    boolean:
+        True if the Intratime circuit breaker is open, False otherwise
+    """
+
+    return INTRATIME_CLIENT.breaker.is_open()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_breaker_stats():
+    """
+    Function to get the Intratime circuit breaker state and stats
+
+    Returns
+    -------
+    dict:
+        State, failure rate of the last requests, number of recorded requests, rejected requests and times it has opened
+    """
+
+    return INTRATIME_CLIENT.breaker.get_stats()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_limiter_stats():
+    """
+    Function to get the Intratime concurrency limiter state and stats
+
+    Returns
+    -------
+    dict:
+        Current limit, requests in progress, waiting requests, rejected requests and wait time stats (ms)
+    """
+
+    return INTRATIME_CLIENT.limiter.get_stats()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 def get_action_name(action):
     """
     Function to get the intratime action name
@@ -154,12 +635,165 @@ def check_user_credentials(email, password):
 
     token = get_auth_token(email=email, password=password)
 
-    return token != codes.INTRATIME_API_CONNECTION_ERROR and token != codes.INTRATIME_AUTH_ERROR
+    return token not in INTRATIME_AUTH_ERRORS
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def parse_user_clocks(status_code, response_text):
+    """
+    Function to get the clock items from the Intratime user clocks response
+
+    Parameters
+    ----------
+    status_code: int
+        Response HTTP status code
+    response_text: str
+        Response body
+
+    Returns
+    -------
+    list:
+        Intratime API clock items
+    int:
+       codes.UNAUTHORIZED if bad token
+       codes.INTRATIME_NO_RESPONSE if intratime can not response the request.
+    """
+
+    if status_code == HTTPStatus.UNAUTHORIZED:
+        LOGGER.error(messages.get(3030))
+        return codes.UNAUTHORIZED
+
+    try:
+        data = json.loads(response_text)
+    except ValueError as exception:
+        LOGGER.error(messages.get(3002, exception))
+        return codes.INTRATIME_NO_RESPONSE
+
+    if not isinstance(data, list):
+        LOGGER.error(messages.get(3002, data))
+        return codes.INTRATIME_NO_RESPONSE
+
+    return data
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-def get_user_clocks(token, datetime_from, datetime_to, action=None):
+def request_user_clocks(token, datetime_from=None):
+    """
+    Function to request the user clocks to the Intratime API, the most recent first
+
+    Parameters
+    ----------
+    token: str
+        User session token
+    datetime_from: str
+        Lower datetime limit in format %Y-%m-%d %H:%M:%S. None to request all user clocks
+
+    Returns
+    -------
+    list:
+        Intratime API clock items
+    int:
+       codes.UNAUTHORIZED if bad token
+       codes.INTRATIME_NO_RESPONSE if intratime can not response the request.
+       codes.INTRATIME_API_CONNECTION_ERROR if there is a Intratime API connection error
+       codes.INTRATIME_UNAVAILABLE if the request has been rejected to protect the Intratime API
+    """
+
+    parameters = {} if datetime_from is None else {'from': datetime_from}
+
+    try:
+        request = INTRATIME_CLIENT.request('GET', INTRATIME_API_USER_CLOCKINGS_PATH, token=token, params=parameters)
+    except REJECTED_REQUEST_ERRORS as exception:
+        LOGGER.warning(messages.get(3038, exception))
+        return codes.INTRATIME_UNAVAILABLE
+    except requests.exceptions.RequestException as exception:
+        LOGGER.error(messages.get(3002, exception))
+        return codes.INTRATIME_API_CONNECTION_ERROR
+
+    return parse_user_clocks(request.status_code, request.text)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def sync_user_clocks(token, user_id):
+    """
+    Function to synchronize the local clock store of a user with Intratime. Only the clocks newer than the last stored
+    one are requested.
+
+    Parameters
+    ----------
+    token: str
+        User session token
+    user_id: str
+        Slack user identifier
+
+    Returns
+    -------
+    int:
+       codes.SUCCESS if the clocks have been synchronized successfully
+       codes.UNAUTHORIZED if bad token
+       codes.INTRATIME_NO_RESPONSE if intratime can not response the request.
+       codes.INTRATIME_API_CONNECTION_ERROR if there is a Intratime API connection error
+       codes.INTRATIME_UNAVAILABLE if the request has been rejected to protect the Intratime API
+    """
+
+    last_clock_datetime = clock.get_last_clock_datetime(user_id)
+    data = request_user_clocks(token, last_clock_datetime)
+
+    if isinstance(data, int):
+        return data
+
+    if last_clock_datetime is not None:
+        data = [item for item in data if item.get('INOUT_DATE', last_clock_datetime) >= last_clock_datetime]
+
+    return clock.add_clocks(user_id, data)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def filter_user_clocks(data, datetime_from, datetime_to, action=None):
+    """
+    Function to filter the Intratime API clock items by time range and action
+
+    Parameters
+    ----------
+    data: list
+        Intratime API clock items
+    datetime_from: str
+        Lower datetime limit in format %Y-%m-%d %H:%M:%S
+    datetime_to: str
+        Upper datetime limit in format %Y-%m-%d %H:%M:%S
+    action: str
+        Action enum: ['in', 'out', 'pause', 'return']. None to get all actions
+
+    Returns
+    -------
+    list:
+        filtered user clocks info
+    int:
+       codes.INTRATIME_NO_RESPONSE if the clock items are not valid
+    """
+
+    filtered_data = []
+
+    try:
+        for item in data:
+            # If date is between date_from and date_to
+            if time_utils.date_included_in_range(datetime_from, datetime_to, item['INOUT_DATE']):
+                if action is None or (action is not None and get_action_id(action) == item['INOUT_TYPE']):
+                    filtered_data.append(item)
+    except KeyError as exception:
+        LOGGER.error(messages.get(3002, exception))
+        return codes.INTRATIME_NO_RESPONSE
+
+    return filtered_data
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_user_clocks(token, datetime_from, datetime_to, action=None, user_id=None):
     """
     Function to get the user clocks in a range time
 
@@ -173,6 +807,8 @@ def get_user_clocks(token, datetime_from, datetime_to, action=None):
         Lower datetime limit in format %Y-%m-%d %H:%M:%S
     action: str
         Action enum: ['in', 'out', 'pause', 'return']
+    user_id: str
+        Slack user identifier. If it is specified, the clocks are synchronized and read from the local clock store
 
     Returns
     -------
@@ -182,42 +818,85 @@ def get_user_clocks(token, datetime_from, datetime_to, action=None):
        codes.UNAUTHORIZED if bad token
        codes.INTRATIME_NO_RESPONSE if intratime can not response the request.
        codes.INTRATIME_API_CONNECTION_ERROR if there is a Intratime API connection error
+       codes.INTRATIME_UNAVAILABLE if the request has been rejected to protect the Intratime API
     """
 
-    # Add user token to intratime header request
-    INTRATIME_API_HEADER.update({'token': token})
-    filtered_data = []
+    if user_id is not None:
+        sync_status = sync_user_clocks(token, user_id)
 
-    try:
-        request = requests.get(url=INTRATIME_API_USER_CLOCKINGS_PATH, headers=INTRATIME_API_HEADER)
+        if sync_status != codes.SUCCESS:
+            return sync_status
 
-        if request.status_code == HTTPStatus.UNAUTHORIZED:
-            LOGGER.error(messages.get(3030))
-            return codes.UNAUTHORIZED
+        return clock.get_clocks(user_id, datetime_from, datetime_to, None if action is None else get_action_id(action))
 
-        try:
-            data = request.json()
+    data = request_user_clocks(token)
 
-            for item in data:
-                # If date is between date_from and date_to
-                if time_utils.date_included_in_range(datetime_from, datetime_to, item['INOUT_DATE']):
-                    if action is None or (action is not None and get_action_id(action) == item['INOUT_TYPE']):
-                        filtered_data.append(item)
+    if isinstance(data, int):
+        return data
 
-            return filtered_data
+    return filter_user_clocks(data, datetime_from, datetime_to, action)
 
-        except KeyError as exception:
-            LOGGER.error(messages.get(3002, exception))
-            return codes.INTRATIME_NO_RESPONSE
+# ----------------------------------------------------------------------------------------------------------------------
 
-    except ConnectionError as exception:
-        LOGGER.error(messages.get(3002, exception))
-        return codes.INTRATIME_API_CONNECTION_ERROR
+
+def get_clocking_payload(action, date_time=None):
+    """
+    Function to build the Intratime clocking request body
+
+    Parameters
+    ----------
+    action: str
+        Action enum: ['in', 'out', 'pause', 'return']
+    date_time: str
+        Clocking datetime in format %Y-%m-%d %H:%M:%S. None to use the current datetime
+
+    Returns
+    -------
+    str:
+        Form encoded request body
+    """
+
+    if date_time is None:
+        date_time = time_utils.get_current_date_time()
+
+    api_action = get_action_id(action)
+
+    return f"user_action={api_action}&user_use_server_time={False}&user_timestamp={date_time}"
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def parse_clocking_response(status_code):
+    """
+    Function to check the Intratime clocking response
+
+    Parameters
+    ----------
+    status_code: int
+        Response HTTP status code
+
+    Returns
+    -------
+    int:
+       codes.SUCCESS if clocking has been successful
+       codes.codes.UNAUTHORIZED if bad token authentication
+       codes.NO_VALID_RESPONSE if intratime API response is not valid
+    """
+
+    if status_code == HTTPStatus.UNAUTHORIZED:
+        LOGGER.error(messages.get(3020))
+        return codes.UNAUTHORIZED
+
+    if status_code == HTTPStatus.CREATED:
+        return codes.SUCCESS
+
+    LOGGER.error(messages.get(3004, f"status code = {status_code}"))
+    return codes.NO_VALID_RESPONSE
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-def clocking(action, token, email):
+def clocking(action, token, email, date_time=None):
     """
     Function to register an action in Intratime API
 
@@ -229,6 +908,8 @@ def clocking(action, token, email):
         User session token
     email: str
         User email
+    date_time: str
+        Clocking datetime in format %Y-%m-%d %H:%M:%S. None to use the current datetime
 
     Returns
     -------
@@ -236,64 +917,113 @@ def clocking(action, token, email):
        codes.SUCCESS if clocking has been successful
        codes.codes.UNAUTHORIZED if bad token authentication
        codes.INTRATIME_API_CONNECTION_ERROR if there is a Intratime API connection error
+       codes.INTRATIME_UNAVAILABLE if the request has been rejected to protect the Intratime API
        codes.NO_VALID_RESPONSE if intratime API response is not valid
     """
 
-    date_time = time_utils.get_current_date_time()
+    try:
+        request = INTRATIME_CLIENT.request('POST', INTRATIME_API_CLOCKING_PATH, token=token,
+                                           data=get_clocking_payload(action, date_time))
+    except REJECTED_REQUEST_ERRORS as exception:
+        LOGGER.warning(messages.get(3038, exception))
+        return codes.INTRATIME_UNAVAILABLE
+    except requests.exceptions.RequestException as exception:
+        LOGGER.error(messages.get(3002, exception))
+        return codes.INTRATIME_API_CONNECTION_ERROR
 
-    api_action = get_action_id(action)
+    clocking_status = parse_clocking_response(request.status_code)
 
-    # Add user token to intratime header request
-    INTRATIME_API_HEADER.update({'token': token})
+    if clocking_status == codes.SUCCESS:
+        invalidate_clock_data(token)
+        user.update_last_registration_datetime_by_email(email)
+        LOGGER.info(messages.get(2000, f"- user: {email}, action: {action}"))
 
-    payload = f"user_action={api_action}&user_use_server_time={False}&user_timestamp={date_time}"
+    return clocking_status
 
-    try:
-        request = requests.post(url=INTRATIME_API_CLOCKING_PATH, data=payload, headers=INTRATIME_API_HEADER)
+# ----------------------------------------------------------------------------------------------------------------------
 
-        if request.status_code == HTTPStatus.UNAUTHORIZED:
-            LOGGER.error(messages.get(3020))
-            return codes.UNAUTHORIZED
 
-        if request.status_code == HTTPStatus.CREATED:
-            user_info_message = f"- user: {email}, action: {action}"
-            user.update_last_registration_datetime(user.get_user_id(email))
-            LOGGER.info(messages.get(2000, user_info_message))
-            return codes.SUCCESS
+def find_last_clock(data, datetime_from, datetime_to):
+    """
+    Function to find the most recent clock in a time range. The clocks must be sorted from newest to oldest, so the
+    search stops at the first clock that is not newer than the upper limit.
 
-        LOGGER.error(messages.get(3004, f"status code = {request.status_code}"))
-        return codes.NO_VALID_RESPONSE
+    Parameters
+    ----------
+    data: list
+        Intratime API clock items, the most recent first
+    datetime_from: str
+        Lower datetime limit in format %Y-%m-%d %H:%M:%S
+    datetime_to: str
+        Upper datetime limit in format %Y-%m-%d %H:%M:%S
+
+    Returns
+    -------
+    dict:
+        Last clock in the time range
+    int:
+        codes.NO_CLOCKS if there are no clocks in the time range
+        codes.INTRATIME_NO_RESPONSE if the clock items are not valid
+    """
 
-    except ConnectionError:
+    try:
+        for item in data:
+            # Datetimes in format %Y-%m-%d %H:%M:%S can be compared as strings
+            if item['INOUT_DATE'] <= datetime_to:
+                return item if item['INOUT_DATE'] >= datetime_from else codes.NO_CLOCKS
+    except (KeyError, TypeError) as exception:
         LOGGER.error(messages.get(3002, exception))
-        return codes.INTRATIME_API_CONNECTION_ERROR
+        return codes.INTRATIME_NO_RESPONSE
+
+    return codes.NO_CLOCKS
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-def get_last_clock(token):
+def get_last_clock(token, user_id=None):
     """
-    Function to get the last user clock action
+    Function to get the last user clock action of the last month
 
     Parameters
     ----------
     token: str
         Authentication token
+    user_id: str
+        Slack user identifier. If it is specified, the clocks are synchronized and read from the local clock store
 
     Returns
     -------
     dict:
         Last user clock info
+    int:
+        codes.NO_CLOCKS if the user has no clocks in the last month
+        Error code returned by request_user_clocks or sync_user_clocks
     """
 
-    datetime_from = time_utils.get_past_datetime_from_current_datetime(2592000)  # 1 month
+    datetime_from = time_utils.get_past_datetime_from_current_datetime(LAST_CLOCK_MAX_AGE)
     datetime_to = time_utils.get_current_date_time()
-    return get_user_clocks(token, datetime_from, datetime_to, None)[0]
+
+    if user_id is not None:
+        sync_status = sync_user_clocks(token, user_id)
+
+        if sync_status != codes.SUCCESS:
+            return sync_status
+
+        last_clock = clock.get_last_clock(user_id, datetime_from, datetime_to)
+
+        return codes.NO_CLOCKS if last_clock is None else last_clock
+
+    data = request_user_clocks(token)
+
+    if isinstance(data, int):
+        return data
+
+    return find_last_clock(data, datetime_from, datetime_to)
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-def get_last_clock_type(token):
+def get_last_clock_type(token, user_id=None):
     """
     Function to get the last user clock action type. e.g: PAUSE
 
@@ -301,19 +1031,28 @@ def get_last_clock_type(token):
     ----------
     token: str
         Authentication token
+    user_id: str
+        Slack user identifier. If it is specified, the clocks are read from the local clock store
 
     Returns
     -------
     str:
         Last user clock type
+    int:
+        Error code returned by get_last_clock (codes.NO_CLOCKS if the user has no clocks in the last month)
     """
 
-    return get_action_name(get_last_clock(token)['INOUT_TYPE'])
+    last_clock = get_last_clock(token, user_id)
+
+    if isinstance(last_clock, int):
+        return last_clock
+
+    return get_action_name(last_clock['INOUT_TYPE'])
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-def user_can_clock_this_action(token, action):
+def user_can_clock_this_action(token, action, user_id=None):
     """
     Function to check if the user can clock an action
 
@@ -323,15 +1062,29 @@ def user_can_clock_this_action(token, action):
         Authentication token
     action: str
         Action to check: [in, pause, return, out]
+    user_id: str
+        Slack user identifier. If it is specified, the clocks are read from the local clock store
 
     Returns
     -------
     tuple(boolean, str):
         boolean: True if the user can clock that action (action compatible with the previous one), False otherwise
         str: Message that indicates the reason why it has not been able to carry out the action.
+    int:
+        Error code returned by get_last_clock_type
     """
 
-    last_user_clock_action = get_last_clock_type(token)
+    last_user_clock_action = get_last_clock_type(token, user_id)
+
+    # Without recent clocks, the user can only start a working day
+    if last_user_clock_action == codes.NO_CLOCKS:
+        if action == IN_ACTION:
+            return (True, None)
+
+        return (False, f"You have no clocks in the last month, so you can only clock `{IN_ACTION.upper()}` action.")
+
+    if isinstance(last_user_clock_action, int):
+        return last_user_clock_action
 
     clock_data = {
         IN_ACTION: {
@@ -370,7 +1123,27 @@ def user_can_clock_this_action(token, action):
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-def get_parsed_clock_data(token, datetime_from, datetime_to):
+def parse_clock_data(user_clocks):
+    """
+    Function to get the action and datetime info from the user clocks
+
+    Parameters
+    ----------
+    user_clocks: list
+        User clocks returned by get_user_clocks
+
+    Returns
+    -------
+    list(ClockEvent):
+        List with parsed clock user data
+    """
+
+    return [ClockEvent.from_intratime(item) for item in user_clocks]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_parsed_clock_data(token, datetime_from, datetime_to, user_id=None):
     """
     Function to get the action and datetime info from user clock data returned by the intratime API
 
@@ -382,23 +1155,58 @@ def get_parsed_clock_data(token, datetime_from, datetime_to):
         Lower datetime limit
     datetime_to: str
         Upper datetime limit
+    user_id: str
+        Slack user identifier. If it is specified, the clocks are read from the local clock store
 
     Returns
     -------
-    list:
+    list(ClockEvent):
         List with parsed clock user data
+    int:
+        Error code returned by get_user_clocks
     """
 
-    user_clocks = get_user_clocks(token, datetime_from, datetime_to)
+    user_clocks = get_user_clocks(token, datetime_from, datetime_to, user_id=user_id)
 
-    data = [{"action": get_action_name(item['INOUT_TYPE']), "datetime": item['INOUT_DATE']} for item in user_clocks]
+    if isinstance(user_clocks, int):
+        return user_clocks
 
-    return data
+    return parse_clock_data(user_clocks)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_time_range_datetime_from(time_range):
+    """
+    Function to get the lower datetime limit of a time range
+
+    Parameters
+    ----------
+    time_range: str
+        String enum: today, week or month
+
+    Returns
+    -------
+    str:
+        Lower datetime limit in format %Y-%m-%d %H:%M:%S
+    int:
+        codes.INVALID_HISTORY_ACTION if the time range is not valid
+    """
+
+    if time_range == 'today':
+        return f"{time_utils.get_current_date()} 00:00:00"
+    elif time_range == 'week':
+        return time_utils.get_first_week_day()
+    elif time_range == 'month':
+        return time_utils.get_first_month_day()
+
+    LOGGER.error(messages.get(3021, f"Time range = {time_range}"))
+    return codes.INVALID_HISTORY_ACTION
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-def get_clock_data_in_time_range(token, time_range):
+def get_clock_data_in_time_range(token, time_range, user_id=None):
     """
     Function to get clock data parsed for a time range
 
@@ -408,6 +1216,8 @@ def get_clock_data_in_time_range(token, time_range):
         Intratime authentication token
     time_range: str
         String enum: today, week or month
+    user_id: str
+        Slack user identifier. If it is specified, the clocks are read from the local clock store
 
     Returns
     -------
@@ -415,25 +1225,79 @@ def get_clock_data_in_time_range(token, time_range):
         List with parsed data in the specific time range.
     """
 
-    lower_limit_datetime = ''
+    lower_limit_datetime = get_time_range_datetime_from(time_range)
 
-    if time_range == 'today':
-        lower_limit_datetime = f"{time_utils.get_current_date()} 00:00:00"
-    elif time_range == 'week':
-        lower_limit_datetime = time_utils.get_first_week_day()
-    elif time_range == 'month':
-        lower_limit_datetime = time_utils.get_first_month_day()
-    else:
-        LOGGER.error(messages.get(3021, f"Time range = {time_range}"))
-        return codes.INVALID_HISTORY_ACTION
+    if isinstance(lower_limit_datetime, int):
+        return lower_limit_datetime
 
-    data = get_parsed_clock_data(token, lower_limit_datetime, time_utils.get_current_date_time())
+    data = get_parsed_clock_data(token, lower_limit_datetime, time_utils.get_current_date_time(), user_id)
 
     return data
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+def get_cached_clock_data_in_time_range(token, time_range, user_id=None):
+    """
+    Function to get clock data parsed for a time range. The result is cached for a few seconds and the identical
+    concurrent requests wait for the same fetch. See get_clock_data_in_time_range.
+
+    Parameters
+    ----------
+    token: str
+        Intratime authentication token
+    time_range: str
+        String enum: today, week or month
+    user_id: str
+        Slack user identifier. If it is specified, the clocks are read from the local clock store
+
+    Returns
+    -------
+    list(ClockEvent):
+        New list with parsed data in the specific time range
+    int:
+        Error code returned by get_clock_data_in_time_range
+    """
+
+    data = CLOCK_DATA_CACHE.get((token, time_range), get_clock_data_in_time_range, token, time_range, user_id)
+
+    # The cached list is shared, so each caller gets its own copy
+    return data if isinstance(data, int) else list(data)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def invalidate_clock_data(token):
+    """
+    Function to remove the cached clock data of a user
+
+    Parameters
+    ----------
+    token: str
+        Intratime authentication token
+    """
+
+    for time_range in TIME_RANGES:
+        CLOCK_DATA_CACHE.invalidate((token, time_range))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_clock_data_cache_stats():
+    """
+    Function to get the clock data cache usage stats
+
+    Returns
+    -------
+    dict:
+        Cache size, max size, hits, misses, hit ratio, shared requests and in-flight requests
+    """
+
+    return CLOCK_DATA_CACHE.get_stats()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 def get_worked_time(data):
     """
     Function to get the worked time in a specified range time.
@@ -442,7 +1306,7 @@ def get_worked_time(data):
 
     Parameters
     ----------
-    data: list
+    data: list(ClockEvent)
         Parsed clock data list (data returned from get_parsed_clock_data function)
 
     Returns
@@ -452,51 +1316,24 @@ def get_worked_time(data):
     """
 
     num_seconds = 0
-    before_action = ''
-
-    datetimes = {
-        IN_ACTION: "",
-        PAUSE_ACTION:  "",
-        RETURN_ACTION: "",
-        OUT_ACTION: ""
-    }
+    before_action = None
+    before_timestamp = 0
 
-    invalid_actions = {
-        IN_ACTION: [IN_ACTION, RETURN_ACTION, PAUSE_ACTION],
-        RETURN_ACTION: [RETURN_ACTION, IN_ACTION, OUT_ACTION],
-        PAUSE_ACTION: [PAUSE_ACTION, OUT_ACTION],
-        OUT_ACTION: [OUT_ACTION, PAUSE_ACTION]
+    # Clocks that close a working period, with the actions that can open it
+    period_end_actions = {
+        ClockAction.PAUSE: (ClockAction.IN, ClockAction.RETURN),
+        ClockAction.OUT: (ClockAction.IN, ClockAction.RETURN)
     }
 
     for item in data:
-        datetimes[item['action']] = item['datetime']
+        if before_action in period_end_actions.get(item.action, ()):
+            num_seconds += item.timestamp - before_timestamp
 
-        if item['action'] == PAUSE_ACTION and before_action == IN_ACTION:
-            num_seconds += time_utils.get_time_difference(datetimes[IN_ACTION], datetimes[PAUSE_ACTION],
-                                                          time_utils.SECONDS)
-        elif item['action'] == OUT_ACTION and before_action == IN_ACTION:
-            num_seconds += time_utils.get_time_difference(datetimes[IN_ACTION], datetimes[OUT_ACTION],
-                                                          time_utils.SECONDS)
-        elif item['action'] == OUT_ACTION and before_action == RETURN_ACTION:
-            num_seconds += time_utils.get_time_difference(datetimes[RETURN_ACTION], datetimes[OUT_ACTION],
-                                                          time_utils.SECONDS)
-        elif item['action'] == PAUSE_ACTION and before_action == RETURN_ACTION:
-            num_seconds += time_utils.get_time_difference(datetimes[RETURN_ACTION], datetimes[PAUSE_ACTION],
-                                                          time_utils.SECONDS)
-
-        before_action = item['action']
-
-    worked_time = time_utils.get_time_string_from_seconds(num_seconds)
+        before_action = item.action
+        before_timestamp = item.timestamp
 
     # Add time not clocked but worked (pre-clocked)
-    if len(data) > 0:
-        last_clock_action = data[-1]['action']
-        last_clock_time = data[-1]['datetime']
-
-        if last_clock_action != OUT_ACTION and last_clock_action != PAUSE_ACTION:
-            last_non_clocked_time = time_utils.get_time_difference(last_clock_time,
-                                                                   time_utils.get_current_date_time(),
-                                                                   time_utils.SECONDS)
-            worked_time = time_utils.get_time_string_from_seconds(num_seconds + last_non_clocked_time)
+    if len(data) > 0 and data[-1].action != ClockAction.OUT and data[-1].action != ClockAction.PAUSE:
+        num_seconds += to_timestamp(time_utils.get_current_date_time()) - data[-1].timestamp
 
-    return worked_time
+    return time_utils.get_time_string_from_seconds(num_seconds)
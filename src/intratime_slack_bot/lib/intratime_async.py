@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import aiohttp
+
+from intratime_slack_bot.config import settings
+from intratime_slack_bot.lib import intratime, codes, messages, time_utils, circuit_breaker
+from intratime_slack_bot.lib.db import user, clock
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Async variants of the intratime module functions, with the same parameters and return codes plus an aiohttp session.
+# They are meant for jobs that talk to Intratime for many users at once in a single thread, e.g:
+#
+#     async with intratime_async.create_session() as session:
+#         tokens = await asyncio.gather(*[intratime_async.get_auth_token(session, email, password)
+#                                         for email, password in credentials])
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def create_session(max_connections=settings.INTRATIME_ASYNC_MAX_CONNECTIONS):
+    """
+    Function to create an HTTP session for the Intratime async requests. It must be created inside the event loop.
+
+    Parameters
+    ----------
+    max_connections: int
+        Maximum number of simultaneous connections. Requests over this limit wait for a free connection
+
+    Returns
+    -------
+    aiohttp.ClientSession:
+        HTTP session
+    """
+
+    # The session is shared by all users, so cookies must not be kept between requests
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max_connections),
+                                 cookie_jar=aiohttp.DummyCookieJar(),
+                                 timeout=aiohttp.ClientTimeout(connect=settings.HTTP_CONNECT_TIMEOUT,
+                                                               sock_read=settings.HTTP_READ_TIMEOUT))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+async def run_in_executor(function, *args):
+    """
+    Function to run a blocking function (e.g database operations) in the default thread pool executor
+
+    Parameters
+    ----------
+    function: function
+        Blocking function
+    args: list
+        Function parameters
+
+    Returns
+    -------
+    object:
+        Function result
+    """
+
+    return await asyncio.get_event_loop().run_in_executor(None, functools.partial(function, *args))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+async def request(session, method, path, token=None, **kwargs):
+    """
+    Function to send a request to the Intratime API
+
+    Parameters
+    ----------
+    session: aiohttp.ClientSession
+        HTTP session
+    method: str
+        HTTP method
+    path: str
+        API path. e.g /api/user/clocking
+    token: str
+        User session token. None if the request is not authenticated
+    kwargs: dict
+        aiohttp request parameters
+
+    Returns
+    -------
+    tuple(int, str):
+        Response status code and body
+
+    Raises
+    ------
+    aiohttp.ClientError, asyncio.TimeoutError:
+        If there is a connection error or timeout
+    circuit_breaker.CircuitOpenError:
+        If the circuit breaker is open
+    """
+
+    client = intratime.INTRATIME_CLIENT
+    retries = client.get_retries if method == 'GET' else 0
+    attempt = 0
+
+    while True:
+        client.breaker.before_call()
+
+        try:
+            async with session.request(method, f"{client.base_url}{path}", headers=client.get_headers(token),
+                                       **kwargs) as response:
+                status_code, response_text = response.status, await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            client.breaker.record_failure()
+
+            if attempt >= retries:
+                raise
+        else:
+            if not intratime.is_server_error(status_code):
+                client.breaker.record_success()
+                return status_code, response_text
+
+            client.breaker.record_failure()
+
+            if attempt >= retries:
+                return status_code, response_text
+
+        await asyncio.sleep(circuit_breaker.get_retry_delay(attempt, settings.INTRATIME_RETRY_BASE_DELAY,
+                                                            settings.INTRATIME_RETRY_MAX_DELAY))
+        attempt += 1
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+async def get_auth_token(session, email, password):
+    """
+    Function to get the Intratime auth token. See intratime.get_auth_token.
+    """
+
+    try:
+        _, response_text = await request(session, 'POST', intratime.INTRATIME_API_LOGIN_PATH,
+                                         data=intratime.get_login_payload(email, password))
+    except circuit_breaker.CircuitOpenError:
+        intratime.LOGGER.warning(messages.get(3038))
+        return codes.INTRATIME_UNAVAILABLE
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+        intratime.LOGGER.error(messages.get(3002, exception))
+        return codes.INTRATIME_API_CONNECTION_ERROR
+
+    return intratime.parse_auth_token(response_text)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+async def request_user_clocks(session, token, datetime_from=None):
+    """
+    Function to request the user clocks to the Intratime API. See intratime.request_user_clocks.
+    """
+
+    parameters = {} if datetime_from is None else {'from': datetime_from}
+
+    try:
+        status_code, response_text = await request(session, 'GET', intratime.INTRATIME_API_USER_CLOCKINGS_PATH,
+                                                   token=token, params=parameters)
+    except circuit_breaker.CircuitOpenError:
+        intratime.LOGGER.warning(messages.get(3038))
+        return codes.INTRATIME_UNAVAILABLE
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+        intratime.LOGGER.error(messages.get(3002, exception))
+        return codes.INTRATIME_API_CONNECTION_ERROR
+
+    return intratime.parse_user_clocks(status_code, response_text)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+async def sync_user_clocks(session, token, user_id):
+    """
+    Function to synchronize the local clock store of a user with Intratime. See intratime.sync_user_clocks.
+    """
+
+    last_clock_datetime = await run_in_executor(clock.get_last_clock_datetime, user_id)
+    data = await request_user_clocks(session, token, last_clock_datetime)
+
+    if isinstance(data, int):
+        return data
+
+    if last_clock_datetime is not None:
+        data = [item for item in data if item.get('INOUT_DATE', last_clock_datetime) >= last_clock_datetime]
+
+    return await run_in_executor(clock.add_clocks, user_id, data)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+async def get_user_clocks(session, token, datetime_from, datetime_to, action=None, user_id=None):
+    """
+    Function to get the user clocks in a range time. See intratime.get_user_clocks.
+    """
+
+    if user_id is not None:
+        sync_status = await sync_user_clocks(session, token, user_id)
+
+        if sync_status != codes.SUCCESS:
+            return sync_status
+
+        return await run_in_executor(clock.get_clocks, user_id, datetime_from, datetime_to,
+                                     None if action is None else intratime.get_action_id(action))
+
+    data = await request_user_clocks(session, token)
+
+    if isinstance(data, int):
+        return data
+
+    return intratime.filter_user_clocks(data, datetime_from, datetime_to, action)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+async def clocking(session, action, token, email, date_time=None):
+    """
+    Function to register an action in Intratime API. See intratime.clocking.
+    """
+
+    try:
+        status_code, _ = await request(session, 'POST', intratime.INTRATIME_API_CLOCKING_PATH, token=token,
+                                       data=intratime.get_clocking_payload(action, date_time))
+    except circuit_breaker.CircuitOpenError:
+        intratime.LOGGER.warning(messages.get(3038))
+        return codes.INTRATIME_UNAVAILABLE
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+        intratime.LOGGER.error(messages.get(3002, exception))
+        return codes.INTRATIME_API_CONNECTION_ERROR
+
+    clocking_status = intratime.parse_clocking_response(status_code)
+
+    if clocking_status == codes.SUCCESS:
+        await run_in_executor(user.update_last_registration_datetime_by_email, email)
+        intratime.LOGGER.info(messages.get(2000, f"- user: {email}, action: {action}"))
+
+    return clocking_status
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+async def get_clock_data_in_time_range(session, token, time_range, user_id=None):
+    """
+    Function to get clock data parsed for a time range. See intratime.get_clock_data_in_time_range.
+    """
+
+    lower_limit_datetime = intratime.get_time_range_datetime_from(time_range)
+
+    if isinstance(lower_limit_datetime, int):
+        return lower_limit_datetime
+
+    user_clocks = await get_user_clocks(session, token, lower_limit_datetime, time_utils.get_current_date_time(),
+                                        user_id=user_id)
+
+    if isinstance(user_clocks, int):
+        return user_clocks
+
+    return intratime.parse_clock_data(user_clocks)
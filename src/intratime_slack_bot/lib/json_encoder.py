@@ -0,0 +1,30 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional. There are no wheels for every platform (e.g alpine), so the standard encoder is used instead
+    orjson = None
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def dumps(data):
+    """
+    Function to encode data as compact JSON. orjson is used if it is installed.
+
+    Parameters
+    ----------
+    data: object
+        Data to encode
+
+    Returns
+    -------
+    bytes:
+        UTF-8 encoded JSON, without whitespaces
+    """
+
+    if orjson is not None:
+        return orjson.dumps(data)
+
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
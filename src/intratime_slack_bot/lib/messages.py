@@ -1,4 +1,4 @@
-from intratime_slack_bot.lib import time_utils, intratime
+from intratime_slack_bot.lib import time_utils, intratime, json_encoder
 from intratime_slack_bot.config import settings
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -51,6 +51,17 @@ message = {
     "2002": "User deleted successfully",
     "2003": "Slack message is too long to post it",
     "2004": "User updated successfully",
+    "2005": "User passwords encryption rotated",
+    "2006": "Creating index",
+    "2007": "Index ready",
+    "2008": "Index build progress",
+    "2009": "Query resolved using an index",
+    "2010": "History compacted into daily rollups",
+    "2011": "Intratime circuit breaker state changed",
+    "2012": "Clocking queued until Intratime is available",
+    "2013": "Queued clocking delivered",
+    "2014": "Slack API rate limit exceeded. Requests paused",
+    "2015": "Slack message queued until it can be posted",
 
     # ------------------------------------------------------------------------------------------------------------------
 
@@ -84,7 +95,24 @@ message = {
     "3027": "Could not parse the request",
     "3028": "Could not validate user model",
     "3029": "Could not log user action",
-    "3030": "Bad intratime credentials"
+    "3030": "Bad intratime credentials",
+    "3031": "Could not decrypt the user password with any key of the key ring",
+    "3032": "Could not validate clock model",
+    "3033": "Request error. Could not connect with slack service",
+    "3034": "Could not create the index",
+    "3035": "Query is not resolved using an index",
+    "3036": "Could not get the index build progress",
+    "3037": "Could not compact the history",
+    "3038": "Intratime request rejected to protect the Intratime API",
+    "3039": "Could not queue the clocking",
+    "3040": "Queued clocking could not be delivered",
+    "3041": "Could not process the clock queue",
+    "3042": "Could not queue the Slack message",
+    "3043": "Slack message moved to the dead-letter store",
+    "3044": "Could not process the Slack outbox",
+    "3045": "Could not deliver the queued clockings of a user",
+    "3046": "Could not post the queued messages of a channel",
+    "3047": "Could not stop the history writer, the pending registers are not written"
 }
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -186,8 +214,22 @@ def set_custom_message(key, parameters):
     elif key == 'CLOCKING_CHECK_ERROR':
         return get_error_template('Could not verify this clocking request', parameters[0], 'Please, check manually '
                                   'that the clock has been done correctly')
+    elif key == 'HISTORY_ERROR':
+        return get_error_template('Could not get your clock history', parameters[0], 'Please contact with app '
+                                  'administrator')
+    elif key == 'INTRATIME_UNAVAILABLE':
+        return get_error_template('Intratime is unavailable', parameters[0], 'Intratime is not responding. Please, '
+                                  'try again in a few minutes')
+    elif key == 'QUEUED_CLOCKING_ERROR':
+        return get_error_template(f"Could not clock your queued `{parameters[0]}` action of {parameters[1]}",
+                                  parameters[2], parameters[3])
     elif key == 'INVALID_CLOCKING_ACTION':
         return get_error_template('Could not clock your action', '', parameters[0])
+    elif key == 'CLOCKING_QUEUED':
+        return f":hourglass: Intratime is not available. Your `{parameters[0]}` action of {parameters[1]} has been " \
+               "queued and it will be clocked with that time when Intratime recovers. You will get a message then."
+    elif key == 'QUEUED_CLOCKING_DELIVERED':
+        return f":white_check_mark: Your queued `{parameters[0]}` action of {parameters[1]} has been clocked"
     elif key == 'WORKED_TIME':
         return f":timer_clock: Your working time {parameters[0]} is *{parameters[1]}* :timer_clock:"
     else:
@@ -290,14 +332,106 @@ def write_slack_message_too_long():
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+def write_slack_page_footer(page, total_pages):
+    """
+    Function to write the page number of a message that has been split in several pages
+
+    Parameters
+    ----------
+    page: int
+        Page number, starting at 1
+    total_pages: int
+        Number of pages
+
+    Returns
+    -------
+    dict:
+        Block message
+    """
+
+    return {
+        "type": "context",
+        "elements": [
+            {
+                "type": "mrkdwn",
+                "text": f"Page {page} of {total_pages}"
+            }
+        ]
+    }
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def pack_slack_messages(block_groups, max_blocks=settings.SLACK_MESSAGE_MAX_BLOCKS,
+                        max_size=settings.SLACK_MESSAGE_MAX_SIZE):
+    """
+    Function to pack groups of blocks (e.g the blocks of each day of a history report) into the fewest messages that
+    fit in the Slack block-count and payload size limits. The groups are not split unless a group does not fit in a
+    message by itself. If there is more than one message, a page footer is added to each one.
+
+    Parameters
+    ----------
+    block_groups: list(list(dict))
+        Groups of blocks, in order
+    max_blocks: int
+        Maximum number of blocks of a message
+    max_size: int
+        Maximum size (bytes of the JSON encoded blocks) of a message
+
+    Returns
+    -------
+    list(list(dict)):
+        Block list of each message
+    """
+
+    # Room for the page footer
+    max_blocks -= 1
+    max_size -= len(json_encoder.dumps(write_slack_page_footer(max_blocks, max_blocks))) + 1
+
+    pages = []
+    page = []
+    page_size = 0
+
+    def fits(num_blocks, size):
+        return len(page) + num_blocks <= max_blocks and page_size + size <= max_size
+
+    for group in block_groups:
+        # Each block also takes the "," separator of the JSON list
+        block_sizes = [len(json_encoder.dumps(block)) + 1 for block in group]
+
+        # The group starts a new message if it does not fit in the current one
+        if len(page) > 0 and not fits(len(group), sum(block_sizes)):
+            pages.append(page)
+            page, page_size = [], 0
+
+        for block, block_size in zip(group, block_sizes):
+            if len(page) > 0 and not fits(1, block_size):
+                pages.append(page)
+                page, page_size = [], 0
+
+            page.append(block)
+            page_size += block_size
+
+    if len(page) > 0:
+        pages.append(page)
+
+    if len(pages) > 1:
+        for page_number, page in enumerate(pages, start=1):
+            page.append(write_slack_page_footer(page_number, len(pages)))
+
+    return pages
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 def write_slack_history_register(data):
     """
     Function to model the clock register content
 
     Parameters
     ----------
-    data: dict
-        Clock register data. It must contains action and datetime keys
+    data: ClockEvent
+        Clock register data
 
     Returns
     -------
@@ -309,11 +443,11 @@ def write_slack_history_register(data):
         "type": "section",
         "text": {
             "type": "mrkdwn",
-            "text": f"*Action*: {data['action'].upper()}\n *Datetime*: {data['datetime']}"
+            "text": f"*Action*: {data.action_name.upper()}\n *Datetime*: {data.datetime}"
         },
         "accessory": {
             "type": "image",
-            "image_url": f"{IMAGE_BASE_URL}{data['action']}_5.png",
+            "image_url": f"{IMAGE_BASE_URL}{data.action_name}_5.png",
             "alt_text": "Clocking action image"
         }
     }
@@ -331,7 +465,7 @@ def generate_slack_history_report(token, action, data, worked_time, callback_id)
         Intratime authentication token
     action: str
        String enum: today_history, week_history or month_history
-    data: list
+    data: list(ClockEvent)
        List with clock history data
     callback_id: str
        Callback id from history report
@@ -379,16 +513,15 @@ def generate_slack_history_report(token, action, data, worked_time, callback_id)
             day = ''
 
             while item_counter < len(data):
-                if time_utils.get_day(data[item_counter]['datetime']) == day:
+                if data[item_counter].day == day:
                     blocks.append(write_slack_history_register(data[item_counter]))
                     blocks.append(write_slack_divider())
                 else:
                     block_list.append(blocks)
                     blocks = []
-                    day = time_utils.get_day(data[item_counter]['datetime'])
-                    date = time_utils.convert_datetime_string_to_date_string(data[item_counter]['datetime'])
+                    day = data[item_counter].day
 
-                    blocks.append(write_slack_header(f"{date}"))
+                    blocks.append(write_slack_header(data[item_counter].date))
                     blocks.append(write_slack_divider())
                     blocks.append(write_slack_history_register(data[item_counter]))
                     blocks.append(write_slack_divider())
@@ -0,0 +1,104 @@
+import threading
+
+from collections import deque
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class LatencyStats:
+    """
+    Thread-safe latency recorder. The percentiles are calculated over the most recent samples.
+
+    Parameters
+    ----------
+    max_samples: int
+        Number of recent samples kept to calculate the percentiles
+    """
+
+    def __init__(self, max_samples=1000):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """
+        Function to record a latency sample
+
+        Parameters
+        ----------
+        seconds: float
+            Elapsed time in seconds
+        """
+
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self._samples.append(seconds)
+
+    def get_stats(self):
+        """
+        Function to get the latency stats in milliseconds
+
+        Returns
+        -------
+        dict:
+            Number of samples, mean, p50, p99 and max latency
+        """
+
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total, maximum = self.count, self.total, self.max
+
+        def percentile(value):
+            return round(samples[min(len(samples) - 1, int(len(samples) * value))] * 1000, 3) if samples else 0
+
+        return {
+            'count': count,
+            'mean_ms': round(total / count * 1000, 3) if count > 0 else 0,
+            'p50_ms': percentile(0.5),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(maximum * 1000, 3)
+        }
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class SizeStats(LatencyStats):
+    """
+    Thread-safe size recorder, e.g for the bytes of the request payloads. The percentiles are calculated over the most
+    recent samples.
+
+    Parameters
+    ----------
+    max_samples: int
+        Number of recent samples kept to calculate the percentiles
+    """
+
+    def get_stats(self):
+        """
+        Function to get the size stats in bytes
+
+        Returns
+        -------
+        dict:
+            Number of samples, total, mean, p50, p99 and max size
+        """
+
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total, maximum = self.count, self.total, self.max
+
+        def percentile(value):
+            return samples[min(len(samples) - 1, int(len(samples) * value))] if samples else 0
+
+        return {
+            'count': count,
+            'total_bytes': total,
+            'mean_bytes': round(total / count) if count > 0 else 0,
+            'p50_bytes': percentile(0.5),
+            'p99_bytes': percentile(0.99),
+            'max_bytes': maximum
+        }
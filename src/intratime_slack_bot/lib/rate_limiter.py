@@ -0,0 +1,100 @@
+import threading
+import time
+
+from intratime_slack_bot.lib import metrics
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter, implemented as virtual scheduling (GCRA). Calls only wait when the bucket is
+    empty, and each waiting call reserves its turn, so the waiting calls are spread at the bucket rate instead of all of
+    them being sent when a token is added.
+
+    Parameters
+    ----------
+    rate: float
+        Tokens added per second
+    capacity: int
+        Maximum number of tokens, i.e maximum burst of calls without waiting
+    timer: function
+        Function that returns the current time in seconds
+    sleep: function
+        Function that waits a number of seconds
+    """
+
+    def __init__(self, rate, capacity, timer=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.timer = timer
+        self.sleep = sleep
+        self.paused_until = 0
+        self.wait_time = metrics.LatencyStats()
+        self._burst_time = (capacity - 1) / rate
+        self._next_call_time = timer()  # Time at which the bucket would be empty if the calls were not in burst
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Function to take a token, waiting until it is available
+
+        Returns
+        -------
+        float:
+            Seconds waited
+        """
+
+        start_time = self.timer()
+
+        with self._lock:
+            self._next_call_time = max(self._next_call_time, start_time)
+            wait = self._next_call_time - self._burst_time - start_time
+            self._next_call_time += 1 / self.rate
+
+        if wait > 0:
+            self.sleep(wait)
+
+        # The calls that were already waiting when the calls were paused wait until the end of the pause
+        pause = self.paused_until - self.timer()
+
+        if pause > 0:
+            self.sleep(pause)
+
+        waited = self.timer() - start_time
+        self.wait_time.record(waited)
+
+        return waited
+
+    def pause(self, seconds):
+        """
+        Function to stop giving tokens for some time, e.g when the API has asked to wait with a Retry-After header.
+        There is no burst of calls after the pause.
+
+        Parameters
+        ----------
+        seconds: float
+            Seconds without giving tokens
+        """
+
+        with self._lock:
+            self.paused_until = max(self.paused_until, self.timer() + seconds)
+            self._next_call_time = max(self._next_call_time, self.paused_until + self._burst_time)
+
+    def get_stats(self):
+        """
+        Function to get the limiter state and stats
+
+        Returns
+        -------
+        dict:
+            Rate, capacity, available tokens and wait time stats (ms)
+        """
+
+        with self._lock:
+            tokens = min(self.capacity, (self.timer() - self._next_call_time) * self.rate + self.capacity)
+            stats = {'rate': self.rate, 'capacity': self.capacity, 'tokens': round(max(tokens, 0), 2)}
+
+        stats['wait'] = self.wait_time.get_stats()
+
+        return stats
@@ -1,13 +1,18 @@
 import requests
-import time
 import json
+import math
+import time
+import threading
 import urllib.parse
 
 from http import HTTPStatus
+from pymongo.errors import PyMongoError
 
 from intratime_slack_bot.lib.db import monitoring
-from intratime_slack_bot.lib import codes, warehouse, slack_ui, intratime, crypt, time_utils, messages, logger
-from intratime_slack_bot.lib.db import user
+from intratime_slack_bot.lib import codes, warehouse, slack_ui, intratime, crypt, time_utils, messages, logger, \
+    http_client, clock_pipeline, rate_limiter, metrics, json_encoder, circuit_breaker, worker
+from intratime_slack_bot.lib.db import user, clock, clock_queue, slack_outbox
+from intratime_slack_bot.lib.clock_event import to_timestamp
 from intratime_slack_bot.config import settings
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -33,10 +38,157 @@ BAD_CREDENTIALS = {'errors': [
 DELETE_USER_NOT_FOUND = {'errors': [{'name': 'delete', 'error': messages.USER_NOT_FOUND}]}
 UPDATE_USER_NOT_FOUND = {'errors': [{'name': 'email', 'error': messages.USER_NOT_FOUND}]}
 CLOCKING_USER_NOT_FOUND = {'errors': [{'name': 'action', 'error': messages.USER_NOT_FOUND}]}
-CLOCKING_BAD_USER_CREDENTIALS = {'errors': [{'name': 'action', 'error': messages.USER_NOT_FOUND}]}
+CLOCKING_BAD_USER_CREDENTIALS = {'errors': [{'name': 'action', 'error': messages.BAD_BD_CREDENTIALS}]}
 
 LOGGER = logger.get_logger('slack', settings.LOGS_LEVEL)
 
+# Rate limiters shared by all threads, indexed by Slack API method
+SLACK_API_RATE_LIMITERS = {method: rate_limiter.TokenBucket(rate, capacity)
+                           for method, (rate, capacity) in settings.SLACK_API_RATE_LIMITS.items()}
+
+# Size of the request bodies sent to Slack, indexed by Slack API method (or response_url for the command responses)
+RESPONSE_URL_PAYLOAD = 'response_url'
+SLACK_PAYLOAD_SIZES = {payload_type: metrics.SizeStats()
+                       for payload_type in [*settings.SLACK_API_RATE_LIMITS, RESPONSE_URL_PAYLOAD]}
+
+# Post errors after which a private message is queued in the outbox and retried later
+RETRYABLE_POST_ERRORS = [codes.SLACK_API_CONNECTION_ERROR, codes.INTERNAL_SERVER_ERROR, codes.SLACK_API_RATE_LIMITED]
+
+OUTBOX_STATS = {'queued': 0, 'delivered': 0, 'dead': 0}
+OUTBOX_STATS_LOCK = threading.Lock()
+
+# Time since a private message is sent until it is posted, including the time that it is queued in the outbox
+DELIVERY_LATENCY = metrics.LatencyStats()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def encode_payload(payload, payload_type):
+    """
+    Function to encode a request payload as a compact JSON body, recording its size
+
+    Parameters
+    ----------
+    payload: dict
+        Request payload
+    payload_type: str
+        Slack API method or RESPONSE_URL_PAYLOAD
+
+    Returns
+    -------
+    bytes:
+        JSON body
+    """
+
+    body = json_encoder.dumps(payload)
+    SLACK_PAYLOAD_SIZES[payload_type].record(len(body))
+
+    return body
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_retry_after(headers):
+    """
+    Function to get the seconds to wait from the Retry-After header of a 429 Too Many Requests response. If the header
+    is missing or is not a number of seconds (e.g an HTTP date), the default delay is returned.
+
+    Parameters
+    ----------
+    headers: dict
+        Response headers
+
+    Returns
+    -------
+    float:
+        Seconds to wait
+    """
+
+    try:
+        retry_after = float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return settings.SLACK_API_DEFAULT_RETRY_AFTER
+
+    return retry_after if math.isfinite(retry_after) and retry_after >= 0 else settings.SLACK_API_DEFAULT_RETRY_AFTER
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def post_slack_api_request(method, url, payload, token):
+    """
+    Function to send a request to the Slack Web API with a JSON body and bearer auth, respecting the method rate limit.
+    If Slack answers with 429 Too Many Requests, the method requests are paused for the Retry-After seconds and the
+    request is sent again. The payload is encoded only once.
+
+    Parameters
+    ----------
+    method: str
+        Slack API method. e.g chat.postMessage
+    url: str
+        Request URL
+    payload: dict
+        Request payload
+    token: str
+        Slack API token
+
+    Returns
+    -------
+    requests.Response:
+        Request response
+
+    Raises
+    ------
+    requests.exceptions.RequestException:
+        If there is a connection error or timeout
+    """
+
+    limiter = SLACK_API_RATE_LIMITERS[method]
+    body = encode_payload(payload, method)
+    headers = {'Content-Type': 'application/json; charset=utf-8', 'Authorization': f"Bearer {token}"}
+
+    for attempt in range(settings.SLACK_API_RATE_LIMIT_RETRIES + 1):
+        limiter.acquire()
+        request = http_client.post(url, data=body, headers=headers)
+
+        if request.status_code != HTTPStatus.TOO_MANY_REQUESTS:
+            break
+
+        retry_after = get_retry_after(request.headers)
+        LOGGER.warning(messages.get(2014, f"method = {method}, retry after = {retry_after}s"))
+        limiter.pause(retry_after)
+
+    return request
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_rate_limiter_stats():
+    """
+    Function to get the Slack API rate limiters stats
+
+    Returns
+    -------
+    dict:
+        Slack API method as key and its rate, capacity, available tokens and wait time stats (ms) as value
+    """
+
+    return {method: limiter.get_stats() for method, limiter in SLACK_API_RATE_LIMITERS.items()}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_payload_size_stats():
+    """
+    Function to get the stats of the request bodies sent to Slack
+
+    Returns
+    -------
+    dict:
+        Slack API method (or response_url) as key and its payload size stats (bytes) as value
+    """
+
+    return {payload_type: stats.get_stats() for payload_type, stats in SLACK_PAYLOAD_SIZES.items()}
+
 # ----------------------------------------------------------------------------------------------------------------------
 
 
@@ -89,27 +241,29 @@ def post_private_message(message, channel,  mgs_type='text', token=settings.SLAC
         codes.INVALID_VALUE if the message_type parameter has invalid value
         codes.BAD_SLACK_API_AUTH_CREDENTIALS if the API request could not be resolved due to credentials issue
         codes.BAD_REQUEST_DATA if data sent is not correct
-        codes.INTERNAL_SERVER_ERROR if there is some server error
+        codes.INTERNAL_SERVER_ERROR if there is some server error (5xx)
+        codes.SLACK_API_RATE_LIMITED if Slack is still rate limiting the requests after the retries
         codes.UNDEFINED_ERROR if the error is unknown
+        codes.SLACK_API_CONNECTION_ERROR if there is a slack API connection error or timeout
         codes.SUCCESS if the message has ben posted successfully
     """
 
     if not validate_message(message):
         return codes.INVALID_VALUE
 
-    time.sleep(1)  # Wait one second to send the API request due to rate limit (1/sec)
-
-    headers = {'content-type': 'application/x-www-form-urlencoded', 'charset': 'utf8'}
-
     if as_bot_user:
         token = settings.SLACK_API_BOT_TOKEN
 
-    request = requests.post(f"{warehouse.SLACK_POST_MESSAGE_URL}?token={token}&channel={channel}&"
-                            f"{mgs_type}={message}", headers=headers)
+    try:
+        request = post_slack_api_request(warehouse.SLACK_POST_MESSAGE_METHOD, warehouse.SLACK_POST_MESSAGE_URL,
+                                         {'channel': channel, mgs_type: message}, token)
+    except requests.exceptions.RequestException as exception:
+        LOGGER.error(messages.get(3033, exception))
+        return codes.SLACK_API_CONNECTION_ERROR
 
     if request.status_code != HTTPStatus.OK:
         LOGGER.error(messages.get(3023, f"Status code = {request.status_code}"))
-        if(request.status_code == HTTPStatus.REQUEST_URI_TOO_LONG):
+        if request.status_code in (HTTPStatus.REQUEST_URI_TOO_LONG, HTTPStatus.REQUEST_ENTITY_TOO_LARGE):
             LOGGER.warning(messages.get(2003))
             post_private_message(messages.write_slack_message_too_long(), channel, mgs_type='blocks', token=token,
                                  as_bot_user=True)
@@ -118,8 +272,10 @@ def post_private_message(message, channel,  mgs_type='text', token=settings.SLAC
             return codes.BAD_SLACK_API_AUTH_CREDENTIALS
         elif request.status_code == HTTPStatus.BAD_REQUEST:
             return codes.BAD_REQUEST_DATA
-        elif request.status_code == HTTPStatus.INTERNAL_SERVER_ERROR:
+        elif request.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR:
             return codes.INTERNAL_SERVER_ERROR
+        elif request.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+            return codes.SLACK_API_RATE_LIMITED
         else:
             return codes.UNDEFINED_ERROR
 
@@ -161,16 +317,13 @@ def post_ephemeral_message(message, channel, user_id, token=settings.SLACK_API_U
         codes.BAD_REQUEST_DATA if data sent is not correct
         codes.INTERNAL_SERVER_ERROR if there is some server error
         codes.UNDEFINED_ERROR if the error is unknown
+        codes.SLACK_API_CONNECTION_ERROR if there is a slack API connection error or timeout
         codes.SUCCESS if the message has ben posted successfully
     """
 
     if not validate_message(message):
         return codes.INVALID_VALUE
 
-    time.sleep(1)  # Wait one second to send the API request due to rate limit (1/sec)
-
-    headers = {'content-type': 'application/x-www-form-urlencoded', 'charset': 'utf8'}
-
     if isinstance(message, str):
         message_parameter = 'text'
     else:
@@ -179,8 +332,14 @@ def post_ephemeral_message(message, channel, user_id, token=settings.SLACK_API_U
     if as_bot_user:
         token = settings.SLACK_API_BOT_TOKEN
 
-    request = requests.post(f"{warehouse.SLACK_POST_EPHEMERAL_MESSAGE_URL}?token={token}&channel={channel}&"
-                            f"{message_parameter}={message}&user={user_id}", headers=headers)
+    try:
+        request = post_slack_api_request(warehouse.SLACK_POST_EPHEMERAL_MESSAGE_METHOD,
+                                         warehouse.SLACK_POST_EPHEMERAL_MESSAGE_URL,
+                                         {'channel': channel, 'user': user_id, message_parameter: message}, token)
+    except requests.exceptions.RequestException as exception:
+        LOGGER.error(messages.get(3033, exception))
+        return codes.SLACK_API_CONNECTION_ERROR
+
     if request.status_code != HTTPStatus.OK:
         LOGGER.error(messages.get(3024, f"Status code = {request.status_code}"))
         if request.status_code == HTTPStatus.UNAUTHORIZED:
@@ -226,16 +385,21 @@ def post_ephemeral_response_message(message, response_url, mgs_type='text'):
         codes.BAD_REQUEST_DATA if data sent is not correct
         codes.INTERNAL_SERVER_ERROR if there is some server error
         codes.UNDEFINED_ERROR if the error is unknown
+        codes.SLACK_API_CONNECTION_ERROR if there is a slack API connection error or timeout
         codes.SUCCESS if the message has ben posted successfully
     """
 
     if not validate_message(message):
         return codes.INVALID_VALUE
 
-    payload = {mgs_type: message, 'response_type': 'ephemeral'}
-    headers = {'content-type': 'application/json'}
+    body = encode_payload({mgs_type: message, 'response_type': 'ephemeral'}, RESPONSE_URL_PAYLOAD)
+    headers = {'Content-Type': 'application/json; charset=utf-8'}
 
-    request = requests.post(response_url, json=payload, headers=headers)
+    try:
+        request = http_client.post(response_url, data=body, headers=headers)
+    except requests.exceptions.RequestException as exception:
+        LOGGER.error(messages.get(3033, exception))
+        return codes.SLACK_API_CONNECTION_ERROR
 
     if request.status_code != HTTPStatus.OK:
         LOGGER.error(messages.get(3025, f"Status code = {request.status_code}"))
@@ -254,12 +418,204 @@ def post_ephemeral_response_message(message, response_url, mgs_type='text'):
 
     return codes.SUCCESS
 
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def increase_outbox_stat(stat):
+    """
+    Function to increase an outbox counter
+
+    Parameters
+    ----------
+    stat: str
+        Counter name: [queued, delivered, dead]
+    """
+
+    with OUTBOX_STATS_LOCK:
+        OUTBOX_STATS[stat] += 1
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def send_private_message(message, channel, mgs_type='text'):
+    """
+    Function to post a private message as the bot user without losing it if Slack is not available. If the post fails
+    with a connection, server or rate limit error, or the channel has older messages waiting in the outbox, the message
+    is queued in the outbox and posted later by the outbox worker, keeping the channel messages order.
+
+    Parameters
+    ----------
+    message: str
+        Message to post
+    channel: str
+        Channel ID
+    mgs_type: str
+        enum: 'text', 'attachments' or 'blocks' depending on message type
+
+    Returns
+    -------
+    int:
+        codes.MESSAGE_QUEUED if the message has been queued in the outbox
+        post_private_message code otherwise
+    """
+
+    start_time = time.time()
+
+    try:
+        queued_messages = slack_outbox.has_pending_messages(channel)
+    except PyMongoError as exception:
+        LOGGER.error(messages.get(3042, exception))
+        queued_messages = False
+
+    if queued_messages:
+        attempts, request_status = 0, codes.MESSAGE_QUEUED
+    else:
+        attempts, request_status = 1, post_private_message(message, channel, mgs_type, as_bot_user=True)
+
+        if request_status == codes.SUCCESS:
+            DELIVERY_LATENCY.record(time.time() - start_time)
+
+        if request_status not in RETRYABLE_POST_ERRORS:
+            return request_status
+
+    try:
+        slack_outbox.add_message(channel, message, mgs_type, attempts, request_status, start_time)
+    except PyMongoError as exception:
+        LOGGER.error(messages.get(3042, exception))
+        return request_status
+
+    increase_outbox_stat('queued')
+    LOGGER.warning(messages.get(2015, f"channel = {channel}, reason = {request_status}"))
+
+    return codes.MESSAGE_QUEUED
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def deliver_channel_messages(channel, max_attempts=settings.SLACK_OUTBOX_MAX_ATTEMPTS):
+    """
+    Function to post the queued messages of a channel, in the order that they were sent. It stops at the first one that
+    can not be posted yet, so they are retried in the same order. Each failed attempt delays the next one with
+    exponential backoff, and the messages that can not be posted are moved to the dead-letter store.
+
+    Parameters
+    ----------
+    channel: str
+        Channel ID
+    max_attempts: int
+        Failed attempts after which a message is moved to the dead-letter store
+
+    Returns
+    -------
+    int:
+        Number of posted messages
+    """
+
+    delivered = 0
+
+    for queued_message in slack_outbox.get_channel_pending_messages(channel):
+        if queued_message['next_attempt_at'] > time.time():
+            break
+
+        request_status = post_private_message(queued_message['message'], channel, queued_message['mgs_type'],
+                                              as_bot_user=True)
+
+        if request_status == codes.SUCCESS:
+            slack_outbox.delete_message(queued_message['_id'])
+            DELIVERY_LATENCY.record(time.time() - queued_message['created_at'])
+            increase_outbox_stat('delivered')
+            delivered += 1
+            continue
+
+        if request_status in RETRYABLE_POST_ERRORS and queued_message['attempts'] + 1 < max_attempts:
+            retry_delay = circuit_breaker.get_retry_delay(queued_message['attempts'],
+                                                          settings.SLACK_OUTBOX_RETRY_BASE_DELAY,
+                                                          settings.SLACK_OUTBOX_RETRY_MAX_DELAY)
+            slack_outbox.set_retry(queued_message['_id'], time.time() + retry_delay, request_status)
+            break
+
+        slack_outbox.set_dead(queued_message['_id'], request_status)
+        increase_outbox_stat('dead')
+        LOGGER.error(messages.get(3043, f"channel = {channel}, attempts = {queued_message['attempts'] + 1}, "
+                                        f"reason = {request_status}"))
+
+    return delivered
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def drain_slack_outbox(workers=settings.SLACK_OUTBOX_WORKERS):
+    """
+    Function to post the queued messages of all channels. The messages of each channel are posted in order by a single
+    thread.
+
+    Parameters
+    ----------
+    workers: int
+        Number of channels whose messages are posted at the same time
+
+    Returns
+    -------
+    int:
+        Number of posted messages
+    """
+
+    return worker.process_by_key(slack_outbox.get_pending_channels(), deliver_channel_messages, workers, 'slack_outbox',
+                                 LOGGER, 3046)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def start_slack_outbox_worker(interval=settings.SLACK_OUTBOX_INTERVAL):
+    """
+    Function to post the queued messages periodically in a background thread
+
+    Parameters
+    ----------
+    interval: int
+        Seconds between runs
+
+    Returns
+    -------
+    threading.Event:
+        Event to stop the worker
+    """
+
+    return worker.start_periodic_worker(drain_slack_outbox, interval, LOGGER, 3044)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_outbox_stats():
+    """
+    Function to get the Slack outbox stats
+
+    Returns
+    -------
+    dict:
+        Number of pending and dead-letter messages (None if the database is not available), number of queued, delivered
+        and dead-lettered messages and delivery latency stats (ms)
+    """
+
+    try:
+        depth = {'pending': slack_outbox.count_messages(slack_outbox.PENDING_STATUS),
+                 'dead': slack_outbox.count_messages(slack_outbox.DEAD_STATUS)}
+    except PyMongoError:
+        depth = {'pending': None, 'dead': None}
+
+    with OUTBOX_STATS_LOCK:
+        counters = dict(OUTBOX_STATS)
+
+    return {'depth': depth, 'counters': counters, 'delivery_latency': DELIVERY_LATENCY.get_stats()}
+
 # ----------------------------------------------------------------------------------------------------------------------
 
 
 def decode_slack_args(data):
     """
-    Function to decode slack response args from x=1&y=2&z=3 format to {x:1,y:2,z:3}
+    Function to decode slack response args from x=1&y=2&z=3 format to {x:1,y:2,z:3}. The pairs are split before
+    unquoting them, so the values can contain & and = characters.
 
     Parameters
     ----------
@@ -271,9 +627,8 @@ def decode_slack_args(data):
     dict:
         Slack args in dict format
     """
-    data = urllib.parse.unquote(data)
-    elements = [pair_value for item in data.split('&') for pair_value in item.split('=')]
-    return dict(zip(elements[0::2], elements[1::2]))
+
+    return dict(urllib.parse.parse_qsl(data, keep_blank_values=True))
 
 # ----------------------------------------------------------------------------------------------------------------------
 
@@ -284,8 +639,8 @@ def get_api_data(data, callback_id):
 
     Parameters
     ----------
-    data: str
-        Slack response data
+    data: dict
+        Slack command data. See decode_slack_args
 
     callback_id: string
         Identifier to know which dialog to show
@@ -295,7 +650,6 @@ def get_api_data(data, callback_id):
     dict:
         Slack API data to open a new modal dialog
     """
-    data = decode_slack_args(data)
 
     if callback_id == CLOCK_CALLBACK:
         dialog = slack_ui.get_clock_ui()
@@ -378,7 +732,7 @@ def generate_clock_message(data):
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-def process_clock_history_action(token, action):
+def process_clock_history_action(token, action, user_id=None):
     """
     Function to process clock history action and returns user selected data
 
@@ -388,6 +742,8 @@ def process_clock_history_action(token, action):
         Intratime user token authentication
     action: str
         Callback action
+    user_id: str
+        Slack user identifier. If it is specified, the clocks are read from the local clock store
 
     Returns
     -------
@@ -395,11 +751,15 @@ def process_clock_history_action(token, action):
         (worked_hours)(history_data)
     int:
         codes.INVALID_HISTORY_ACTION if action is not supported
+        Error code returned by intratime.get_user_clocks
     """
 
     time_range = action.replace('_hours', '').replace('_history', '')
 
-    data = intratime.get_clock_data_in_time_range(token, time_range)
+    data = intratime.get_cached_clock_data_in_time_range(token, time_range, user_id)
+
+    if isinstance(data, int):
+        return data
 
     data.reverse()  # It is necessary to reverse the list to check and calculate the history hours
 
@@ -417,11 +777,11 @@ def filter_clock_history_data(data, datetime_from, datetime_to):
     """
     Function to get the clock history data in a time range. e.g
 
-    { datetime_1: [item_1, item_2], datetime_2: [item_3, item_4, item_5] }
+    { date_1: [item_1, item_2], date_2: [item_3, item_4, item_5] }
 
     Parameters
     ----------
-    data: dict
+    data: list(ClockEvent)
         Parsed clock data
     datetime_from: str
         Lower limit datetime in format %Y-%m-%d %H:%M:%S
@@ -431,25 +791,74 @@ def filter_clock_history_data(data, datetime_from, datetime_to):
     Returns
     -------
     dict:
-        Filtered clock history data dictionary.
+        Filtered clock history data dictionary, with the dates in format %Y-%m-%d as keys
     """
 
-    filter_data = [item for item in data if time_utils.date_included_in_range(datetime_from, datetime_to,
-                   item['datetime'])]
+    timestamp_from = to_timestamp(datetime_from)
+    timestamp_to = to_timestamp(datetime_to)
     group_data = {}
 
-    for item in filter_data:
-        date = time_utils.convert_datetime_string_to_date_string(item['datetime'])
-        if date in group_data:
-            group_data[date].append(item)
-        else:
-            group_data[date] = [item]
+    for item in data:
+        if timestamp_from <= item.timestamp <= timestamp_to:
+            group_data.setdefault(item.date, []).append(item)
 
     return group_data
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+def get_error_message_key(status, default_key):
+    """
+    Function to get the key of the custom message of an error code
+
+    Parameters
+    ----------
+    status: int
+        Error code
+    default_key: str
+        Message key used if the error has not a specific message
+
+    Returns
+    -------
+    str:
+        Message key (see messages.set_custom_message)
+    """
+
+    return 'INTRATIME_UNAVAILABLE' if status == codes.INTRATIME_UNAVAILABLE else default_key
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def notify_queued_clocking(queued_clocking, result):
+    """
+    Function to send a private message to a user with the result of a queued clocking
+
+    Parameters
+    ----------
+    queued_clocking: dict
+        Queued clocking
+    result: int || tuple(boolean, str)
+        Delivery result. See clock_pipeline.deliver_queued_clocking
+    """
+
+    parameters = [queued_clocking['action'], queued_clocking['datetime']]
+
+    if result == codes.SUCCESS:
+        send_private_message(messages.set_custom_message('QUEUED_CLOCKING_DELIVERED', parameters),
+                             queued_clocking['user_id'])
+        return
+
+    if isinstance(result, tuple):
+        parameters.extend(['', result[1]])
+    else:
+        parameters.extend([result, 'Please, clock it manually in Intratime'])
+
+    send_private_message(messages.set_custom_message('QUEUED_CLOCKING_ERROR', parameters), queued_clocking['user_id'],
+                         mgs_type='blocks')
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 def process_interactive_data(data):
     """
     Function to process interactive data from slack service
@@ -461,36 +870,28 @@ def process_interactive_data(data):
     """
 
     if data['callback_id'] == CLOCK_CALLBACK:
-        user_data = user.get_user_data(data['user']['id'])
-        token = intratime.get_auth_token(user_data['intratime_mail'], crypt.decrypt(user_data['password']))
-        user_can_clock_this_action = intratime.user_can_clock_this_action(token, data['submission']['action'])
-
-        if not user_can_clock_this_action[0]:
-            post_ephemeral_response_message(messages.set_custom_message('INVALID_CLOCKING_ACTION',
-                                            [user_can_clock_this_action[1]]), data['response_url'], 'blocks')
-            return
-
-        # Clock the action
-        request_status = intratime.clocking(data['submission']['action'], token, user_data['intratime_mail'])
+        action = data['submission']['action']
 
-        if request_status != codes.SUCCESS:
-            post_ephemeral_response_message(messages.set_custom_message('CLOCKING_ERROR', [request_status]),
-                                            data['response_url'], 'blocks')
-            return
-        # Check the clock action in user history
-        clocking_check = intratime.get_user_clocks(token, time_utils.get_past_datetime_from_current_datetime(10),
-                                                   time_utils.get_current_date_time(), data['submission']['action'])
-        if len(clocking_check) == 0:
-            post_ephemeral_response_message(messages.set_custom_message('CLOCKING_CHECK_ERROR', [request_status]),
+        def post_verify_error(status):
+            post_ephemeral_response_message(messages.set_custom_message('CLOCKING_CHECK_ERROR', [status]),
                                             data['response_url'], 'blocks')
-            return
 
-        clock_message = generate_clock_message({'intratime_mail': user_data['intratime_mail'],
-                                                'datetime': time_utils.get_current_date_time(),
-                                                'action': data['submission']['action']})
-
-        monitoring.clock_user_action(data['user']['id'], data['user']['name'], data['submission']['action'].upper())
-        post_ephemeral_response_message(clock_message, data['response_url'], 'blocks')
+        clock_result = clock_pipeline.clock(data['user']['id'], action, post_verify_error)
+
+        with clock_pipeline.timed_stage(clock_pipeline.NOTIFY_STAGE):
+            if isinstance(clock_result, int):
+                message_key = get_error_message_key(clock_result, 'CLOCKING_ERROR')
+                post_ephemeral_response_message(messages.set_custom_message(message_key, [clock_result]),
+                                                data['response_url'], 'blocks')
+            elif isinstance(clock_result, tuple):
+                post_ephemeral_response_message(messages.set_custom_message('INVALID_CLOCKING_ACTION',
+                                                [clock_result[1]]), data['response_url'], 'blocks')
+            elif clock_result.get('queued'):
+                post_ephemeral_response_message(messages.set_custom_message('CLOCKING_QUEUED',
+                                                [action, clock_result['datetime']]), data['response_url'])
+            else:
+                monitoring.clock_user_action(data['user']['id'], data['user']['name'], action.upper())
+                post_ephemeral_response_message(generate_clock_message(clock_result), data['response_url'], 'blocks')
 
     elif (data['callback_id'] == WORKED_TIME_CALLBACK or data['callback_id'] == CLOCK_HISTORY_CALLBACK or
           data['callback_id'] == TIME_HISTORY_CALLBACK):
@@ -498,8 +899,17 @@ def process_interactive_data(data):
         user_data = user.get_user_data(data['user']['id'])
         user_query_action = data['submission']['action']
 
-        token = intratime.get_auth_token(user_data['intratime_mail'], crypt.decrypt(user_data['password']))
-        worked_time, history = process_clock_history_action(token, user_query_action)
+        credentials = (data['user']['id'], user_data['intratime_mail'], crypt.decrypt(user_data['password']))
+        history_data = intratime.run_with_user_token(*credentials, process_clock_history_action,
+                                                     action=user_query_action, user_id=data['user']['id'])
+
+        if isinstance(history_data, int):
+            message_key = get_error_message_key(history_data, 'HISTORY_ERROR')
+            post_ephemeral_response_message(messages.set_custom_message(message_key, [history_data]),
+                                            data['response_url'], 'blocks')
+            return
+
+        worked_time, history = history_data
 
         custom_message = {
             'today_hours': 'on today',
@@ -511,10 +921,11 @@ def process_interactive_data(data):
             message = messages.set_custom_message('WORKED_TIME', [custom_message[user_query_action], worked_time])
             post_ephemeral_response_message(message, data['response_url'])
         else:
-            message_blocks = messages.generate_slack_history_report(token, user_query_action, history,
-                                                                    worked_time, data['callback_id'])
-            for block in message_blocks:
-                post_private_message(block, data['user']['id'], mgs_type='blocks', as_bot_user=True)
+            message_blocks = messages.generate_slack_history_report(intratime.get_user_token(*credentials),
+                                                                    user_query_action, history, worked_time,
+                                                                    data['callback_id'])
+            for block in messages.pack_slack_messages(message_blocks):
+                send_private_message(block, data['user']['id'], mgs_type='blocks')
 
     elif data['callback_id'] == ADD_USER_CALLBACK:
         cyphered_password = crypt.encrypt(data['submission']['password'])
@@ -535,6 +946,8 @@ def process_interactive_data(data):
 
     elif data['callback_id'] == UPDATE_USER_CALLBACK:
         user_data = user.get_user_data(data['user']['id'])
+        old_email = user_data['intratime_mail']
+        intratime.invalidate_user_token(data['user']['id'], old_email)
         user_data['intratime_mail'] = data['submission']['email']
         user_data['password'] = crypt.encrypt(data['submission']['password'])
 
@@ -544,6 +957,11 @@ def process_interactive_data(data):
         if request_status != codes.SUCCESS:
             post_ephemeral_response_message(messages.set_custom_message('UPDATE_USER_ERROR', [request_status]),
                                             data['response_url'], 'blocks')
+            return
+
+        # The stored clocks belong to the old Intratime account, so they are synced again from the new one
+        if old_email != data['submission']['email']:
+            clock.delete_user_clocks(data['user']['id'])
 
         post_ephemeral_response_message(messages.UPDATE_USER_SUCCESS, data['response_url'])
 
@@ -551,8 +969,14 @@ def process_interactive_data(data):
         # Delete an user
         request_status = user.delete_user(data['user']['id'])
 
+        # The user data is only purged if the user has been deleted, so a user that is still registered keeps it
         if request_status != codes.SUCCESS:
             post_ephemeral_response_message(messages.set_custom_message('DELETE_USER_ERROR', [request_status]),
                                             data['response_url'], 'blocks')
+            return
+
+        clock.delete_user_clocks(data['user']['id'])
+        clock_queue.delete_user_clockings(data['user']['id'])
+        slack_outbox.delete_channel_messages(data['user']['id'])
 
         post_ephemeral_response_message(messages.DELETE_USER_SUCCESS, data['response_url'])
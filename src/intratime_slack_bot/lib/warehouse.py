@@ -2,8 +2,10 @@ from intratime_slack_bot.config import settings
 
 
 # URLS
-SLACK_POST_MESSAGE_URL = 'https://slack.com/api/chat.postMessage'
-SLACK_POST_EPHEMERAL_MESSAGE_URL = 'https://slack.com/api/chat.postEphemeral'
+SLACK_POST_MESSAGE_METHOD = 'chat.postMessage'
+SLACK_POST_EPHEMERAL_MESSAGE_METHOD = 'chat.postEphemeral'
+SLACK_POST_MESSAGE_URL = f"https://slack.com/api/{SLACK_POST_MESSAGE_METHOD}"
+SLACK_POST_EPHEMERAL_MESSAGE_URL = f"https://slack.com/api/{SLACK_POST_EPHEMERAL_MESSAGE_METHOD}"
 SLACK_OPEN_DIALOG_URL = 'https://slack.com/api/dialog.open'
 
 MONGO_DB_SERVER = f"mongodb://{settings.MONGO_DB_USER}:{settings.MONGO_DB_PASSWORD}@{settings.MONGO_DB_HOST}:"\
@@ -13,6 +15,7 @@ SLACK_SERVICE_BASE_URL = f"{settings.PROTOCOL}://{settings.SLACK_SERVICE_HOST}:{
 
 # API PATHS
 ECHO_REQUEST = '/echo'
+STATUS_REQUEST = '/status'
 CLOCK_REQUEST = '/clock'
 ADD_USER_REQUEST = '/sign_up'
 UPDATE_USER_REQUEST = '/update_user'
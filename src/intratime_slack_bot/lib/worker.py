@@ -0,0 +1,105 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from intratime_slack_bot.lib import messages
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def process_by_key(keys, function, workers, thread_name_prefix, logger, error_code):
+    """
+    Function to process the queued items of several keys at the same time. The items of each key are processed in order
+    by a single thread, and an unexpected error processing a key does not stop the processing of the other ones.
+
+    Parameters
+    ----------
+    keys: list
+        Keys whose items are processed
+    function: function
+        Function called with a key that processes its items, and returns the number of processed items
+    workers: int
+        Number of keys processed at the same time
+    thread_name_prefix: str
+        Prefix of the worker threads name
+    logger: logging.Logger
+        Logger of the unexpected errors
+    error_code: int
+        Message code of the unexpected errors
+
+    Returns
+    -------
+    int:
+        Number of processed items
+    """
+
+    def process_key(key):
+        try:
+            return function(key)
+        except Exception as exception:
+            logger.error(messages.get(error_code, f"key = {key}, error = {exception!r}"))
+            return 0
+
+    if len(keys) == 0:
+        return 0
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=thread_name_prefix) as executor:
+        return sum(executor.map(process_key, keys))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def run_periodically(stop_event, interval, function, logger, error_code):
+    """
+    Function to run a job periodically until the stop event is set. An unexpected error is logged and the job is run
+    again in the next interval.
+
+    Parameters
+    ----------
+    stop_event: threading.Event
+        Event set to stop the worker
+    interval: int
+        Seconds between runs
+    function: function
+        Job to run, called without arguments
+    logger: logging.Logger
+        Logger of the unexpected errors
+    error_code: int
+        Message code of the unexpected errors
+    """
+
+    while not stop_event.wait(interval):
+        try:
+            function()
+        except Exception as exception:
+            logger.error(messages.get(error_code, exception))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def start_periodic_worker(function, interval, logger, error_code):
+    """
+    Function to run a job periodically in a background thread
+
+    Parameters
+    ----------
+    function: function
+        Job to run, called without arguments
+    interval: int
+        Seconds between runs
+    logger: logging.Logger
+        Logger of the unexpected errors
+    error_code: int
+        Message code of the unexpected errors
+
+    Returns
+    -------
+    threading.Event:
+        Event to stop the worker
+    """
+
+    stop_event = threading.Event()
+    threading.Thread(target=run_periodically, args=(stop_event, interval, function, logger, error_code),
+                     daemon=True).start()
+
+    return stop_event
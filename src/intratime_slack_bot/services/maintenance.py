@@ -0,0 +1,121 @@
+import argparse
+
+from intratime_slack_bot.config import settings
+from intratime_slack_bot.lib.db import user, indexes, history_rollup, slack_outbox
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def rotate_cipher_keys(parameters):
+    """
+    Command to re-encrypt the stored user passwords with the current cipher key (settings.CIPHER_KEY)
+
+    Parameters
+    ----------
+    parameters: argparse.Namespace
+        Command parameters
+    """
+
+    summary = user.rotate_passwords_encryption(parameters.batch_size)
+
+    print(f"Rotated: {summary['rotated']}, already rotated: {summary['skipped']}, errors: {summary['errors']}")
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def create_indexes(parameters):
+    """
+    Command to create the collection indexes (if they do not exist) and check that the hot queries use them
+
+    Parameters
+    ----------
+    parameters: argparse.Namespace
+        Command parameters
+    """
+
+    for index_name, created in indexes.create_indexes(parameters.progress_interval).items():
+        print(f"Index {index_name}: {'OK' if created else 'ERROR'}")
+
+    for query_name, uses_index in indexes.check_query_plans().items():
+        print(f"Query {query_name}: {'IXSCAN' if uses_index else 'NOT USING INDEX'}")
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def compact_history(parameters):
+    """
+    Command to compact the raw history registers into daily rollups and delete the old compacted registers
+
+    Parameters
+    ----------
+    parameters: argparse.Namespace
+        Command parameters
+    """
+
+    summary = history_rollup.compact_history(parameters.retention_days)
+
+    print(f"Compacted days: {summary['days']}, rollups updated: {summary['rollups']}, "
+          f"raw registers deleted: {summary['deleted']}")
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def replay_slack_outbox(parameters):
+    """
+    Command to move the Slack messages of the dead-letter store back to the outbox, so the service posts them again
+
+    Parameters
+    ----------
+    parameters: argparse.Namespace
+        Command parameters
+    """
+
+    replayed = slack_outbox.replay_dead_messages(parameters.channel)
+
+    print(f"Replayed messages: {replayed}, pending messages: "
+          f"{slack_outbox.count_messages(slack_outbox.PENDING_STATUS)}")
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_parameters():
+    """
+    Function to parse the maintenance command line parameters
+
+    Returns
+    -------
+    argparse.Namespace:
+        Parsed parameters
+    """
+
+    parser = argparse.ArgumentParser(description='Intratime slack bot maintenance commands')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    rotate_parser = subparsers.add_parser('rotate_cipher_keys', help='Re-encrypt user passwords with the current key')
+    rotate_parser.add_argument('--batch-size', type=int, default=settings.CIPHER_ROTATION_BATCH_SIZE,
+                               help='Number of users updated per bulk write')
+    rotate_parser.set_defaults(function=rotate_cipher_keys)
+
+    indexes_parser = subparsers.add_parser('create_indexes', help='Create the collection indexes and check queries')
+    indexes_parser.add_argument('--progress-interval', type=int, default=settings.INDEX_BUILD_PROGRESS_INTERVAL,
+                                help='Seconds between index build progress logs')
+    indexes_parser.set_defaults(function=create_indexes)
+
+    compact_parser = subparsers.add_parser('compact_history', help='Compact the history into daily rollups')
+    compact_parser.add_argument('--retention-days', type=int, default=settings.HISTORY_RETENTION_DAYS,
+                                help='Days that the raw history registers are kept')
+    compact_parser.set_defaults(function=compact_history)
+
+    replay_parser = subparsers.add_parser('replay_slack_outbox', help='Post again the dead-letter Slack messages')
+    replay_parser.add_argument('--channel', default=None, help='Replay only the messages of this channel ID')
+    replay_parser.set_defaults(function=replay_slack_outbox)
+
+    return parser.parse_args()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    parameters = get_parameters()
+    parameters.function(parameters)
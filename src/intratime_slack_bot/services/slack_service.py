@@ -8,16 +8,18 @@ import os
 import time
 import hmac
 import hashlib
+import signal
 
-from flask import Flask, jsonify, request, make_response
+from flask import Flask, jsonify, request, make_response, g
 from http import HTTPStatus
 from functools import wraps
 from logging.handlers import TimedRotatingFileHandler
 
 from intratime_slack_bot.config import settings
-from intratime_slack_bot.lib.db import user
-from intratime_slack_bot.lib.db.monitoring import add_history_register
-from intratime_slack_bot.lib import messages, warehouse, slack, intratime, codes, crypt, slack_ui
+from intratime_slack_bot.lib.db import user, indexes, database, history_rollup
+from intratime_slack_bot.lib.db import monitoring as history
+from intratime_slack_bot.lib import messages, warehouse, slack, intratime, codes, crypt, slack_ui, http_client, \
+    clock_pipeline
 
 # ----------------------------------------------------------------------------------------------------------------------
 
@@ -95,6 +97,11 @@ ALLOWED_COMMANDS = {
     }
 }
 
+# Interactive requests that need to request the Intratime API. The clockings are not included, because they are queued
+# while Intratime is not available (see clock_pipeline.clock)
+INTRATIME_CALLBACKS = [slack.CLOCK_HISTORY_CALLBACK, slack.TIME_HISTORY_CALLBACK, slack.WORKED_TIME_CALLBACK,
+                       slack.ADD_USER_CALLBACK, slack.UPDATE_USER_CALLBACK]
+
 # ----------------------------------------------------------------------------------------------------------------------
 
 
@@ -102,6 +109,34 @@ def empty_response():
     return make_response('', HTTPStatus.OK)
 
 # ----------------------------------------------------------------------------------------------------------------------
+
+
+def intratime_unavailable_response(response_url):
+    slack.post_ephemeral_response_message(messages.set_custom_message('INTRATIME_UNAVAILABLE',
+                                                                      [codes.INTRATIME_UNAVAILABLE]),
+                                          response_url, 'blocks')
+    return empty_response()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_slack_payload():
+    """
+    Function to get the form data of the current Slack request. The body is parsed once per request (with the werkzeug
+    form parser) and shared by the decorators and the endpoint.
+
+    Returns
+    -------
+    dict:
+        Request form data. e.g {'command': '/clock', 'text': 'in', 'user_id': 'x', 'response_url': 'x', ...}
+    """
+
+    if 'slack_payload' not in g:
+        g.slack_payload = request.form.to_dict()
+
+    return g.slack_payload
+
+# ----------------------------------------------------------------------------------------------------------------------
 #                                                API DECORATORS                                                        #
 # ----------------------------------------------------------------------------------------------------------------------
 
@@ -114,14 +149,14 @@ def validate_slack_request(func):
 
         request_signature = request.headers['X-Slack-Signature']
         request_timestamp = int(request.headers['X-Slack-Request-Timestamp'])
-        request_body = request.get_data().decode('utf-8')
 
         # Verify that the request is not prior to 1 minute (Avoid replay attacks)
         if int(time.time() - request_timestamp) > 60:
             return jsonify({'result': messages.BAD_SLACK_TIMESTAMP_REQUEST}), HTTPStatus.BAD_REQUEST
 
-        sign_basestring = f"v0:{request_timestamp}:{request_body}"
-        signature = hmac.new(bytes(settings.SLACK_APP_SIGNATURE, 'utf-8'), bytes(sign_basestring, 'utf-8'),
+        # The raw body is cached, so the form data is parsed from it later without reading the request stream again
+        sign_basestring = f"v0:{request_timestamp}:".encode('utf-8') + request.get_data()
+        signature = hmac.new(bytes(settings.SLACK_APP_SIGNATURE, 'utf-8'), sign_basestring,
                              digestmod=hashlib.sha256).hexdigest()
         signature_check = f"v0={signature}"
 
@@ -139,7 +174,7 @@ def validate_slack_request(func):
 def validate_user(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        data = slack.decode_slack_args(request.get_data().decode('utf-8'))
+        data = get_slack_payload()
 
         if not user.user_exist(data['user_id']):
             message = messages.slack_warning_message('You are not registered. Please sign up using `/sign_up` command')
@@ -156,7 +191,7 @@ def validate_user(func):
 def monitoring(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        data = slack.decode_slack_args(request.get_data().decode('utf-8'))
+        data = get_slack_payload()
         parameters = ""
         try:
             parameters = data['text']
@@ -166,7 +201,7 @@ def monitoring(func):
         history_data = {'user_name': data['user_name'], 'user_id': data['user_id'], 'command': data['command'],
                         'parameters': parameters}
 
-        add_history_register(history_data)
+        history.enqueue_history_register(history_data)
 
         return func(*args, **kwargs)
 
@@ -178,8 +213,8 @@ def monitoring(func):
 def process_request(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        # DECODE SLACK DATA
-        data = slack.decode_slack_args(request.get_data().decode('utf-8'))
+        # Copy, because the data is extended to send it as an interactive request
+        data = dict(get_slack_payload())
 
         parameters = [data['command']]
 
@@ -202,10 +237,12 @@ def process_request(func):
 
         # If there is no command parameters and command has user interface
         if len(parameters) == 1:
-            data = request.get_data().decode('utf-8')
             api_data = slack.get_api_data(data, callback_id)
 
-            requests.post(warehouse.SLACK_OPEN_DIALOG_URL, data=api_data)
+            try:
+                http_client.post(warehouse.SLACK_OPEN_DIALOG_URL, data=api_data)
+            except requests.exceptions.RequestException as exception:
+                app.logger.error(messages.get(3033, exception))
 
             return empty_response()
 
@@ -229,9 +266,12 @@ def process_request(func):
 
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         url = f"{settings.PROTOCOL}://{settings.APP_DOMAIN}{warehouse.INTERACTIVE_REQUEST}"
-        data = urllib.parse.urlencode({'payload': data})
+        data = urllib.parse.urlencode({'payload': json.dumps(data)})
 
-        requests.post(url, data=data, headers=headers)
+        try:
+            http_client.post(url, data=data, headers=headers)
+        except requests.exceptions.RequestException as exception:
+            app.logger.error(messages.get(3033, exception))
 
         return empty_response()
 
@@ -256,6 +296,47 @@ def echo():
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+@app.route(warehouse.STATUS_REQUEST, methods=['GET'])
+def status():
+    """
+    Description: Endpoint to get the service internal stats
+
+    Input_data: {}
+
+    Output_data: {'token_cache': {'size': 3, 'max_size': 1000, 'hits': 10, 'misses': 3, 'hit_ratio': 0.7692},
+                  'user_cache': {'size': 2, 'max_size': 1000, 'hits': 25, 'misses': 5, 'hit_ratio': 0.8333},
+                  'history_writer': {'enqueued': 20, 'written': 20, 'dropped': 0, 'pending': 0, ...},
+                  'mongo_pool': {'max_pool_size': 50, 'checkout_wait': {'count': 30, 'p99_ms': 0.2, ...}, ...},
+                  'clock_pipeline': {'stages': {'auth': {'count': 5, 'p50_ms': 0.01, 'p99_ms': 350.2, ...}, ...},
+                                     'verification': {'verified': 5, 'failed': 0},
+                                     'queue': {'queued': 2, 'delivered': 2, 'failed': 0}},
+                  'intratime_breaker': {'state': 'closed', 'failure_rate': 0.05, 'calls': 20, 'rejected_calls': 0,
+                                        'open_count': 0},
+                  'intratime_limiter': {'limit': 20, 'in_flight': 4, 'waiting': 0, 'rejected_calls': 0,
+                                        'wait': {'count': 40, 'p99_ms': 0.1, ...}},
+                  'clock_data_cache': {'size': 2, 'hits': 4, 'misses': 6, 'shared_calls': 3, 'in_flight': 0, ...},
+                  'slack_rate_limiters': {'chat.postMessage': {'rate': 1, 'capacity': 10, 'tokens': 7.5,
+                                                               'wait': {'count': 12, 'p99_ms': 1000.3, ...}}, ...},
+                  'slack_payload_sizes': {'chat.postMessage': {'count': 12, 'total_bytes': 30512, 'p99_bytes': 6021,
+                                                               ...}, ...},
+                  'slack_outbox': {'depth': {'pending': 2, 'dead': 0}, 'counters': {'queued': 5, 'delivered': 3, ...},
+                                   'delivery_latency': {'count': 40, 'p99_ms': 35012.4, ...}}}
+    """
+    return jsonify({'token_cache': intratime.get_token_cache_stats(),
+                    'user_cache': user.get_user_cache_stats(),
+                    'history_writer': history.get_history_writer_stats(),
+                    'mongo_pool': database.get_pool_stats(),
+                    'clock_pipeline': clock_pipeline.get_stats(),
+                    'intratime_breaker': intratime.get_breaker_stats(),
+                    'intratime_limiter': intratime.get_limiter_stats(),
+                    'clock_data_cache': intratime.get_clock_data_cache_stats(),
+                    'slack_rate_limiters': slack.get_rate_limiter_stats(),
+                    'slack_payload_sizes': slack.get_payload_size_stats(),
+                    'slack_outbox': slack.get_outbox_stats()})
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 @app.route(warehouse.INTERACTIVE_REQUEST, methods=['POST'])
 def get_interactive_data():
     """
@@ -268,18 +349,26 @@ def get_interactive_data():
 
     Output_data: {}, 200
     """
-    data = json.loads(urllib.parse.parse_qs(request.get_data().decode('utf-8'))['payload'][0].replace('\'', '"'))
+    data = json.loads(get_slack_payload()['payload'])
+
+    # Fail fast while Intratime is not responding, instead of waiting for the request timeouts
+    if data['callback_id'] in INTRATIME_CALLBACKS and intratime.is_intratime_unavailable():
+        return intratime_unavailable_response(data['response_url'])
 
     if data['callback_id'] == slack.CLOCK_CALLBACK:
+        user_data = user.get_user_data(data['user']['id'])
+
         # Check if the user do not exist
-        if not user.user_exist(data['user']['id']):
+        if user_data == codes.USER_NOT_FOUND:
             return jsonify(slack.CLOCKING_USER_NOT_FOUND), HTTPStatus.OK
 
-        user_data = user.get_user_data(data['user']['id'])
+        # Validate credentials. The token is cached to be used by the clocking process. If Intratime is not reachable,
+        # the clocking process queues the clocking
+        token = intratime.get_user_token(data['user']['id'], user_data['intratime_mail'],
+                                         crypt.decrypt(user_data['password']))
 
-        # Validate credentials
-        if not intratime.check_user_credentials(user_data['intratime_mail'], crypt.decrypt(user_data['password'])):
-            return jsonify(slack.BAD_BD_CREDENTIALS), HTTPStatus.OK
+        if token in intratime.INTRATIME_AUTH_ERRORS and token not in clock_pipeline.QUEUEABLE_ERRORS:
+            return jsonify(slack.CLOCKING_BAD_USER_CREDENTIALS), HTTPStatus.OK
 
     elif data['callback_id'] == slack.CLOCK_HISTORY_CALLBACK or data['callback_id'] == slack.TIME_HISTORY_CALLBACK:
         # Check if the user do not exist
@@ -292,12 +381,23 @@ def get_interactive_data():
             return jsonify(slack.USER_ALREADY_REGISTERED_MESSAGE), HTTPStatus.OK
 
         # Validate credentials
-        if not intratime.check_user_credentials(data['submission']['email'], data['submission']['password']):
+        token = intratime.get_user_token(data['user']['id'], data['submission']['email'],
+                                         data['submission']['password'])
+
+        if token == codes.INTRATIME_UNAVAILABLE:
+            return intratime_unavailable_response(data['response_url'])
+
+        if token in intratime.INTRATIME_AUTH_ERRORS:
             return jsonify(slack.BAD_CREDENTIALS), HTTPStatus.OK
 
     elif data['callback_id'] == slack.UPDATE_USER_CALLBACK:
-        # Validate credentials
-        if not intratime.check_user_credentials(data['submission']['email'], data['submission']['password']):
+        # Validate credentials. The token is not taken from the cache, because the password may have changed
+        token = intratime.get_auth_token(data['submission']['email'], data['submission']['password'])
+
+        if token == codes.INTRATIME_UNAVAILABLE:
+            return intratime_unavailable_response(data['response_url'])
+
+        if token in intratime.INTRATIME_AUTH_ERRORS:
             return jsonify(slack.BAD_CREDENTIALS), HTTPStatus.OK
 
         user_data = user.get_user_data(data['user']['id'])
@@ -473,8 +573,8 @@ def command_help():
 
     Output_data: {}, 200
     """
-    data = urllib.parse.parse_qs(request.get_data().decode('utf-8'))
-    slack.post_ephemeral_response_message([messages.slack_command_help()], data['response_url'][0], 'blocks')
+    data = get_slack_payload()
+    slack.post_ephemeral_response_message([messages.slack_command_help()], data['response_url'], 'blocks')
 
     return empty_response()
 
@@ -482,4 +582,19 @@ def command_help():
 
 
 if __name__ == '__main__':
+    # Exit normally on SIGTERM, so the exit handlers (e.g. pending history registers flush) are run
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit(0))
+
+    if settings.CREATE_INDEXES_ON_STARTUP:
+        indexes.create_indexes()
+
+    if settings.HISTORY_COMPACTION_INTERVAL > 0:
+        history_rollup.start_history_compaction()
+
+    if settings.CLOCK_QUEUE_INTERVAL > 0:
+        clock_pipeline.start_clock_queue_worker(slack.notify_queued_clocking)
+
+    if settings.SLACK_OUTBOX_INTERVAL > 0:
+        slack.start_slack_outbox_worker()
+
     app.run(host=settings.SLACK_SERVICE_HOST, port=settings.SLACK_SERVICE_PORT, debug=settings.DEBUG_MODE)
@@ -0,0 +1,62 @@
+import timeit
+
+from cryptography.fernet import Fernet
+
+from intratime_slack_bot.lib import crypt
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+TEST_PASSWORD = 'a1b2c3d4e5f6g7h8'
+TEST_TEXT = 'hello world'
+NUM_CALLS = 50
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def uncached_decrypt(encrypted_text, password=TEST_PASSWORD):
+    """
+    Function to decrypt a ciphered text deriving the cipher key on every call (previous crypt behavior)
+
+    Parameters
+    ----------
+    encrypted_text: str
+        Text to decipher
+    password: str
+        Password. It must be 16 || 32 characters long
+
+    Returns
+    -------
+    str:
+        Deciphered text
+    """
+
+    return Fernet(crypt.generate_cipher_key(password)).decrypt(encrypted_text.encode()).decode()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def benchmark(name, function):
+    """
+    Function to measure and print the mean cost per call of a function
+
+    Parameters
+    ----------
+    name: str
+        Benchmark name
+    function: function
+        Function to measure
+    """
+
+    seconds = timeit.timeit(function, number=NUM_CALLS)
+    print(f"{name}: {seconds / NUM_CALLS * 1000000:.1f} us/call")
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    ciphered_text = crypt.encrypt(TEST_TEXT, TEST_PASSWORD)
+
+    benchmark('decrypt (derive key per call)', lambda: uncached_decrypt(ciphered_text))
+    benchmark('decrypt (cached cipher)', lambda: crypt.decrypt(ciphered_text, TEST_PASSWORD))
+    benchmark('encrypt (cached cipher)', lambda: crypt.encrypt(TEST_TEXT, TEST_PASSWORD))
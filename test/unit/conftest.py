@@ -1,11 +1,16 @@
 import pytest
 import os
+import json
+import threading
+import http.server
+from collections import defaultdict
 from time import sleep
 
 from intratime_slack_bot.lib.test_utils import TEST_FILE
 from intratime_slack_bot.config import settings
 from intratime_slack_bot.lib import intratime, crypt, logger, slack, logger
-from intratime_slack_bot.lib.db import user
+from intratime_slack_bot.lib.db import user, ordered_queue, clock_queue, slack_outbox
+from intratime_slack_bot.lib.db.database import CLOCK_QUEUE_COLLECTION, SLACK_OUTBOX_COLLECTION
 from intratime_slack_bot.config.settings import INTRATIME_TEST_USER_EMAIL, INTRATIME_TEST_USER_PASSWORD
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -17,6 +22,8 @@ TEST_USER_DATA = {'user_id': 'test', 'user_name': 'test', 'intratime_mail': sett
 
 CLOCK_SLEEP_TIME = 1
 
+TEST_QUEUE_KEY = 'ordered_queue_test_key'
+
 # ----------------------------------------------------------------------------------------------------------------------
 
 
@@ -163,3 +170,146 @@ def mock_user_logger(remove_test_file):
     user.LOGGER = logger.get_logger('test', settings.LOGS_LEVEL, TEST_FILE)
     yield
     user.LOGGER = backup_logger
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class FakeClock:
+    # MONOTONIC CLOCK MOVED BY HAND. IT IS ALSO A FAKE time.sleep THAT MOVES THE CLOCK INSTEAD OF WAITING
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+@pytest.fixture
+def fake_clock(request):
+    return FakeClock()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class FakeIntratimeHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status_code, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_server_error(self):
+        # THE NEXT server.error_responses REQUESTS FAIL
+        self.server.request_count += 1
+
+        if self.server.error_responses > 0:
+            self.server.error_responses -= 1
+            self.send_json(503, {})
+            return True
+
+        return False
+
+    def do_GET(self):
+        if self.send_server_error():
+            return
+
+        # THE CLOCKS CONTAIN THE RECEIVED TOKEN, SO THE CLIENT CAN CHECK THAT IT HAS SENT ITS OWN ONE
+        sleep(0.01)
+        self.send_json(200, [{'INOUT_DATE': '2020-11-02 08:00:00', 'INOUT_TYPE': 0, 'TOKEN': self.headers['token']}])
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+
+        if self.send_server_error():
+            return
+
+        sleep(0.01)
+        self.server.clocking_tokens.append(self.headers['token'])
+        self.send_json(201, {})
+
+
+class FakeIntratimeServer(http.server.ThreadingHTTPServer):
+    request_queue_size = 512
+    daemon_threads = True
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+@pytest.fixture
+def fake_intratime_server(monkeypatch):
+    server = FakeIntratimeServer(('127.0.0.1', 0), FakeIntratimeHandler)
+    server.clocking_tokens = []
+    server.error_responses = 0
+    server.request_count = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setattr(intratime, 'INTRATIME_CLIENT',
+                        intratime.IntratimeClient(f"http://127.0.0.1:{server.server_address[1]}"))
+    monkeypatch.setattr(intratime.user, 'update_last_registration_datetime_by_email', lambda email: email)
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+@pytest.fixture
+def delete_test_queue_items(request):
+    yield
+    ordered_queue.delete_key_items(CLOCK_QUEUE_COLLECTION, clock_queue.KEY_FIELD, TEST_QUEUE_KEY)
+    ordered_queue.delete_key_items(SLACK_OUTBOX_COLLECTION, slack_outbox.KEY_FIELD, TEST_QUEUE_KEY)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+@pytest.fixture
+def fake_ordered_queue(monkeypatch):
+    # IN-MEMORY QUEUES BY COLLECTION. THE ITEM _id IS ITS POSITION IN THE LIST, AND THE ITEMS ARE NEVER REMOVED
+    queues = defaultdict(list)
+
+    def get_pending_items(collection, key_field, key, order_field='_id'):
+        return sorted([dict(item) for item in queues[collection] if item[key_field] == key and
+                       item['status'] == ordered_queue.PENDING_STATUS],
+                      key=lambda item: (item[order_field], item['_id']))
+
+    def add_item(collection, item):
+        queued_item = dict(item, _id=len(queues[collection]), status=ordered_queue.PENDING_STATUS)
+        queues[collection].append(queued_item)
+        return dict(queued_item)
+
+    def update_item(collection, item_id, values):
+        queues[collection][item_id].update(values, attempts=queues[collection][item_id]['attempts'] + 1)
+
+    def delete_key_items(collection, key_field, key):
+        for item in queues[collection]:
+            if item[key_field] == key:
+                item['status'] = 'deleted'
+
+    monkeypatch.setattr(ordered_queue, 'add_item', add_item)
+    monkeypatch.setattr(ordered_queue, 'get_pending_keys',
+                        lambda collection, key_field: list(dict.fromkeys(
+                            item[key_field] for item in queues[collection]
+                            if item['status'] == ordered_queue.PENDING_STATUS)))
+    monkeypatch.setattr(ordered_queue, 'has_pending_items',
+                        lambda collection, key_field, key: len(get_pending_items(collection, key_field, key)) > 0)
+    monkeypatch.setattr(ordered_queue, 'get_pending_items', get_pending_items)
+    monkeypatch.setattr(ordered_queue, 'update_item', update_item)
+    monkeypatch.setattr(ordered_queue, 'delete_item',
+                        lambda collection, item_id: queues[collection][item_id].update(status='deleted'))
+    monkeypatch.setattr(ordered_queue, 'count_items',
+                        lambda collection, status=ordered_queue.PENDING_STATUS:
+                        len([item for item in queues[collection] if item['status'] == status]))
+    monkeypatch.setattr(ordered_queue, 'delete_key_items', delete_key_items)
+
+    return queues
@@ -0,0 +1,136 @@
+import pytest
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from intratime_slack_bot.lib import cache
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_ttl_cache_expiration(fake_clock):
+    ttl_cache = cache.TTLCache(10, 60, fake_clock)
+    ttl_cache.set('key', 'value')
+
+    # VALID ENTRY
+    fake_clock.now = 59
+    assert ttl_cache.get('key') == 'value'
+
+    # EXPIRED ENTRY
+    fake_clock.now = 60
+    assert ttl_cache.get('key') is None
+    assert ttl_cache.get_stats() == {'size': 0, 'max_size': 10, 'hits': 1, 'misses': 1, 'hit_ratio': 0.5}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_ttl_cache_lru_eviction():
+    ttl_cache = cache.TTLCache(2, 60)
+    ttl_cache.set('a', 1)
+    ttl_cache.set('b', 2)
+
+    # 'a' IS THE MOST RECENTLY USED ENTRY, SO 'b' IS EVICTED
+    assert ttl_cache.get('a') == 1
+    ttl_cache.set('c', 3)
+
+    assert ttl_cache.get('b') is None
+    assert ttl_cache.get('a') == 1
+    assert ttl_cache.get('c') == 3
+
+    # DELETE ENTRY
+    ttl_cache.delete('a')
+    assert ttl_cache.get('a', 'default') == 'default'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_ttl_cache_generation(fake_clock):
+    ttl_cache = cache.TTLCache(10, 60, fake_clock)
+
+    # THE KEY IS DELETED (E.G THE VALUE IS UPDATED) WHILE THE VALUE IS BEING READ: THE READ VALUE IS NOT CACHED
+    generation = ttl_cache.get_generation('key')
+    ttl_cache.delete('key')
+    assert not ttl_cache.set('key', 'outdated value', generation=generation)
+    assert ttl_cache.get('key') is None
+
+    generation = ttl_cache.get_generation('key')
+    ttl_cache.clear()
+    assert not ttl_cache.set('key', 'outdated value', generation=generation)
+
+    # THE KEY HAS NOT CHANGED
+    assert ttl_cache.set('key', 'value', ttl=5, generation=ttl_cache.get_generation('key'))
+
+    # CUSTOM ENTRY TTL
+    fake_clock.now = 5
+    assert ttl_cache.get('key') is None
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_ttl_cache_generation_size():
+    ttl_cache = cache.TTLCache(10, 60)
+    generation = ttl_cache.get_generation('key')
+
+    # THE DELETED KEYS ARE NOT KEPT FOREVER
+    for index in range(1000):
+        ttl_cache.delete(index)
+
+    assert len(ttl_cache._deletions) == 10
+
+    # A READ OLDER THAN THE FORGOTTEN DELETIONS IS NOT CACHED, SINCE ITS KEY COULD HAVE BEEN DELETED
+    assert not ttl_cache.set('key', 'outdated value', generation=generation)
+    assert ttl_cache.set('key', 'value', generation=ttl_cache.get_generation('key'))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_single_flight_cache():
+    calls = []
+    release = threading.Event()
+    single_flight_cache = cache.SingleFlightCache(10, 60, should_cache=lambda result: result != 'error')
+
+    def fetch(result):
+        calls.append(result)
+        release.wait(5)
+        return result
+
+    # CONCURRENT CALLS WITH THE SAME KEY SHARE A SINGLE CALL
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(single_flight_cache.get, 'key', fetch, 'value') for _ in range(10)]
+
+        while single_flight_cache.get_stats()['shared_calls'] < 9:
+            time.sleep(0.01)
+
+        release.set()
+
+    assert [future.result() for future in futures] == ['value'] * 10
+    assert calls == ['value']
+
+    # CACHED RESULT
+    assert single_flight_cache.get('key', fetch, 'other_value') == 'value'
+    assert len(calls) == 1
+
+    # THE RESULTS THAT MUST NOT BE CACHED ARE REQUESTED AGAIN
+    single_flight_cache.get('error_key', fetch, 'error')
+    single_flight_cache.get('error_key', fetch, 'error')
+    assert len(calls) == 3
+
+    # INVALIDATED RESULT
+    single_flight_cache.invalidate('key')
+    assert single_flight_cache.get('key', fetch, 'new_value') == 'new_value'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_single_flight_cache_invalidation_in_flight():
+    single_flight_cache = cache.SingleFlightCache(10, 60)
+
+    def fetch():
+        # THE KEY IS INVALIDATED WHILE ITS RESULT IS BEING CALCULATED, SO THE RESULT IS NOT CACHED
+        single_flight_cache.invalidate('key')
+        return 'outdated_value'
+
+    assert single_flight_cache.get('key', fetch) == 'outdated_value'
+    assert single_flight_cache.get('key', lambda: 'value') == 'value'
+    assert single_flight_cache.get_stats()['in_flight'] == 0
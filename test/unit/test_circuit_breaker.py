@@ -0,0 +1,78 @@
+import pytest
+
+from intratime_slack_bot.lib import circuit_breaker
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def open_breaker(breaker, num_calls):
+    for _ in range(num_calls):
+        breaker.before_call()
+        breaker.record_failure()
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_circuit_breaker_failure_rate(fake_clock):
+    breaker = circuit_breaker.CircuitBreaker(failure_rate_threshold=0.5, minimum_calls=4, window_size=4,
+                                             timer=fake_clock)
+
+    # NOT ENOUGH CALLS TO CALCULATE THE FAILURE RATE
+    open_breaker(breaker, 3)
+    assert breaker.state == circuit_breaker.CLOSED
+
+    # THE OLDEST FAILURES LEAVE THE WINDOW
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_success()
+
+    assert breaker.get_stats()['failure_rate'] == 0.25
+
+    open_breaker(breaker, 2)
+
+    assert breaker.state == circuit_breaker.OPEN
+    assert breaker.is_open()
+
+    with pytest.raises(circuit_breaker.CircuitOpenError):
+        breaker.before_call()
+
+    assert breaker.get_stats() == {'state': 'open', 'failure_rate': 0.5, 'calls': 4, 'rejected_calls': 1,
+                                   'open_count': 1}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_circuit_breaker_half_open(fake_clock):
+    state_changes = []
+    breaker = circuit_breaker.CircuitBreaker(minimum_calls=2, open_timeout=30, timer=fake_clock,
+                                             on_state_change=lambda old, new: state_changes.append(new))
+    open_breaker(breaker, 2)
+
+    # ONLY ONE PROBE CALL IS ALLOWED AFTER THE OPEN TIMEOUT
+    fake_clock.now = 30
+    assert not breaker.is_open()
+    breaker.before_call()
+    assert breaker.state == circuit_breaker.HALF_OPEN
+
+    with pytest.raises(circuit_breaker.CircuitOpenError):
+        breaker.before_call()
+
+    # FAILED PROBE
+    breaker.record_failure()
+    assert breaker.state == circuit_breaker.OPEN
+
+    # SUCCESSFUL PROBE
+    fake_clock.now = 60
+    breaker.before_call()
+    breaker.record_success()
+
+    assert breaker.state == circuit_breaker.CLOSED
+    assert breaker.get_stats()['calls'] == 0
+    assert state_changes == ['open', 'half_open', 'open', 'half_open', 'closed']
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_get_retry_delay():
+    assert all(0 <= circuit_breaker.get_retry_delay(0, 0.2, 2) <= 0.2 for _ in range(100))
+    assert all(0 <= circuit_breaker.get_retry_delay(10, 0.2, 2) <= 2 for _ in range(100))
@@ -0,0 +1,65 @@
+import pytest
+
+from intratime_slack_bot.lib.db import clock
+from intratime_slack_bot.lib import codes
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+TEST_USER_ID = 'test_clock_user'
+
+TEST_CLOCKS = [
+    {'INOUT_DATE': '2020-11-02 08:00:00', 'INOUT_TYPE': 0},
+    {'INOUT_DATE': '2020-11-02 14:00:00', 'INOUT_TYPE': 2},
+    {'INOUT_DATE': '2020-11-02 15:00:00', 'INOUT_TYPE': 3},
+    {'INOUT_DATE': '2020-11-02 18:00:00', 'INOUT_TYPE': 1}
+]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+@pytest.fixture
+def delete_test_clocks(request):
+    clock.delete_user_clocks(TEST_USER_ID)
+    yield
+    clock.delete_user_clocks(TEST_USER_ID)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_add_clocks(delete_test_clocks):
+    # BAD CLOCK DATA
+    assert clock.add_clocks(TEST_USER_ID, [{'INOUT_TYPE': 0}]) == codes.BAD_REQUEST_DATA
+
+    # EMPTY STORE
+    assert clock.get_last_clock_datetime(TEST_USER_ID) is None
+
+    # ADD CLOCKS TWICE, THEY ARE STORED ONLY ONCE
+    assert clock.add_clocks(TEST_USER_ID, TEST_CLOCKS) == codes.SUCCESS
+    assert clock.add_clocks(TEST_USER_ID, TEST_CLOCKS[2:]) == codes.SUCCESS
+    assert len(clock.get_clocks(TEST_USER_ID, '2020-11-01 00:00:00', '2020-11-03 00:00:00')) == len(TEST_CLOCKS)
+    assert clock.get_last_clock_datetime(TEST_USER_ID) == '2020-11-02 18:00:00'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_get_clocks(delete_test_clocks):
+    clock.add_clocks(TEST_USER_ID, TEST_CLOCKS)
+
+    # TIME RANGE, MOST RECENT FIRST
+    assert clock.get_clocks(TEST_USER_ID, '2020-11-02 14:00:00', '2020-11-02 15:00:00') == TEST_CLOCKS[2:0:-1]
+
+    # ACTION FILTER
+    assert clock.get_clocks(TEST_USER_ID, '2020-11-01 00:00:00', '2020-11-03 00:00:00', 1) == [TEST_CLOCKS[3]]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_get_last_clock(delete_test_clocks):
+    assert clock.get_last_clock(TEST_USER_ID) is None
+
+    clock.add_clocks(TEST_USER_ID, TEST_CLOCKS)
+
+    assert clock.get_last_clock(TEST_USER_ID) == TEST_CLOCKS[3]
+    assert clock.get_last_clock(TEST_USER_ID, '2020-11-01 00:00:00', '2020-11-02 14:30:00') == TEST_CLOCKS[1]
+    assert clock.get_last_clock(TEST_USER_ID, '2020-11-03 00:00:00') is None
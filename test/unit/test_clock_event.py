@@ -0,0 +1,21 @@
+import pytest
+
+from intratime_slack_bot.lib.clock_event import ClockEvent, ClockAction, to_timestamp, from_timestamp
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_clock_event():
+    clock_event = ClockEvent.from_intratime({'INOUT_DATE': '2020-11-02 08:00:05', 'INOUT_TYPE': 2})
+
+    assert clock_event.action == ClockAction.PAUSE
+    assert clock_event.action_name == 'pause'
+    assert clock_event.datetime == '2020-11-02 08:00:05'
+    assert clock_event.date == '2020-11-02'
+    assert clock_event.day == 2
+    assert clock_event.to_dict() == {'action': 'pause', 'datetime': '2020-11-02 08:00:05'}
+    assert ClockEvent.from_dict(clock_event.to_dict()) == clock_event
+
+    # DATETIMES ARE TAKEN AS IS, SO THE TIMESTAMP DIFFERENCES MATCH THE DATETIME DIFFERENCES
+    assert to_timestamp('2020-10-25 03:00:00') - to_timestamp('2020-10-25 01:00:00') == 7200
+    assert from_timestamp(to_timestamp('2020-02-29 23:59:59')) == '2020-02-29 23:59:59'
@@ -0,0 +1,156 @@
+import pytest
+import threading
+
+from intratime_slack_bot.lib import clock_pipeline, intratime, crypt, codes
+from intratime_slack_bot.lib.db import clock_queue
+from intratime_slack_bot.lib.db.database import CLOCK_QUEUE_COLLECTION
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+TEST_USER_DATA = {'user_id': 'test', 'intratime_mail': 'test@mail.com', 'password': crypt.encrypt('password')}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+@pytest.fixture
+def intratime_calls(monkeypatch, fake_ordered_queue):
+    calls = {'clocking': 0, 'can_clock': (True, None), 'clocks': [], 'token': 'token', 'status': codes.SUCCESS,
+             'queue': fake_ordered_queue[CLOCK_QUEUE_COLLECTION], 'clocked_datetimes': []}
+
+    def clocking(action, token, email, date_time=None):
+        calls['clocking'] += 1
+        calls['clocked_datetimes'].append(date_time)
+        return calls['status']
+
+    monkeypatch.setattr(clock_pipeline.user, 'get_user_data', lambda user_id: dict(TEST_USER_DATA))
+    monkeypatch.setattr(intratime, 'get_user_token', lambda user_id, email, password: calls['token'])
+    monkeypatch.setattr(intratime, 'user_can_clock_this_action', lambda token, action, user_id: calls['can_clock'])
+    monkeypatch.setattr(intratime, 'clocking', clocking)
+    monkeypatch.setattr(intratime, 'get_user_clocks', lambda token, **kwargs: calls['clocks'])
+    monkeypatch.setattr(intratime, 'is_intratime_unavailable', lambda: False)
+
+    return calls
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_clock(intratime_calls):
+    verify_errors = []
+    verify_finished = threading.Event()
+
+    def on_verify_failure(status):
+        verify_errors.append(status)
+        verify_finished.set()
+
+    # INVALID ACTION: THE ACTION IS NOT CLOCKED
+    intratime_calls['can_clock'] = (False, 'reason')
+    assert clock_pipeline.clock('test', 'in', on_verify_failure) == (False, 'reason')
+    assert intratime_calls['clocking'] == 0
+
+    # VALID ACTION: THE CLOCK INFO IS RETURNED BEFORE THE VERIFICATION
+    intratime_calls['can_clock'] = (True, None)
+    clock_result = clock_pipeline.clock('test', 'in', on_verify_failure)
+    assert clock_result['intratime_mail'] == TEST_USER_DATA['intratime_mail']
+    assert clock_result['action'] == 'in'
+    assert intratime_calls['clocking'] == 1
+
+    # THE CLOCK HAS NOT BEEN FOUND IN THE USER HISTORY
+    assert verify_finished.wait(5)
+    assert verify_errors == [codes.NO_VALID_RESPONSE]
+
+    stats = clock_pipeline.get_stats()
+    assert stats['stages'][clock_pipeline.CLOCK_STAGE]['count'] >= 1
+    assert stats['verification']['failed'] >= 1
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_clock_queue(intratime_calls):
+    deliveries = []
+
+    # INTRATIME IS NOT AVAILABLE: THE CLOCKINGS ARE QUEUED
+    intratime_calls['token'] = codes.INTRATIME_UNAVAILABLE
+    clock_result = clock_pipeline.clock('test', 'in', None)
+    assert clock_result['queued']
+
+    # THE NEXT CLOCKINGS ARE QUEUED WHILE THERE ARE PENDING ONES, SO THEY ARE SENT IN ORDER
+    intratime_calls['token'] = 'token'
+    assert clock_pipeline.clock('test', 'pause', None)['queued']
+    assert intratime_calls['clocking'] == 0
+
+    # INTRATIME IS STILL NOT REACHABLE: THE CLOCKINGS ARE KEPT IN THE QUEUE
+    intratime_calls['status'] = codes.INTRATIME_API_CONNECTION_ERROR
+    assert clock_pipeline.drain_clock_queue(lambda item, result: deliveries.append(result)) == 0
+    assert len(clock_queue.get_user_pending_clockings('test')) == 2
+
+    # INTRATIME RECOVERS: THE CLOCKINGS ARE SENT IN ORDER WITH THEIR ORIGINAL DATETIME
+    intratime_calls['status'] = codes.SUCCESS
+    assert clock_pipeline.drain_clock_queue(lambda item, result: deliveries.append((item['action'], result))) == 2
+    assert deliveries == [('in', codes.SUCCESS), ('pause', codes.SUCCESS)]
+    assert intratime_calls['clocked_datetimes'][-2:] == [item['datetime'] for item in intratime_calls['queue']]
+    assert clock_queue.get_user_pending_clockings('test') == []
+    assert clock_pipeline.get_stats()['queue']['delivered'] >= 2
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_clock_timeout_after_receipt(intratime_calls, monkeypatch):
+    deliveries = []
+    intratime_clocks = []
+
+    def clocking(action, token, email, date_time=None):
+        # INTRATIME REGISTERS THE CLOCKING, BUT THE CONNECTION FAILS BEFORE GETTING ITS RESPONSE
+        intratime_clocks.append(date_time)
+        return codes.INTRATIME_API_CONNECTION_ERROR
+
+    monkeypatch.setattr(intratime, 'clocking', clocking)
+    monkeypatch.setattr(clock_pipeline.clock_store, 'get_clocks',
+                        lambda user_id, datetime_from, datetime_to, action: [
+                            {'INOUT_DATE': date_time, 'INOUT_TYPE': action} for date_time in intratime_clocks
+                            if datetime_from <= date_time <= datetime_to])
+
+    assert clock_pipeline.clock('test', 'in', None)['queued']
+
+    # THE ACTION IS NOT VALID ANYMORE, BUT THE CLOCKING IS FOUND WITH ITS QUEUED DATETIME
+    intratime_calls['can_clock'] = (False, 'reason')
+    assert clock_pipeline.drain_clock_queue(lambda item, result: deliveries.append(result)) == 1
+    assert deliveries == [codes.SUCCESS]
+    assert intratime_clocks == [intratime_calls['queue'][0]['datetime']]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_deliver_queued_clocking_already_registered(intratime_calls, monkeypatch):
+    queued_clocking = {'action': 'in', 'datetime': '2020-11-02 08:00:00'}
+    credentials = ('test', 'test@mail.com', 'password')
+    intratime_calls['can_clock'] = (False, 'reason')
+
+    # THE ACTION IS NOT VALID
+    monkeypatch.setattr(clock_pipeline.clock_store, 'get_clocks', lambda *args: [])
+    assert clock_pipeline.deliver_queued_clocking(credentials, queued_clocking) == (False, 'reason')
+
+    # THE CLOCKING WAS RECEIVED BY INTRATIME BEFORE THE CONNECTION ERROR
+    monkeypatch.setattr(clock_pipeline.clock_store, 'get_clocks',
+                        lambda *args: [{'INOUT_DATE': '2020-11-02 08:00:00', 'INOUT_TYPE': 0}])
+    assert clock_pipeline.deliver_queued_clocking(credentials, queued_clocking) == codes.SUCCESS
+    assert intratime_calls['clocking'] == 0
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_drain_clock_queue_unexpected_error(intratime_calls):
+    deliveries = []
+
+    def on_delivery(item, result):
+        if item['user_id'] == 'bad_user':
+            raise KeyError('user_id')
+
+        deliveries.append(item['user_id'])
+
+    clock_queue.add_clocking('bad_user', 'in', '2020-11-02 08:00:00')
+    clock_queue.add_clocking('test', 'in', '2020-11-02 08:00:00')
+
+    # THE ERROR OF A USER DOES NOT STOP THE DELIVERY OF THE OTHER ONES
+    assert clock_pipeline.drain_clock_queue(on_delivery) == 1
+    assert deliveries == ['test']
@@ -0,0 +1,22 @@
+from intratime_slack_bot.lib.db import clock_queue
+from conftest import TEST_QUEUE_KEY
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_clock_queue(delete_test_queue_items):
+    clock_queue.add_clocking(TEST_QUEUE_KEY, 'pause', '2020-11-02 12:00:00')
+    clock_queue.add_clocking(TEST_QUEUE_KEY, 'in', '2020-11-02 08:00:00')
+
+    assert clock_queue.has_pending_clockings(TEST_QUEUE_KEY)
+    assert TEST_QUEUE_KEY in clock_queue.get_pending_user_ids()
+
+    # THE CLOCKINGS ARE RETURNED IN THE ORDER THAT THEY WERE CLOCKED
+    pending_clockings = clock_queue.get_user_pending_clockings(TEST_QUEUE_KEY)
+    assert [item['action'] for item in pending_clockings] == ['in', 'pause']
+
+    clock_queue.set_clocking_status(pending_clockings[0]['_id'], clock_queue.DELIVERED_STATUS)
+    clock_queue.set_clocking_status(pending_clockings[1]['_id'], clock_queue.FAILED_STATUS, 'reason')
+
+    assert not clock_queue.has_pending_clockings(TEST_QUEUE_KEY)
+    assert clock_queue.get_user_pending_clockings(TEST_QUEUE_KEY) == []
@@ -0,0 +1,61 @@
+import pytest
+import threading
+
+from intratime_slack_bot.lib import concurrency_limiter
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_adaptive_limiter_aimd(fake_clock):
+    limiter = concurrency_limiter.AdaptiveLimiter(initial_limit=4, min_limit=1, max_limit=5, latency_threshold=2,
+                                                  timer=fake_clock)
+
+    # ADDITIVE INCREASE: ABOUT ONE SLOT PER LIMIT SUCCESSFUL CALLS
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(0.1)
+
+    assert limiter.get_stats()['limit'] == 5
+
+    # MULTIPLICATIVE DECREASE, ONCE PER LATENCY THRESHOLD
+    limiter.acquire()
+    limiter.release(3)
+    limiter.acquire()
+    limiter.release(0, failed=True)
+    assert limiter.get_stats()['limit'] == 2
+
+    fake_clock.now = 2
+    limiter.acquire()
+    limiter.release(0, failed=True)
+    assert limiter.get_stats()['limit'] == 1
+
+    # THE CALLS THAT HAVE NOT BEEN DONE DO NOT ADAPT THE LIMIT
+    limiter.acquire()
+    limiter.release(None)
+    assert limiter.get_stats()['limit'] == 1
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_adaptive_limiter_queue():
+    limiter = concurrency_limiter.AdaptiveLimiter(initial_limit=1)
+    limiter.acquire()
+
+    # THE LIMIT HAS BEEN REACHED
+    with pytest.raises(concurrency_limiter.LimitExceededError):
+        limiter.acquire(timeout=0.01)
+
+    # THE WAITING CALL GETS THE SLOT WHEN IT IS RELEASED
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(timeout=5), acquired.set()))
+    thread.start()
+
+    while limiter.get_stats()['waiting'] == 0:
+        acquired.wait(0.01)
+
+    limiter.release(0.1)
+    thread.join()
+
+    assert acquired.is_set()
+    assert limiter.get_stats()['in_flight'] == 1
+    assert limiter.get_stats()['rejected_calls'] == 1
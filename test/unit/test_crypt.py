@@ -21,3 +21,31 @@ def test_generate_cipher_key():
 def test_encrypt_decrypt():
     ciphered_text = crypt.encrypt(TEST_TEXT, TEST_PASSWORD)
     assert crypt.decrypt(ciphered_text, TEST_PASSWORD) == TEST_TEXT
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_get_cipher():
+    # THE KEY IS DERIVED ONLY ONCE
+    assert crypt.get_cipher(TEST_PASSWORD) is crypt.get_cipher(TEST_PASSWORD)
+    assert crypt.get_key_id(TEST_PASSWORD) in crypt.CIPHERS
+
+    # DIFFERENT PASSWORDS HAVE DIFFERENT CIPHERS
+    assert crypt.get_cipher(TEST_PASSWORD) is not crypt.get_cipher(TEST_PASSWORD[::-1])
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_key_ring():
+    old_ciphered_text = crypt.encrypt(TEST_TEXT, TEST_PASSWORD[::-1])
+
+    # OLD TEXTS CAN BE DECRYPTED WITH THE RETIRED KEY
+    assert crypt.decrypt(old_ciphered_text, TEST_PASSWORD, [TEST_PASSWORD[::-1]]) == TEST_TEXT
+    assert not crypt.is_encrypted_with_current_key(old_ciphered_text, TEST_PASSWORD)
+
+    # ROTATED TEXTS ARE ENCRYPTED WITH THE CURRENT KEY
+    rotated_text = crypt.rotate(old_ciphered_text, TEST_PASSWORD, [TEST_PASSWORD[::-1]])
+    assert crypt.is_encrypted_with_current_key(rotated_text, TEST_PASSWORD)
+    assert crypt.decrypt(rotated_text, TEST_PASSWORD, []) == TEST_TEXT
+    assert crypt.get_key_ring_ids(TEST_PASSWORD, [TEST_PASSWORD[::-1]]) == [crypt.get_key_id(TEST_PASSWORD),
+                                                                           crypt.get_key_id(TEST_PASSWORD[::-1])]
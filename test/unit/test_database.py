@@ -0,0 +1,28 @@
+import pytest
+import subprocess
+import sys
+
+from intratime_slack_bot.lib.db import database
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_lazy_client():
+    # IMPORTING THE LIBRARIES DOES NOT CREATE A CLIENT
+    import_check = 'from intratime_slack_bot.lib import slack, intratime; ' \
+                   'from intratime_slack_bot.lib.db import database; assert database.MONGO_CLIENT is None'
+    assert subprocess.run([sys.executable, '-c', import_check]).returncode == 0
+
+    # THE CLIENT IS CREATED ON FIRST USE AND SHARED BY ALL COLLECTIONS
+    database.close_client()
+    assert database.USER_COLLECTION.name == 'user'
+    assert database.USER_COLLECTION.database.client is database.get_client()
+    assert database.CLOCK_COLLECTION.database.client is database.get_client()
+
+    # A NEW CLIENT IS CREATED AFTER FORK
+    parent_client = database.get_client()
+    database.reset_after_fork()
+    assert database.get_client() is not parent_client
+
+    database.close_client()
+    parent_client.close()
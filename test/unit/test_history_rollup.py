@@ -0,0 +1,100 @@
+import pytest
+
+from bson import ObjectId
+
+from intratime_slack_bot.lib.db import history_rollup
+from intratime_slack_bot.lib.db.database import HISTORY_COLLECTION, HISTORY_ROLLUP_COLLECTION, JOB_COLLECTION
+from intratime_slack_bot.lib import time_utils
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+TEST_USER_ID = 'history_rollup_test_user'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+@pytest.fixture
+def history_registers(request):
+    # THE COMPACTION STARTS FROM SCRATCH, WHATEVER THE PREVIOUS RUNS HAVE DONE
+    JOB_COLLECTION.delete_one({'_id': history_rollup.COMPACTION_JOB_ID})
+
+    current_date_time = time_utils.get_past_datetime_from_current_datetime(1)
+    old_date_time = time_utils.subtract_days_to_datetime(current_date_time, 100)
+    registers = [{'user_id': TEST_USER_ID, 'user_name': 'test', 'command': command, 'parameters': '',
+                  'date_time': date_time} for command, date_time in [('/clock', old_date_time),
+                                                                     ('/clock', current_date_time),
+                                                                     ('/time', current_date_time)]]
+    HISTORY_COLLECTION.insert_many(registers)
+
+    yield old_date_time[:10]
+
+    HISTORY_COLLECTION.delete_many({'user_id': TEST_USER_ID})
+    HISTORY_ROLLUP_COLLECTION.delete_many({'user_id': TEST_USER_ID})
+    JOB_COLLECTION.delete_one({'_id': history_rollup.COMPACTION_JOB_ID})
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_compact_history(history_registers):
+    date_to = time_utils.get_next_day(time_utils.get_current_date())
+
+    summary = history_rollup.compact_history(retention_days=90, lag=0)
+    assert summary['deleted'] >= 1
+    assert history_rollup.get_user_command_counts(TEST_USER_ID, history_registers, date_to) == {'/clock': 2,
+                                                                                                 '/time': 1}
+
+    # THE RAW REGISTERS OUT OF THE RETENTION PERIOD HAVE BEEN DELETED
+    assert HISTORY_COLLECTION.count_documents({'user_id': TEST_USER_ID}) == 2
+
+    # COMPACTING AGAIN DOES NOT CHANGE THE COUNTERS
+    history_rollup.compact_history(retention_days=90, lag=0)
+    assert history_rollup.get_user_command_counts(TEST_USER_ID, history_registers, date_to) == {'/clock': 2,
+                                                                                                 '/time': 1}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_compact_history_registers_older_than_watermark(history_registers):
+    date_to = time_utils.get_next_day(time_utils.get_current_date())
+
+    # A PREVIOUS RUN HAS COMPACTED UNTIL TODAY, BUT THE OLD REGISTER HAS BEEN WRITTEN LATER (E.G IMPORTED)
+    JOB_COLLECTION.update_one({'_id': history_rollup.COMPACTION_JOB_ID},
+                              {'$set': {'watermark': time_utils.get_current_date(), 'last_id': ObjectId('0' * 24)}},
+                              upsert=True)
+
+    # THE OLD REGISTER IS COUNTED BEFORE IT IS DELETED
+    history_rollup.compact_history(retention_days=90, lag=0)
+    assert history_rollup.get_user_command_counts(TEST_USER_ID, history_registers, date_to) == {'/clock': 2,
+                                                                                                 '/time': 1}
+    assert HISTORY_COLLECTION.count_documents({'user_id': TEST_USER_ID}) == 2
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_compact_history_partly_deleted_day(history_registers):
+    date_to = time_utils.get_next_day(time_utils.get_current_date())
+
+    # THE OLD DAY WAS COMPACTED WITH 5 REGISTERS, AND ONLY ONE OF THEM HAS NOT BEEN DELETED YET
+    HISTORY_ROLLUP_COLLECTION.insert_one({'user_id': TEST_USER_ID, 'date': history_registers, 'command': '/clock',
+                                          'count': 5})
+    last_register = HISTORY_COLLECTION.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+    JOB_COLLECTION.update_one({'_id': history_rollup.COMPACTION_JOB_ID},
+                              {'$set': {'watermark': time_utils.get_current_date(), 'last_id': last_register['_id']}},
+                              upsert=True)
+
+    # A REGISTER OF THE OLD DAY IS WRITTEN LATE
+    HISTORY_COLLECTION.insert_one({'user_id': TEST_USER_ID, 'user_name': 'test', 'command': '/clock', 'parameters': '',
+                                   'date_time': f"{history_registers} 10:00:00"})
+
+    # THE OLD DAY COUNTER IS INCREMENTED INSTEAD OF BEING CALCULATED AGAIN FROM THE REMAINING REGISTERS
+    history_rollup.compact_history(retention_days=90, lag=0)
+    history_rollup.compact_history(retention_days=90, lag=0)
+    old_day_counts = history_rollup.get_user_command_counts(TEST_USER_ID, history_registers,
+                                                            time_utils.get_next_day(history_registers))
+    assert old_day_counts == {'/clock': 6}
+    assert history_rollup.get_user_command_counts(TEST_USER_ID, history_registers, date_to) == {'/clock': 7,
+                                                                                                 '/time': 1}
+
+    # THE OLD DAY HAS BEEN DELETED AS A WHOLE
+    assert HISTORY_COLLECTION.count_documents({'user_id': TEST_USER_ID}) == 2
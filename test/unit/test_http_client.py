@@ -0,0 +1,23 @@
+import pytest
+
+from intratime_slack_bot.lib import http_client
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_get_host():
+    assert http_client.get_host('https://slack.com/api/chat.postMessage?x=1') == 'https://slack.com'
+    assert http_client.get_host('http://newapi.intratime.es/api/user/login') == 'http://newapi.intratime.es'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_get_session():
+    # ONE SESSION PER HOST
+    session = http_client.get_session('https://slack.com/api/chat.postMessage')
+    assert http_client.get_session('https://slack.com/api/chat.postEphemeral') is session
+    assert http_client.get_session('http://newapi.intratime.es/api/user/login') is not session
+
+    # CLOSE ALL SESSIONS
+    http_client.close()
+    assert len(http_client.SESSIONS) == 0
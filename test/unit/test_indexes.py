@@ -0,0 +1,57 @@
+import pytest
+
+from pymongo import IndexModel
+from pymongo.errors import ServerSelectionTimeoutError
+
+from intratime_slack_bot.lib.db import indexes
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+TEST_QUERY_PLAN = {
+    'stage': 'FETCH',
+    'inputStage': {
+        'stage': 'OR',
+        'inputStages': [{'stage': 'IXSCAN'}, {'stage': 'COLLSCAN'}]
+    }
+}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_get_plan_stages():
+    assert indexes.get_plan_stages(TEST_QUERY_PLAN) == ['FETCH', 'OR', 'IXSCAN', 'COLLSCAN']
+    assert indexes.get_plan_stages({'stage': 'COLLSCAN'}) == ['COLLSCAN']
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_create_indexes():
+    # CREATE INDEXES TWICE (IDEMPOTENT)
+    assert all(indexes.create_indexes().values())
+    assert all(indexes.create_indexes().values())
+
+    # HOT QUERIES USE THE INDEXES
+    assert all(indexes.check_query_plans().values())
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_create_indexes_unreachable_database(monkeypatch):
+    class UnreachableCollection:
+        def __init__(self, name):
+            self.name = name
+            self.calls = 0
+
+        def create_indexes(self, indexes):
+            self.calls += 1
+            raise ServerSelectionTimeoutError('No servers found')
+
+    collections = [UnreachableCollection('users'), UnreachableCollection('history')]
+    monkeypatch.setattr(indexes, 'INDEXES', [(collection, IndexModel([('field', 1)], name='field'))
+                                             for collection in collections])
+    monkeypatch.setattr(indexes, 'get_index_build_progress', lambda: [])
+
+    # THE ERROR IS NOT RAISED AND THE REMAINING INDEXES ARE NOT TRIED
+    assert indexes.create_indexes() == {'users.field': False, 'history.field': False}
+    assert [collection.calls for collection in collections] == [1, 0]
@@ -1,10 +1,13 @@
 import pytest
 import os
+import threading
 import freezegun
 
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 from intratime_slack_bot.config.settings import INTRATIME_TEST_USER_EMAIL, INTRATIME_TEST_USER_PASSWORD
 from intratime_slack_bot.lib import intratime, messages, codes, time_utils, test_utils
+from intratime_slack_bot.lib.clock_event import ClockEvent
 from intratime_slack_bot.lib.test_utils import read_json_file_data, check_if_log_exist, UNIT_TEST_DATA_PATH
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -52,6 +55,26 @@ def test_get_auth_token(mock_intratime_logger):
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+def test_get_user_token():
+    intratime.TOKEN_CACHE.clear()
+
+    # FIRST CALL GETS THE TOKEN FROM INTRATIME AND NEXT ONES FROM CACHE
+    token = intratime.get_user_token('test', INTRATIME_TEST_USER_EMAIL, INTRATIME_TEST_USER_PASSWORD)
+    assert isinstance(token, str)
+    assert intratime.get_user_token('test', INTRATIME_TEST_USER_EMAIL, INTRATIME_TEST_USER_PASSWORD) == token
+    assert intratime.get_token_cache_stats()['hits'] == 1
+
+    # BAD CREDENTIALS ARE NOT CACHED
+    assert intratime.get_user_token('test', 'bar', 'foo') == codes.INTRATIME_AUTH_ERROR
+    assert intratime.get_token_cache_stats()['size'] == 1
+
+    # INVALIDATE TOKEN
+    intratime.invalidate_user_token('test', INTRATIME_TEST_USER_EMAIL)
+    assert intratime.get_token_cache_stats()['size'] == 0
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 @pytest.mark.parametrize('action, output', TEST_GET_ACTION_NAME_DATA)
 def test_get_action_name(action, output, mock_intratime_logger):
     action_name = intratime.get_action_name(action)
@@ -180,22 +203,176 @@ def test_user_can_clock_out_action(token, pre_clock_in, pre_clock_out):
 
 @pytest.mark.parametrize('datetime_from, datetime_to, expected_result', TEST_GET_PARSED_CLOCK_DATA)
 def test_get_parsed_clock_data(token, datetime_from, datetime_to, expected_result):
-    assert intratime.get_parsed_clock_data(token, datetime_from, datetime_to) == expected_result
+    assert intratime.get_parsed_clock_data(token, datetime_from, datetime_to) == \
+        [ClockEvent.from_dict(item) for item in expected_result]
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
 @pytest.mark.parametrize('data, expected_result', TEST_GET_WORKED_TIME_DATA)
 def test_get_worked_time(token, data, expected_result):
-    assert intratime.get_worked_time(data) == expected_result
+    assert intratime.get_worked_time([ClockEvent.from_dict(item) for item in data]) == expected_result
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
 @pytest.mark.parametrize('time_range, fake_datetime, data', TEST_GET_CLOCK_DATA_IN_TIME_RANGE_DATA)
 def test_get_clock_data_in_time_range(time_range, fake_datetime, data, token, mock_intratime_logger):
+    if isinstance(data, list):
+        data = [ClockEvent.from_dict(item) for item in data]
+
     with freezegun.freeze_time(fake_datetime):
         assert intratime.get_clock_data_in_time_range(token, time_range) == data
 
     if time_range == 'bad_time_range':
         assert check_if_log_exist(messages.get(3021, f"Time range = {time_range}"))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_concurrent_requests_token(fake_intratime_server):
+    num_users = 100
+    history_tokens = {}
+    clocking_results = []
+    start_barrier = threading.Barrier(num_users * 2)
+
+    def get_history(token):
+        start_barrier.wait()
+        history_tokens[token] = intratime.get_user_clocks(token, '2020-11-01 00:00:00', '2020-11-03 00:00:00')
+
+    def clock(token):
+        start_barrier.wait()
+        clocking_results.append(intratime.clocking(intratime.IN_ACTION, token, f"{token}@mail.com"))
+
+    threads = [threading.Thread(target=function, args=(f"token_{index}",)) for index in range(num_users)
+               for function in [get_history, clock]]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    # EACH REQUEST HAS BEEN SENT WITH THE TOKEN OF ITS USER
+    assert clocking_results == [codes.SUCCESS] * num_users
+    assert sorted(fake_intratime_server.clocking_tokens) == sorted(f"token_{index}" for index in range(num_users))
+    assert all(clocks[0]['TOKEN'] == token for token, clocks in history_tokens.items())
+    assert len(history_tokens) == num_users
+
+    # THE SHARED HEADERS HAVE NOT BEEN MODIFIED
+    assert 'token' not in intratime.INTRATIME_API_HEADER
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_find_last_clock():
+    data = [{'INOUT_DATE': '2020-11-03 08:00:00', 'INOUT_TYPE': 0},
+            {'INOUT_DATE': '2020-11-02 14:00:00', 'INOUT_TYPE': 1},
+            {'INOUT_DATE': '2020-11-02 08:00:00', 'INOUT_TYPE': 0}]
+
+    assert intratime.find_last_clock(data, '2020-11-01 00:00:00', '2020-11-04 00:00:00') == data[0]
+    assert intratime.find_last_clock(data, '2020-11-01 00:00:00', '2020-11-02 23:59:59') == data[1]
+    assert intratime.find_last_clock(data, '2020-11-02 15:00:00', '2020-11-02 23:59:59') == codes.NO_CLOCKS
+    assert intratime.find_last_clock([], '2020-11-01 00:00:00', '2020-11-04 00:00:00') == codes.NO_CLOCKS
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_user_can_clock_this_action_without_clocks(monkeypatch):
+    monkeypatch.setattr(intratime, 'get_last_clock_type', lambda token, user_id=None: codes.NO_CLOCKS)
+
+    assert intratime.user_can_clock_this_action('token', intratime.IN_ACTION) == (True, None)
+    assert intratime.user_can_clock_this_action('token', intratime.OUT_ACTION)[0] is False
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_intratime_retries_and_breaker(fake_intratime_server, monkeypatch):
+    monkeypatch.setattr(intratime.settings, 'INTRATIME_RETRY_BASE_DELAY', 0)
+
+    # THE GET REQUESTS ARE RETRIED
+    fake_intratime_server.error_responses = 2
+    assert isinstance(intratime.request_user_clocks('token'), list)
+    assert fake_intratime_server.request_count == 3
+
+    # THE POST REQUESTS ARE NOT RETRIED
+    fake_intratime_server.error_responses = 1
+    assert intratime.clocking(intratime.IN_ACTION, 'token', 'email') == codes.NO_VALID_RESPONSE
+    assert fake_intratime_server.request_count == 4
+
+    # THE BREAKER OPENS AND THE REQUESTS ARE REJECTED WITHOUT REQUESTING INTRATIME
+    fake_intratime_server.error_responses = 100
+    intratime.request_user_clocks('token')
+    intratime.request_user_clocks('token')
+
+    assert intratime.is_intratime_unavailable()
+    assert intratime.get_breaker_stats()['state'] == 'open'
+
+    request_count = fake_intratime_server.request_count
+    assert intratime.get_auth_token('email', 'password') == codes.INTRATIME_UNAVAILABLE
+    assert intratime.request_user_clocks('token') == codes.INTRATIME_UNAVAILABLE
+    assert fake_intratime_server.request_count == request_count
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_intratime_client_unexpected_error(monkeypatch, fake_clock):
+    breaker = intratime.circuit_breaker.CircuitBreaker(minimum_calls=1, open_timeout=10, timer=fake_clock)
+    client = intratime.IntratimeClient('http://127.0.0.1:1', breaker=breaker, get_retries=0)
+
+    def request(method, url, **kwargs):
+        raise ValueError(url)
+
+    # THE HALF-OPEN PROBE CALL FAILS WITH AN ERROR THAT IS NOT A CONNECTION ONE
+    breaker.record_failure()
+    fake_clock.now = 10
+    monkeypatch.setattr(intratime.http_client, 'request', request)
+
+    with pytest.raises(ValueError):
+        client.send('GET', '/api/user/clockings')
+
+    # THE PROBE CALL IS FREED, SO THE BREAKER LETS A NEW ONE THROUGH AFTER THE OPEN TIMEOUT
+    assert breaker.get_stats()['state'] == 'open'
+    fake_clock.now = 20
+    monkeypatch.setattr(intratime.http_client, 'request',
+                        lambda method, url, **kwargs: SimpleNamespace(status_code=200))
+    assert client.send('GET', '/api/user/clockings').status_code == 200
+    assert breaker.get_stats()['state'] == 'closed'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_invalidate_user_token_clock_data(monkeypatch):
+    monkeypatch.setattr(intratime, 'CLOCK_DATA_CACHE', intratime.cache.SingleFlightCache(10, 60))
+    monkeypatch.setattr(intratime, 'TOKEN_CACHE', intratime.cache.TTLCache(10, 60))
+    intratime.TOKEN_CACHE.set(('test', 'test@mail.com'), 'old_token')
+    intratime.CLOCK_DATA_CACHE.get(('old_token', 'month'), lambda: 'old clock data')
+
+    # THE CLOCK DATA CACHED WITH THE USER TOKEN IS DISCARDED WITH IT
+    intratime.invalidate_user_token('test', 'test@mail.com')
+    assert intratime.TOKEN_CACHE.get(('test', 'test@mail.com')) is None
+    assert intratime.CLOCK_DATA_CACHE.get(('old_token', 'month'), lambda: 'new clock data') == 'new clock data'
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_get_cached_clock_data_in_time_range(fake_intratime_server, monkeypatch):
+    monkeypatch.setattr(intratime, 'CLOCK_DATA_CACHE', intratime.cache.SingleFlightCache(10, 60))
+
+    # THE IDENTICAL CONCURRENT REQUESTS SHARE A SINGLE INTRATIME REQUEST
+    threads = [threading.Thread(target=intratime.get_cached_clock_data_in_time_range, args=('token', 'month'))
+               for _ in range(10)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert fake_intratime_server.request_count == 1
+
+    # A SUCCESSFUL CLOCKING INVALIDATES THE CACHED DATA
+    assert intratime.clocking(intratime.IN_ACTION, 'token', 'email') == codes.SUCCESS
+    intratime.get_cached_clock_data_in_time_range('token', 'month')
+
+    assert fake_intratime_server.request_count == 3
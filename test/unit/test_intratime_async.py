@@ -0,0 +1,44 @@
+import asyncio
+
+from intratime_slack_bot.lib import intratime_async, codes
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_concurrent_async_requests(fake_intratime_server):
+    num_users = 200
+    tokens = [f"token_{index}" for index in range(num_users)]
+
+    async def run_requests():
+        async with intratime_async.create_session(max_connections=50) as session:
+            clocking_results = await asyncio.gather(*[intratime_async.clocking(session, 'in', token, 'test@mail.com')
+                                                      for token in tokens])
+            user_clocks = await asyncio.gather(*[intratime_async.get_user_clocks(session, token, '2020-11-01 00:00:00',
+                                                                                  '2020-11-03 00:00:00')
+                                                 for token in tokens])
+            clock_data = await intratime_async.get_clock_data_in_time_range(session, tokens[0], 'today')
+            bad_time_range = await intratime_async.get_clock_data_in_time_range(session, tokens[0], 'bad_time_range')
+
+        return clocking_results, user_clocks, clock_data, bad_time_range
+
+    clocking_results, user_clocks, clock_data, bad_time_range = asyncio.run(run_requests())
+
+    # SAME RESULTS AS THE SYNC FUNCTIONS, AND EACH REQUEST HAS BEEN SENT WITH THE TOKEN OF ITS USER
+    assert clocking_results == [codes.SUCCESS] * num_users
+    assert sorted(fake_intratime_server.clocking_tokens) == sorted(tokens)
+    assert [clocks[0]['TOKEN'] for clocks in user_clocks] == tokens
+    assert clock_data == []
+    assert bad_time_range == codes.INVALID_HISTORY_ACTION
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_async_connection_error(monkeypatch):
+    monkeypatch.setattr(intratime_async.intratime, 'INTRATIME_CLIENT',
+                        intratime_async.intratime.IntratimeClient('http://127.0.0.1:1'))
+
+    async def get_auth_token():
+        async with intratime_async.create_session() as session:
+            return await intratime_async.get_auth_token(session, 'test@mail.com', 'password')
+
+    assert asyncio.run(get_auth_token()) == codes.INTRATIME_API_CONNECTION_ERROR
@@ -0,0 +1,35 @@
+import json
+
+from types import SimpleNamespace
+
+from intratime_slack_bot.lib import json_encoder
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+TEST_DATA = {'channel': 'C1', 'text': 'ñ', 'blocks': [{'type': 'section'}]}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_dumps_standard_encoder(monkeypatch):
+    monkeypatch.setattr(json_encoder, 'orjson', None)
+
+    # COMPACT UTF-8 JSON WITHOUT ESCAPED CHARACTERS
+    assert json_encoder.dumps(TEST_DATA) == '{"channel":"C1","text":"ñ","blocks":[{"type":"section"}]}'.encode('utf-8')
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_dumps_orjson(monkeypatch):
+    encoded_data = []
+
+    def dumps(data):
+        encoded_data.append(data)
+        return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    monkeypatch.setattr(json_encoder, 'orjson', SimpleNamespace(dumps=dumps))
+
+    # ORJSON IS USED IF IT IS INSTALLED
+    assert json_encoder.dumps(TEST_DATA) == '{"channel":"C1","text":"ñ","blocks":[{"type":"section"}]}'.encode('utf-8')
+    assert encoded_data == [TEST_DATA]
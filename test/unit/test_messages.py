@@ -2,7 +2,8 @@ import pytest
 import os
 import freezegun
 
-from intratime_slack_bot.lib import messages, test_utils
+from intratime_slack_bot.lib import messages, test_utils, json_encoder
+from intratime_slack_bot.lib.clock_event import ClockEvent
 
 # ----------------------------------------------------------------------------------------------------------------------
 
@@ -35,5 +36,32 @@ def test_set_custom_message(key, parameters, expected_result):
 @pytest.mark.parametrize('action, fake_datetime, data, worked_time, callback_id, expected_result',
                          TEST_GENERATE_SLACK_HISTORY_REPORT_DATA)
 def test_generate_slack_history_report(action, fake_datetime, data, worked_time, callback_id, expected_result, token):
+    data = [ClockEvent.from_dict(item) for item in data]
+
     with freezegun.freeze_time(fake_datetime):
         assert messages.generate_slack_history_report(token, action, data, worked_time, callback_id) == expected_result
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_pack_slack_messages():
+    def group(day, num_blocks):
+        return [{'type': 'section', 'text': {'type': 'mrkdwn', 'text': f"{day}-{index}"}}
+                for index in range(num_blocks)]
+
+    # EVERYTHING FITS IN ONE MESSAGE, WITHOUT PAGE FOOTER
+    assert messages.pack_slack_messages([group(1, 3), group(2, 3)], max_blocks=10) == [group(1, 3) + group(2, 3)]
+
+    # GROUPS ARE KEPT TOGETHER, AND A GROUP BIGGER THAN A MESSAGE IS SPLIT
+    pages = messages.pack_slack_messages([group(1, 5), group(2, 5), group(3, 12)], max_blocks=10)
+
+    assert [page[:-1] for page in pages] == [group(1, 5), group(2, 5), group(3, 9), group(3, 12)[9:]]
+    assert [page[-1] for page in pages] == [messages.write_slack_page_footer(page, 4) for page in range(1, 5)]
+    assert all(len(page) <= 10 for page in pages)
+
+    # PAYLOAD SIZE LIMIT
+    blocks = group(1, 20)
+    pages = messages.pack_slack_messages([blocks], max_size=800)
+
+    assert sum(len(page) - 1 for page in pages) == 20
+    assert all(len(json_encoder.dumps(page)) <= 800 for page in pages)
@@ -0,0 +1,34 @@
+import pytest
+
+from intratime_slack_bot.lib import metrics
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_latency_stats():
+    latency_stats = metrics.LatencyStats(max_samples=100)
+    assert latency_stats.get_stats() == {'count': 0, 'mean_ms': 0, 'p50_ms': 0, 'p99_ms': 0, 'max_ms': 0}
+
+    for milliseconds in range(1, 201):
+        latency_stats.record(milliseconds / 1000)
+
+    stats = latency_stats.get_stats()
+    assert stats['count'] == 200
+    assert stats['mean_ms'] == 100.5
+    assert stats['max_ms'] == 200
+
+    # PERCENTILES ARE CALCULATED OVER THE LAST 100 SAMPLES
+    assert stats['p50_ms'] == 151
+    assert stats['p99_ms'] == 200
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_size_stats():
+    size_stats = metrics.SizeStats()
+
+    for size in [100, 300, 200]:
+        size_stats.record(size)
+
+    assert size_stats.get_stats() == {'count': 3, 'total_bytes': 600, 'mean_bytes': 200, 'p50_bytes': 200,
+                                      'p99_bytes': 300, 'max_bytes': 300}
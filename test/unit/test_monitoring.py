@@ -0,0 +1,106 @@
+import pytest
+import threading
+import time
+
+from intratime_slack_bot.lib.db import monitoring
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class FakeCollection:
+    def __init__(self):
+        self.batches = []
+
+    def insert_many(self, documents, ordered=True):
+        self.batches.append(list(documents))
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_history_writer_batches():
+    collection = FakeCollection()
+    writer = monitoring.HistoryWriter(collection, 100, 3, 0.2)
+
+    for index in range(4):
+        assert writer.put({'index': index})
+
+    # FIRST BATCH IS WRITTEN BY SIZE AND THE SECOND ONE BY TIME
+    time.sleep(0.5)
+    assert [len(batch) for batch in collection.batches] == [3, 1]
+    assert writer.get_stats()['written'] == 4
+
+    # PENDING REGISTERS ARE WRITTEN ON STOP
+    writer.put({'index': 4})
+    writer.stop()
+    assert collection.batches[-1] == [{'index': 4}]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_history_writer_overflow():
+    # DROP NEWEST
+    writer = monitoring.HistoryWriter(FakeCollection(), 2, 10, 60)
+    writer.start()
+    writer.queue.put({'index': 0})
+    writer.queue.put({'index': 1})
+    assert not writer.put({'index': 2})
+    assert writer.get_stats()['dropped'] == 1
+
+    # DROP OLDEST
+    writer = monitoring.HistoryWriter(FakeCollection(), 1, 10, 60, monitoring.DROP_OLDEST)
+    writer.start()
+    writer.queue.put({'index': 0})
+    assert writer.put({'index': 1})
+    assert writer.get_stats()['dropped'] == 1
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_history_writer_flush_error():
+    class FailingCollection(FakeCollection):
+        def insert_many(self, documents, ordered=True):
+            if len(self.batches) == 0:
+                self.batches.append(None)
+                raise ValueError('Unexpected error')
+
+            super().insert_many(documents, ordered)
+
+    collection = FailingCollection()
+    writer = monitoring.HistoryWriter(collection, 100, 1, 60)
+
+    # AN UNEXPECTED ERROR IS COUNTED AND THE THREAD KEEPS WRITING
+    writer.put({'index': 0})
+    writer.put({'index': 1})
+    writer.stop()
+    assert collection.batches[1:] == [[{'index': 1}]]
+    assert writer.get_stats()['errors'] == 1
+    assert writer.get_stats()['written'] == 1
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_history_writer_stop_full_queue():
+    class BlockedCollection(FakeCollection):
+        def __init__(self):
+            super().__init__()
+            self.event = threading.Event()
+
+        def insert_many(self, documents, ordered=True):
+            self.event.wait()
+            super().insert_many(documents, ordered)
+
+    collection = BlockedCollection()
+    writer = monitoring.HistoryWriter(collection, 1, 1, 60)
+
+    # THE WRITER THREAD IS STUCK AND THE QUEUE IS FULL, BUT STOP RETURNS AFTER THE TIMEOUT
+    writer.put({'index': 0})
+    time.sleep(0.1)
+    writer.put({'index': 1})
+    start_time = time.monotonic()
+    writer.stop(0.2)
+    assert time.monotonic() - start_time < 1
+    assert writer.thread is not None
+
+    collection.event.set()
+    writer.stop()
+    assert collection.batches == [[{'index': 0}], [{'index': 1}]]
@@ -0,0 +1,32 @@
+import pytest
+
+from intratime_slack_bot.lib import rate_limiter
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_token_bucket(fake_clock):
+    bucket = rate_limiter.TokenBucket(rate=2, capacity=3, timer=fake_clock, sleep=fake_clock.sleep)
+
+    # THE CALLS DO NOT WAIT UNTIL THE BUCKET IS EMPTY
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+
+    # THEN THEY ARE SENT AT THE BUCKET RATE
+    assert bucket.acquire() == 0.5
+    assert bucket.acquire() == 0.5
+
+    # THE TOKENS ARE ADDED OVER TIME, UP TO THE CAPACITY
+    fake_clock.now += 10
+    assert bucket.get_stats()['tokens'] == 3
+    assert bucket.get_stats()['wait']['count'] == 5
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_token_bucket_pause(fake_clock):
+    bucket = rate_limiter.TokenBucket(rate=1, capacity=5, timer=fake_clock, sleep=fake_clock.sleep)
+
+    # RETRY-AFTER: NO TOKENS ARE GIVEN DURING THE PAUSE, AND THERE IS NO BURST AFTER IT
+    bucket.pause(30)
+    assert bucket.acquire() == 30
+    assert bucket.acquire() == 1
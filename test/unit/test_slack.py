@@ -5,9 +5,14 @@ import json
 import requests
 import freezegun
 
+from http import HTTPStatus
+from types import SimpleNamespace
+
 from intratime_slack_bot.config import settings
 from intratime_slack_bot.lib.db import user
-from intratime_slack_bot.lib import slack, codes, messages, intratime, time_utils, test_utils
+from intratime_slack_bot.lib.db.database import SLACK_OUTBOX_COLLECTION
+from intratime_slack_bot.lib import slack, codes, messages, intratime, time_utils, test_utils, rate_limiter, warehouse
+from intratime_slack_bot.lib.clock_event import ClockEvent
 from intratime_slack_bot.lib.test_utils import read_json_file_data, check_if_log_exist, UNIT_TEST_DATA_PATH
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -109,7 +114,7 @@ def test_decode_slack_args(data, expected_decoded_data):
 
 @pytest.mark.parametrize('data, callback_id, expected_api_data', TEST_GET_API_DATA, ids=TEST_GET_API_NAMES)
 def test_get_api_data(data, callback_id, expected_api_data, mock_slack_logger):
-    api_data = slack.get_api_data(data, callback_id)
+    api_data = slack.get_api_data(slack.decode_slack_args(data), callback_id)
 
     if api_data is None:
         assert check_if_log_exist(messages.get(3026, callback_id))
@@ -212,11 +217,163 @@ def test_process_delete_user_interactive_data(add_user, post_delete_user):
 @pytest.mark.parametrize('action, worked_hours, fake_datetime, data', TEST_PROCESS_CLOCK_HISTORY_ACTION_DATA)
 def test_process_clock_history_action(action, worked_hours, fake_datetime, data, token):
     with freezegun.freeze_time(fake_datetime):
-        assert slack.process_clock_history_action(token, action) == (worked_hours, data)
+        assert slack.process_clock_history_action(token, action) == (worked_hours, [ClockEvent.from_dict(item)
+                                                                                     for item in data])
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
 @pytest.mark.parametrize('data, datetime_from, datetime_to, expected_result', TEST_FILTER_CLOCK_HISTORY_DATA)
 def test_process_clock_history_action(data, datetime_from, datetime_to, expected_result):
-    assert slack.filter_clock_history_data(data, datetime_from, datetime_to) == expected_result
+    filtered_data = slack.filter_clock_history_data([ClockEvent.from_dict(item) for item in data], datetime_from,
+                                                    datetime_to)
+
+    assert {date: [item.to_dict() for item in items] for date, items in filtered_data.items()} == expected_result
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_post_slack_api_request_retry_after(monkeypatch, fake_clock):
+    responses = [SimpleNamespace(status_code=HTTPStatus.TOO_MANY_REQUESTS, headers={'Retry-After': '3'}),
+                 SimpleNamespace(status_code=HTTPStatus.OK, headers={})]
+
+    bucket = rate_limiter.TokenBucket(rate=1, capacity=10, timer=fake_clock, sleep=fake_clock.sleep)
+    monkeypatch.setitem(slack.SLACK_API_RATE_LIMITERS, warehouse.SLACK_POST_MESSAGE_METHOD, bucket)
+    sent_requests = []
+
+    def post(url, **kwargs):
+        sent_requests.append(kwargs)
+        return responses.pop(0)
+
+    monkeypatch.setattr(slack.http_client, 'post', post)
+
+    # THE REQUEST IS SENT AGAIN AFTER THE RETRY-AFTER SECONDS
+    request = slack.post_slack_api_request(warehouse.SLACK_POST_MESSAGE_METHOD, 'url', {'channel': 'C1', 'text': 'ñ'},
+                                           'TOKEN')
+    assert request.status_code == HTTPStatus.OK
+    assert fake_clock.now == 3
+
+    # THE PAYLOAD IS SENT AS A COMPACT JSON BODY WITH BEARER AUTH
+    assert sent_requests[0] == sent_requests[1]
+    assert json.loads(sent_requests[0]['data']) == {'channel': 'C1', 'text': 'ñ'}
+    assert sent_requests[0]['headers']['Authorization'] == 'Bearer TOKEN'
+    assert slack.get_payload_size_stats()[warehouse.SLACK_POST_MESSAGE_METHOD]['max_bytes'] >= \
+        len(sent_requests[0]['data'])
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize('headers, expected_retry_after', [
+    ({'Retry-After': '3'}, 3),
+    ({'Retry-After': '0.5'}, 0.5),
+    ({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}, settings.SLACK_API_DEFAULT_RETRY_AFTER),
+    ({'Retry-After': '-1'}, settings.SLACK_API_DEFAULT_RETRY_AFTER),
+    ({'Retry-After': 'inf'}, settings.SLACK_API_DEFAULT_RETRY_AFTER),
+    ({}, settings.SLACK_API_DEFAULT_RETRY_AFTER),
+])
+def test_get_retry_after(headers, expected_retry_after):
+    assert slack.get_retry_after(headers) == expected_retry_after
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_send_private_message_outbox(monkeypatch, fake_ordered_queue):
+    outbox = fake_ordered_queue[SLACK_OUTBOX_COLLECTION]
+    post_results = [codes.SLACK_API_RATE_LIMITED, codes.SUCCESS, codes.SLACK_API_CONNECTION_ERROR,
+                    codes.INTERNAL_SERVER_ERROR, codes.SUCCESS, codes.BAD_REQUEST_DATA]
+    posted_messages = []
+
+    def post_private_message(message, channel, mgs_type='text', as_bot_user=False):
+        posted_messages.append(message)
+        return post_results.pop(0)
+
+    monkeypatch.setattr(slack, 'post_private_message', post_private_message)
+
+    # THE MESSAGE IS QUEUED IF SLACK FAILS, AND THE NEXT ONES ARE QUEUED BEHIND IT TO KEEP THE ORDER
+    assert slack.send_private_message('first', TEST_USER_ID) == codes.MESSAGE_QUEUED
+    assert slack.send_private_message('second', TEST_USER_ID) == codes.MESSAGE_QUEUED
+    assert posted_messages == ['first']
+    assert [item['attempts'] for item in outbox] == [1, 0]
+
+    # THE DELIVERY STOPS AT THE FIRST MESSAGE THAT CAN NOT BE POSTED, WHICH IS RETRIED LATER
+    assert slack.deliver_channel_messages(TEST_USER_ID) == 1
+    assert outbox[1]['attempts'] == 1 and outbox[1]['next_attempt_at'] > 0
+
+    outbox[1]['next_attempt_at'] = 0
+    assert slack.deliver_channel_messages(TEST_USER_ID) == 0
+    outbox[1]['next_attempt_at'] = 0
+    assert slack.deliver_channel_messages(TEST_USER_ID) == 1
+    assert posted_messages == ['first', 'first', 'second', 'second', 'second']
+
+    # MESSAGES THAT CAN NOT BE POSTED ARE MOVED TO THE DEAD-LETTER STORE
+    slack.slack_outbox.add_message(TEST_USER_ID, 'third', 'text', 1, codes.INTERNAL_SERVER_ERROR)
+    assert slack.deliver_channel_messages(TEST_USER_ID) == 0
+    assert [item['status'] for item in outbox] == ['deleted', 'deleted', 'dead']
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_drain_slack_outbox_unexpected_error(monkeypatch, fake_ordered_queue):
+    posted_channels = []
+
+    def post_private_message(message, channel, mgs_type='text', as_bot_user=False):
+        if channel == 'bad_channel':
+            raise KeyError('ok')
+
+        posted_channels.append(channel)
+        return codes.SUCCESS
+
+    monkeypatch.setattr(slack, 'post_private_message', post_private_message)
+    slack.slack_outbox.add_message('bad_channel', 'message', 'text', 0, codes.MESSAGE_QUEUED)
+    slack.slack_outbox.add_message(TEST_USER_ID, 'message', 'text', 0, codes.MESSAGE_QUEUED)
+
+    # THE ERROR OF A CHANNEL DOES NOT STOP THE DELIVERY OF THE OTHER ONES
+    assert slack.drain_slack_outbox() == 1
+    assert posted_channels == [TEST_USER_ID]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_process_delete_user_interactive_data_error(monkeypatch):
+    purged_data = []
+    responses = []
+    data = {'callback_id': 'delete_user', 'user': {'id': TEST_USER_ID}, 'response_url': 'url'}
+
+    monkeypatch.setattr(slack.user, 'delete_user', lambda user_id: codes.USER_NOT_FOUND)
+    monkeypatch.setattr(slack.clock, 'delete_user_clocks', purged_data.append)
+    monkeypatch.setattr(slack.clock_queue, 'delete_user_clockings', purged_data.append)
+    monkeypatch.setattr(slack.slack_outbox, 'delete_channel_messages', purged_data.append)
+    monkeypatch.setattr(slack, 'post_ephemeral_response_message', lambda message, *args: responses.append(message))
+
+    # THE USER DATA IS NOT PURGED IF THE USER HAS NOT BEEN DELETED
+    slack.process_interactive_data(data)
+    assert purged_data == []
+    assert responses == [messages.set_custom_message('DELETE_USER_ERROR', [codes.USER_NOT_FOUND])]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_process_update_user_interactive_data(monkeypatch):
+    deleted_clocks = []
+    invalidated_tokens = []
+    responses = []
+    user_data = {'user_id': TEST_USER_ID, 'intratime_mail': 'old@mail.com', 'password': 'password'}
+    data = {'callback_id': 'update_user', 'user': {'id': TEST_USER_ID}, 'response_url': 'url',
+            'submission': {'email': 'old@mail.com', 'password': 'new_password'}}
+
+    monkeypatch.setattr(slack.user, 'get_user_data', lambda user_id: dict(user_data))
+    monkeypatch.setattr(slack.user, 'update_user', lambda user_id, new_data: codes.SUCCESS)
+    monkeypatch.setattr(slack.intratime, 'invalidate_user_token', lambda *args: invalidated_tokens.append(args))
+    monkeypatch.setattr(slack.clock, 'delete_user_clocks', deleted_clocks.append)
+    monkeypatch.setattr(slack, 'post_ephemeral_response_message', lambda message, *args: responses.append(message))
+
+    # ONLY THE PASSWORD CHANGES: THE CLOCKS ARE KEPT
+    slack.process_interactive_data(data)
+    assert deleted_clocks == []
+    assert invalidated_tokens == [(TEST_USER_ID, 'old@mail.com')]
+
+    # THE INTRATIME ACCOUNT CHANGES: THE CLOCKS OF THE OLD ONE ARE DELETED
+    data['submission']['email'] = 'new@mail.com'
+    slack.process_interactive_data(data)
+    assert deleted_clocks == [TEST_USER_ID]
+    assert responses == [messages.UPDATE_USER_SUCCESS, messages.UPDATE_USER_SUCCESS]
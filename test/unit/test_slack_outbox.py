@@ -0,0 +1,30 @@
+from intratime_slack_bot.lib.db import slack_outbox
+from conftest import TEST_QUEUE_KEY
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_slack_outbox(delete_test_queue_items):
+    slack_outbox.add_message(TEST_QUEUE_KEY, 'second', 'text', 1, 500, created_at=2)
+    slack_outbox.add_message(TEST_QUEUE_KEY, 'first', 'text', 1, 500, created_at=1)
+
+    assert slack_outbox.has_pending_messages(TEST_QUEUE_KEY)
+    assert TEST_QUEUE_KEY in slack_outbox.get_pending_channels()
+
+    # THE MESSAGES ARE RETURNED IN THE ORDER THAT THEY WERE SENT
+    pending_messages = slack_outbox.get_channel_pending_messages(TEST_QUEUE_KEY)
+    assert [item['message'] for item in pending_messages] == ['first', 'second']
+
+    slack_outbox.set_retry(pending_messages[0]['_id'], 100, 500)
+    slack_outbox.set_dead(pending_messages[1]['_id'], 400)
+
+    pending_messages = slack_outbox.get_channel_pending_messages(TEST_QUEUE_KEY)
+    assert [(item['message'], item['attempts'], item['next_attempt_at']) for item in pending_messages] == \
+        [('first', 2, 100)]
+
+    slack_outbox.delete_message(pending_messages[0]['_id'])
+    assert not slack_outbox.has_pending_messages(TEST_QUEUE_KEY)
+
+    # DEAD-LETTER MESSAGES ARE QUEUED AGAIN WHEN THEY ARE REPLAYED
+    assert slack_outbox.replay_dead_messages(TEST_QUEUE_KEY) == 1
+    assert [item['message'] for item in slack_outbox.get_channel_pending_messages(TEST_QUEUE_KEY)] == ['second']
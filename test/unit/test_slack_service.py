@@ -0,0 +1,71 @@
+import json
+import threading
+import urllib.parse
+
+from intratime_slack_bot.config import settings
+from intratime_slack_bot.lib import intratime, slack, crypt, codes, warehouse
+from intratime_slack_bot.lib.db import user, clock_queue
+from intratime_slack_bot.services import slack_service
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+TEST_USER_DATA = {'user_id': 'slack_service_test_user', 'user_name': 'test', 'intratime_mail': 'test@mail.com',
+                  'password': crypt.encrypt('password')}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_clock_interactive_data_intratime_down(monkeypatch):
+    queued_clockings = []
+    responses = []
+    response_posted = threading.Event()
+
+    def post_ephemeral_response_message(message, response_url, mgs_type='text'):
+        responses.append(message)
+        response_posted.set()
+        return codes.SUCCESS
+
+    # INTRATIME IS NOT REACHABLE AND THE USER TOKEN IS NOT CACHED
+    monkeypatch.setattr(intratime, 'INTRATIME_CLIENT', intratime.IntratimeClient('http://127.0.0.1:1', get_retries=0))
+    intratime.invalidate_user_token(TEST_USER_DATA['user_id'], TEST_USER_DATA['intratime_mail'])
+
+    monkeypatch.setattr(user, 'get_user_data', lambda user_id: dict(TEST_USER_DATA))
+    monkeypatch.setattr(clock_queue, 'has_pending_clockings', lambda user_id: False)
+    monkeypatch.setattr(clock_queue, 'add_clocking', lambda *args: queued_clockings.append(args))
+    monkeypatch.setattr(slack, 'post_ephemeral_response_message', post_ephemeral_response_message)
+
+    payload = {'callback_id': slack.CLOCK_CALLBACK, 'submission': {'action': 'in'}, 'response_url': 'url',
+               'user': {'id': TEST_USER_DATA['user_id'], 'name': TEST_USER_DATA['user_name']}}
+    response = slack_service.app.test_client().post(warehouse.INTERACTIVE_REQUEST,
+                                                    data=urllib.parse.urlencode({'payload': json.dumps(payload)}),
+                                                    content_type='application/x-www-form-urlencoded')
+
+    # THE DIALOG IS CLOSED INSTEAD OF SHOWING A CREDENTIALS ERROR, AND THE CLOCKING IS QUEUED AND ACKNOWLEDGED
+    assert response.status_code == 200 and response.data == b''
+    assert response_posted.wait(5)
+    assert [clocking[:2] for clocking in queued_clockings] == [(TEST_USER_DATA['user_id'], 'in')]
+    assert 'queued' in responses[0]
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_update_user_interactive_data_intratime_unavailable(monkeypatch):
+    responses = []
+
+    # THE REQUEST IS REJECTED BY THE CONCURRENCY LIMITER, SO THE BREAKER IS NOT OPEN
+    monkeypatch.setattr(intratime, 'is_intratime_unavailable', lambda: False)
+    monkeypatch.setattr(intratime, 'get_auth_token', lambda email, password: codes.INTRATIME_UNAVAILABLE)
+    monkeypatch.setattr(slack, 'post_ephemeral_response_message',
+                        lambda message, response_url, mgs_type='text': responses.append(message) or codes.SUCCESS)
+
+    payload = {'callback_id': slack.UPDATE_USER_CALLBACK, 'response_url': 'url',
+               'submission': {'email': TEST_USER_DATA['intratime_mail'], 'password': 'password'},
+               'user': {'id': TEST_USER_DATA['user_id'], 'name': TEST_USER_DATA['user_name']}}
+    response = slack_service.app.test_client().post(warehouse.INTERACTIVE_REQUEST,
+                                                    data=urllib.parse.urlencode({'payload': json.dumps(payload)}),
+                                                    content_type='application/x-www-form-urlencoded')
+
+    # THE USER IS TOLD THAT INTRATIME IS NOT AVAILABLE INSTEAD OF GETTING A CREDENTIALS ERROR
+    assert response.status_code == 200 and response.data == b''
+    assert len(responses) == 1
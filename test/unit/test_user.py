@@ -127,6 +127,20 @@ def test_update_last_registration_datetime(add_user, post_delete_user, mock_user
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+def test_update_last_registration_datetime_by_email(add_user, post_delete_user, mock_user_logger):
+    # BAD USER MAIL
+    assert user.update_last_registration_datetime_by_email('fake_mail@mail.com') == codes.BAD_USER_EMAIL
+    assert check_if_log_exist(messages.get(3011, "email = fake_mail@mail.com"))
+
+    # VALID USER MAIL
+    assert user.update_last_registration_datetime_by_email(TEST_USER_DATA['intratime_mail']) == \
+        TEST_USER_DATA['user_id']
+    assert user.get_user_data(TEST_USER_DATA['user_id'])['last_registration_date'] \
+        != TEST_USER_DATA['last_registration_date']
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
 def test_get_user_id(add_user, post_delete_user):
     # BAD USER MAIL
     assert user.get_user_id('fake_mail@mail.com') == codes.BAD_USER_EMAIL
@@ -135,3 +149,27 @@ def test_get_user_id(add_user, post_delete_user):
     print(TEST_USER_DATA['intratime_mail'])
     print(TEST_USER_DATA['user_id'])
     assert user.get_user_id(TEST_USER_DATA['intratime_mail']) == settings.SLACK_TEST_USER_ID
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_user_cache(post_delete_user):
+    user.USER_CACHE.clear()
+
+    # UNREGISTERED USERS ARE CACHED TOO
+    assert not user.user_exist(TEST_USER_DATA['user_id'])
+    assert not user.user_exist(TEST_USER_DATA['user_id'])
+    assert user.get_user_cache_stats()['hits'] == 1
+
+    # WRITES INVALIDATE THE CACHED USER
+    user.add_user(TEST_USER_DATA)
+    assert user.user_exist(TEST_USER_DATA['user_id'])
+
+    user_data = user.get_user_data(TEST_USER_DATA['user_id'])
+    user_data['user_name'] = 'cache_test'
+    assert user.get_user_data(TEST_USER_DATA['user_id'])['user_name'] == TEST_USER_DATA['user_name']
+    assert user.update_user(TEST_USER_DATA['user_id'], user_data) == codes.SUCCESS
+    assert user.get_user_data(TEST_USER_DATA['user_id'])['user_name'] == 'cache_test'
+
+    user.delete_user(TEST_USER_DATA['user_id'])
+    assert not user.user_exist(TEST_USER_DATA['user_id'])
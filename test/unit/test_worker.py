@@ -0,0 +1,47 @@
+import threading
+
+from intratime_slack_bot.lib import worker, logger
+from intratime_slack_bot.config import settings
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+TEST_LOGGER = logger.get_logger('worker_test', settings.LOGS_LEVEL)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_process_by_key():
+    processed_keys = []
+
+    def process_key(key):
+        if key == 'bad_key':
+            raise ValueError(key)
+
+        processed_keys.append(key)
+        return 2
+
+    # THE ERROR OF A KEY DOES NOT STOP THE PROCESSING OF THE OTHER ONES
+    assert worker.process_by_key(['bad_key', 'key_1', 'key_2'], process_key, 2, 'test', TEST_LOGGER, 3045) == 4
+    assert sorted(processed_keys) == ['key_1', 'key_2']
+    assert worker.process_by_key([], process_key, 2, 'test', TEST_LOGGER, 3045) == 0
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def test_start_periodic_worker():
+    runs = []
+    finished = threading.Event()
+
+    def job():
+        runs.append(len(runs))
+
+        if len(runs) == 3:
+            finished.set()
+
+        raise ValueError('job error')
+
+    # THE WORKER KEEPS RUNNING AFTER AN UNEXPECTED ERROR, UNTIL IT IS STOPPED
+    stop_event = worker.start_periodic_worker(job, 0.01, TEST_LOGGER, 3041)
+    assert finished.wait(5)
+    stop_event.set()